@@ -0,0 +1,146 @@
+"""Pre-aggregated cube behind the KPI, pie/donut and Pareto panels.
+
+Rows are grouped once per dataset by (product, day, rating, review_language)
+with count, price count/sum/sum of squares per cell; since rating is a
+dimension, the cells also hold the rating histogram. The date, rating and
+product filters are applied to the cells, so these panels cost something
+proportional to the number of cells, not rows.
+"""
+import numpy as np
+import pandas as pd
+
+CUBE_DIMS = ("product", "day", "rating", "review_language")
+
+
+class AggregateCube:
+    def __init__(self, df):
+        frame = pd.DataFrame(index=df.index)
+        if 'product' in df.columns:
+            frame['product'] = df['product']
+        if 'purchase_date' in df.columns:
+            dates = df['purchase_date']
+            frame['day'] = dates.dt.floor('D')
+            # a day-level cube only answers date filters exactly when timestamps carry no time of day
+            self.dates_are_days = bool((dates.dropna() == frame['day'].dropna()).all())
+        else:
+            self.dates_are_days = True
+        if 'rating' in df.columns:
+            frame['rating'] = df['rating']
+        if 'review_language' in df.columns:
+            frame['review_language'] = df['review_language']
+        self.dims = [d for d in CUBE_DIMS if d in frame.columns]
+        self.has_price = 'price' in df.columns
+        if self.has_price:
+            price = df['price']
+            frame['price_count'] = price.notna().astype('int64')
+            frame['price_sum'] = price.fillna(0.0)
+            frame['price_sumsq'] = price.fillna(0.0) ** 2
+        frame['count'] = 1
+        measures = [c for c in ('count', 'price_count', 'price_sum', 'price_sumsq') if c in frame.columns]
+        if self.dims:
+            cells = frame.groupby(self.dims, observed=True, dropna=False)[measures].sum().reset_index()
+        else:
+            cells = frame[measures].sum().to_frame().T
+        self.cells = cells
+
+    def append(self, df):
+        """Cube over the current rows plus the rows of `df`, merged cell-wise.
+
+        Costs the delta rows plus the number of cells, not the history; the
+        current cube is left unchanged.
+        """
+        return self.merge(AggregateCube(df))
+
+    def merge(self, delta):
+        """Cube over the rows of self and of the cube `delta`, merged cell-wise."""
+        if delta.dims != self.dims or delta.has_price != self.has_price:
+            raise ValueError("colonnes incompatibles avec le jeu existant")
+        merged = object.__new__(AggregateCube)
+        merged.dims = self.dims
+        merged.has_price = self.has_price
+        merged.dates_are_days = self.dates_are_days and delta.dates_are_days
+        cells = pd.concat([self.cells, delta.cells], ignore_index=True)
+        measures = [c for c in cells.columns if c not in self.dims]
+        if self.dims:
+            cells = cells.groupby(self.dims, observed=True, dropna=False)[measures].sum().reset_index()
+        else:
+            cells = cells[measures].sum().to_frame().T
+        merged.cells = cells
+        return merged
+
+    def slice(self, date_range=None, rating_range=None, products=None, price_notna=False):
+        """Cells matching the filters, as a CubeSlice.
+
+        date_range / rating_range are inclusive (lo, hi) bounds, products an
+        iterable of product names; price_notna reproduces a price filter that
+        spans the whole price range (it only drops rows without a price).
+        """
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if date_range is not None and 'day' in cells.columns:
+            mask &= ((cells['day'] >= date_range[0]) & (cells['day'] <= date_range[1])).to_numpy()
+        if rating_range is not None and 'rating' in cells.columns:
+            mask &= ((cells['rating'] >= rating_range[0]) & (cells['rating'] <= rating_range[1])).to_numpy()
+        if products is not None and 'product' in cells.columns:
+            mask &= cells['product'].isin(list(products)).to_numpy()
+        weight = 'price_count' if price_notna and self.has_price else 'count'
+        return CubeSlice(cells[mask], weight)
+
+
+class CubeSlice:
+    """Queries over a filtered set of cube cells; `weight` is the per-cell row count."""
+
+    def __init__(self, cells, weight='count'):
+        self.cells = cells
+        self.weight = cells[weight]
+
+    def num_reviews(self):
+        return int(self.weight.sum())
+
+    def avg_rating(self):
+        if 'rating' not in self.cells.columns:
+            return np.nan
+        rated = self.cells['rating'].notna()
+        total = self.weight[rated].sum()
+        return float((self.cells['rating'][rated] * self.weight[rated]).sum() / total) if total else np.nan
+
+    def avg_price(self):
+        if 'price_count' not in self.cells.columns:
+            return np.nan
+        count = self.cells['price_count'].sum()
+        return float(self.cells['price_sum'].sum() / count) if count else np.nan
+
+    def rating_by_product(self):
+        if not {'product', 'rating'} <= set(self.cells.columns):
+            return pd.Series(dtype='float64')
+        rated = self.cells[self.cells['rating'].notna()]
+        w = self.weight[rated.index]
+        sums = (rated['rating'] * w).groupby(rated['product'], observed=True).sum()
+        counts = w.groupby(rated['product'], observed=True).sum()
+        return (sums / counts[counts > 0]).dropna()
+
+    def top_product(self):
+        grouped = self.rating_by_product()
+        return grouped.idxmax() if not grouped.empty else None
+
+    def product_counts(self):
+        """Rows per product, sorted like Series.value_counts()."""
+        if 'product' not in self.cells.columns:
+            return pd.Series(dtype='int64')
+        counts = self.weight.groupby(self.cells['product'], observed=True).sum()
+        counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+        counts.index = counts.index.astype(str)
+        return counts.rename('count')
+
+    def rating_histogram(self):
+        if 'rating' not in self.cells.columns:
+            return pd.Series(dtype='int64')
+        return self.weight.groupby(self.cells['rating'], observed=True).sum().sort_index()
+
+    def kpis(self):
+        return {
+            "num_reviews": self.num_reviews(),
+            "avg_rating": self.avg_rating(),
+            "avg_price": self.avg_price(),
+            "top_product": self.top_product(),
+        }
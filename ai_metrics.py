@@ -0,0 +1,87 @@
+"""Latency instrumentation for AI calls.
+
+Every call records time-to-first-token, total latency, prompt/completion
+token counts and whether it was served from the cache; the tracker keeps the
+most recent calls and reports p50/p95 over them.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatencyTracker:
+    def __init__(self, max_records=200):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, total, ttft=None, prompt_tokens=None, completion_tokens=None, cache_hit=False, streamed=False, label=None):
+        entry = {
+            "at": time.time(),
+            "label": label,
+            "ttft": ttft,
+            "total": total,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cache_hit": cache_hit,
+            "streamed": streamed,
+        }
+        with self._lock:
+            self._records.append(entry)
+        return entry
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def percentiles(self, field, qs=(50, 95), include_cache_hits=False):
+        values = [r[field] for r in self.records()
+                  if r[field] is not None and (include_cache_hits or not r["cache_hit"])]
+        if not values:
+            return {q: None for q in qs}
+        return {q: float(v) for q, v in zip(qs, np.percentile(values, qs))}
+
+    def summary(self):
+        records = self.records()
+        hits = sum(r["cache_hit"] for r in records)
+        return {
+            "calls": len(records),
+            "cache_hit_rate": hits / len(records) if records else None,
+            "ttft": self.percentiles("ttft"),
+            "total": self.percentiles("total"),
+            "total_with_cache": self.percentiles("total", include_cache_hits=True),
+        }
+
+
+def timed_stream(stream, tracker, prompt_tokens=None, label=None, started_at=None):
+    """Yield the text deltas of a streamed chat completion while timing it.
+
+    Token counts come from the final usage chunk when the service sends one
+    (stream_options include_usage), else from the estimate / delta count.
+    started_at (a time.perf_counter() value) should be taken before the
+    request is sent: create() itself blocks until the response headers arrive.
+    """
+    start = started_at if started_at is not None else time.perf_counter()
+    ttft = None
+    usage = None
+    deltas = 0
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            deltas += 1
+            yield text
+    tracker.record(
+        total=time.perf_counter() - start,
+        ttft=ttft,
+        prompt_tokens=usage.prompt_tokens if usage else prompt_tokens,
+        completion_tokens=usage.completion_tokens if usage else deltas,
+        streamed=True,
+        label=label,
+    )
@@ -0,0 +1,130 @@
+"""Local stand-in for the Azure OpenAI chat completions endpoint.
+
+Lets the AI features run offline:
+
+    python ai_stub_server.py --port 8765 --rate-limit-every 5
+    AZURE_ENDPOINT=http://127.0.0.1:8765/ AZURE_API_KEY=stub python ai_summary.py data.csv
+
+Answers POST .../chat/completions with a deterministic summary of the user
+message, streamed as server-sent events when the request asks for it, and
+can simulate latency and 429 rate limiting.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_completion(messages):
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    lines = [l for l in user.splitlines() if l.strip()]
+    digest = hashlib.sha256(user.encode("utf-8")).hexdigest()[:8]
+    return (f"- Points positifs : {len(lines)} lignes analysées (stub {digest}).\n"
+            "- Axes d'amélioration : bruit, rapport qualité/prix.\n"
+            "- Tendances : avis majoritairement neutres.\n"
+            "- Suggestions : améliorer la documentation produit.")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    rate_limit_every = 0
+    _count = 0
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if "/chat/completions" not in self.path:
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        handler = type(self)
+        with handler._lock:
+            handler._count += 1
+            count = handler._count
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit (stub)"}}, {"retry-after-ms": "50"})
+            return
+        time.sleep(self.latency)
+        messages = request.get("messages", [])
+        content = fake_completion(messages)
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        if request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+            self._send_stream(count, request.get("model", "stub"), content, usage if include_usage else None)
+            return
+        self._send_json(200, {
+            "id": f"stub-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        })
+
+    def _send_stream(self, count, model, content, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        def event(choices, usage=None):
+            payload = {"id": f"stub-{count}", "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": choices}
+            if usage is not None:
+                payload["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for word in content.split(" "):
+            event([{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+            time.sleep(self.latency / 20)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if usage is not None:
+            event([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def serve(host="127.0.0.1", port=8765, latency=0.0, rate_limit_every=0):
+    """Start the stub in a background thread and return the server (call .shutdown() to stop).
+
+    port=0 picks a free port (server.server_address[1]); server.RequestHandlerClass._count is the
+    number of requests received, rate-limited ones included.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,),
+                   {"latency": latency, "rate_limit_every": rate_limit_every, "_count": 0})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local imitant Azure OpenAI (chat completions)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="délai simulé par appel (s)")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="renvoie un 429 toutes les N requêtes")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency, args.rate_limit_every)
+    print(f"Stub Azure OpenAI sur http://{args.host}:{args.port}/ (Ctrl+C pour arrêter)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,295 @@
+"""Batch AI summarization of the whole catalog (map-reduce over all reviews).
+
+Each product's reviews are packed into token-bounded chunks, every chunk gets
+a partial summary, and the partials are merged into the final summary. Calls
+go through an async Azure OpenAI client with a concurrency limit, backoff on
+rate limits / transient errors and an optional token budget for the run.
+Final summaries are cached on disk, keyed by product, review set, prompt and
+deployment, so re-running over unchanged data costs no API calls.
+
+Offline: point AZURE_ENDPOINT at `python ai_stub_server.py` (local stand-in).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+
+SYSTEM_MSG = "You are a concise product insights assistant that summarizes customer reviews, extracts main pros/cons, and gives suggestions."
+MERGE_INSTRUCTIONS = "Merge the following partial summaries of the same product's reviews into one summary, keeping the requested format."
+
+CHARS_PER_TOKEN = 4
+CHUNK_INPUT_TOKENS = 6000
+MAX_OUTPUT_TOKENS = 700
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class TokenBudgetExceeded(RuntimeError):
+    pass
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_reviews(reviews, max_tokens=CHUNK_INPUT_TOKENS):
+    """Greedily pack reviews into chunks of at most ~max_tokens (a longer review gets truncated)."""
+    chunks, current, used = [], [], 0
+    for review in reviews:
+        review = review[:max_tokens * CHARS_PER_TOKEN]
+        cost = estimate_tokens(review)
+        if current and used + cost > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(review)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def reviews_hash(reviews):
+    # order-independent: the same review set re-exported in another order hits the cache
+    h = hashlib.sha256()
+    for review in sorted(reviews):
+        h.update(review.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class SummaryCache:
+    """One JSON file per (product, review set, prompt, deployment)."""
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            # imported here: the dataset cache module loads pandas and pyarrow
+            from dataset_cache import CACHE_DIR
+            cache_dir = os.path.join(CACHE_DIR, "summaries")
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def key(product, reviews, prompt, deployment):
+        payload = json.dumps([str(product), reviews_hash(reviews), prompt, deployment])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, self._path(key))
+
+
+class TokenBudget:
+    """Run-wide token cap: calls reserve an estimate up front and settle with the reported usage."""
+
+    def __init__(self, max_tokens=None):
+        self.max_tokens = max_tokens
+        self.used = 0
+
+    def reserve(self, tokens):
+        if self.max_tokens is not None and self.used + tokens > self.max_tokens:
+            raise TokenBudgetExceeded(f"budget de {self.max_tokens} tokens atteint ({self.used} utilisés)")
+        self.used += tokens
+
+    def settle(self, reserved, actual):
+        if actual is not None:
+            self.used += actual - reserved
+
+
+def make_async_client(endpoint, api_key, api_version):
+    # retries are handled here (rate-limit aware), not by the SDK; the SDK is imported on first use
+    from openai import AsyncAzureOpenAI
+    return AsyncAzureOpenAI(azure_endpoint=endpoint, api_key=api_key, api_version=api_version, max_retries=0)
+
+
+def _retry_delay(error, attempt):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+async def complete(client, semaphore, budget, deployment, user_msg, system_msg=SYSTEM_MSG, max_tokens=MAX_OUTPUT_TOKENS,
+                   tracker=None, label=None):
+    """One chat completion under the concurrency limit, retried on rate limits and transient errors.
+
+    The token reservation is given back when the call fails or is cancelled.
+    """
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    reserved = estimate_tokens(system_msg) + estimate_tokens(user_msg) + max_tokens
+    budget.reserve(reserved)
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.chat.completions.create(
+                        messages=[
+                            {"role": "system", "content": system_msg},
+                            {"role": "user", "content": user_msg}
+                        ],
+                        model=deployment,
+                        max_tokens=max_tokens,
+                        temperature=0.2
+                    )
+                    elapsed = time.perf_counter() - start
+                break
+            except (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError) as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt))
+    except BaseException:
+        budget.settle(reserved, 0)
+        raise
+    usage = getattr(response, "usage", None)
+    budget.settle(reserved, usage.total_tokens if usage else None)
+    if tracker is not None:
+        tracker.record(total=elapsed, prompt_tokens=usage.prompt_tokens if usage else None,
+                       completion_tokens=usage.completion_tokens if usage else None, label=label)
+    return response.choices[0].message.content
+
+
+async def gather_or_cancel(coros):
+    """asyncio.gather, except that the first failure cancels the other calls instead of letting them
+    run (and spend tokens) for a result that is thrown away."""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def summarize_product(client, semaphore, budget, deployment, reviews, prompt, tracker=None, label=None):
+    """Map: one partial summary per chunk; reduce: merge partials until one summary is left."""
+    chunks = chunk_reviews(reviews)
+    partials = await gather_or_cancel([
+        complete(client, semaphore, budget, deployment, f"{prompt}\n\nReviews:\n" + "\n".join(chunk),
+                 tracker=tracker, label=label)
+        for chunk in chunks
+    ])
+    calls = len(chunks)
+    while len(partials) > 1:
+        groups = chunk_reviews(partials)
+        if len(groups) == len(partials):
+            # partials too long to pack two per call: merge pairwise
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        partials = await gather_or_cancel([
+            complete(client, semaphore, budget, deployment,
+                     f"{MERGE_INSTRUCTIONS}\n{prompt}\n\nPartial summaries:\n" + "\n---\n".join(group),
+                     tracker=tracker, label=label)
+            for group in groups
+        ])
+        calls += len(groups)
+    return partials[0], calls
+
+
+async def summarize_catalog(client, reviews_by_product, prompt, deployment, concurrency=4,
+                            max_total_tokens=None, cache=None, on_result=None, tracker=None):
+    """Summarize every product concurrently; returns {product: result dict}.
+
+    A result holds the summary (or error), whether it came from the cache,
+    the number of reviews and of API calls. on_result(product, result) is
+    called as each product finishes; calls and cache hits are recorded on
+    `tracker` (an ai_metrics.LatencyTracker) when given.
+    """
+    cache = cache or SummaryCache()
+    semaphore = asyncio.Semaphore(concurrency)
+    budget = TokenBudget(max_total_tokens)
+
+    async def run(product, reviews):
+        key = SummaryCache.key(product, reviews, prompt, deployment)
+        start = time.perf_counter()
+        cached = cache.get(key)
+        if cached is not None:
+            result = {**cached, "cached": True}
+            if tracker is not None:
+                tracker.record(total=time.perf_counter() - start, cache_hit=True, label=product)
+        else:
+            try:
+                summary, calls = await summarize_product(client, semaphore, budget, deployment, reviews, prompt,
+                                                         tracker=tracker, label=product)
+                result = {"summary": summary, "reviews": len(reviews), "calls": calls, "cached": False}
+                cache.put(key, {k: v for k, v in result.items() if k != "cached"})
+            except Exception as e:
+                result = {"error": str(e), "reviews": len(reviews), "calls": 0, "cached": False}
+        if on_result is not None:
+            on_result(product, result)
+        return product, result
+
+    results = await asyncio.gather(*[run(p, r) for p, r in reviews_by_product.items() if r])
+    return dict(results)
+
+
+def reviews_by_product(df):
+    data = df[['product', 'review_text']].dropna()
+    return {str(p): g['review_text'].astype(str).tolist() for p, g in data.groupby('product', observed=True)}
+
+
+def run_batch(df, prompt, endpoint, api_key, api_version, deployment, **kwargs):
+    """Synchronous entry point: summarize every product of `df`."""
+    async def main():
+        client = make_async_client(endpoint, api_key, api_version)
+        try:
+            return await summarize_catalog(client, reviews_by_product(df), prompt, deployment, **kwargs)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from dataset_cache import load_dataset
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Résumés AI de tous les produits d'un dataset")
+    parser.add_argument("dataset")
+    parser.add_argument("--prompt", default="Résumé concis en 4 points : points positifs, axes d'amélioration, tendances, suggestions.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=None, help="budget total de tokens pour le lot")
+    parser.add_argument("--out", default="-", help="fichier JSON de sortie (- pour stdout)")
+    args = parser.parse_args()
+
+    with open(args.dataset, "rb") as f:
+        frame, _ = load_dataset(os.path.basename(args.dataset), f.read())
+    summaries = run_batch(
+        frame, args.prompt,
+        endpoint=os.getenv("AZURE_ENDPOINT", "https://bourz-mihhzl50-eastus2.cognitiveservices.azure.com/"),
+        api_key=os.getenv("AZURE_API_KEY"),
+        api_version=os.getenv("API_VERSION", "2024-12-01-preview"),
+        deployment=os.getenv("DEPLOYMENT_NAME", "gpt-5-chat"),
+        concurrency=args.concurrency, max_total_tokens=args.max_tokens,
+        # progress on stderr: stdout carries the JSON with --out -
+        on_result=lambda p, r: print(f"{p}: {'cache' if r['cached'] else r.get('error') or str(r['calls']) + ' appels'}",
+                                     file=sys.stderr, flush=True),
+    )
+    output = json.dumps(summaries, ensure_ascii=False, indent=2)
+    if args.out == "-":
+        print(output)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
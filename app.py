@@ -1,28 +1,76 @@
  
+import time
+_import_start = time.perf_counter()
 import streamlit as st
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import plotly.express as px
-from fpdf import FPDF
-from openai import AzureOpenAI
-from wordcloud import WordCloud, STOPWORDS
-import io, os, tempfile, base64, textwrap
-from datetime import datetime
+import os
+import uuid
+from contextlib import contextmanager
 from dotenv import load_dotenv
- 
+from dataset_cache import content_hash, load_dataset, peak_rss_mb
+from dataset_store import STORE_DIR, DatasetStore, IncrementalDataset
+import query_backend
+from streaming_ingest import is_streamable, stream_dataset
+from filter_index import FilterIndex
+from aggregate_cube import AggregateCube
+from memo import SharedCache
+from word_freq import build_term_counts
+from dedup import deduplicate, find_near_duplicates
+from text_scoring import score_reviews, sentiment_kpis, topic_breakdown
+import pipeline
+import trends
+from ai_summary import SYSTEM_MSG, SummaryCache, estimate_tokens, reviews_by_product, run_batch
+from ai_metrics import LatencyTracker, timed_stream
+from reports import build_html_report, build_pdf_report, render_product_figures, report_basename, session_output_dir
+from figures import FigureCache
+# heavy libraries (openai, matplotlib / seaborn, wordcloud, fpdf) are imported on first use by these modules
+import_seconds = time.perf_counter() - _import_start
+
 load_dotenv()  # charge le fichier .env
 API_KEY = os.getenv("AZURE_API_KEY")
-AZURE_ENDPOINT = "https://bourz-mihhzl50-eastus2.cognitiveservices.azure.com/"
-DEPLOYMENT_NAME = "gpt-5-chat"
-API_VERSION = "2024-12-01-preview"
-
-client = AzureOpenAI(
-    azure_endpoint=AZURE_ENDPOINT,
-    api_key=API_KEY,
-    api_version=API_VERSION
-)
+AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT", "https://bourz-mihhzl50-eastus2.cognitiveservices.azure.com/")
+DEPLOYMENT_NAME = os.getenv("DEPLOYMENT_NAME", "gpt-5-chat")
+API_VERSION = os.getenv("API_VERSION", "2024-12-01-preview")
+SHARED_CACHE_MB = int(os.getenv("THORFIN_SHARED_CACHE_MB", "1024"))
+SHARED_CACHE_DIR = os.getenv("THORFIN_SHARED_CACHE_DIR")  # optional, shared by the workers of the box
+
+# The OpenAI SDK takes about a second to import: the client is built on the first AI call, once per process
+@st.cache_resource
+def get_ai_client():
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        azure_endpoint=AZURE_ENDPOINT,
+        api_key=API_KEY,
+        api_version=API_VERSION
+    )
+
+# Shared computation tier: dataset-level artifacts (parsed frame, duplicate clusters, filter index, cube,
+# scores, term counts, per-filter slices) are computed once per process whatever the number of sessions,
+# with concurrent identical requests waiting for a single computation, in memory bounded by
+# THORFIN_SHARED_CACHE_MB. With THORFIN_SHARED_CACHE_DIR, per-filter results and figures are also
+# pickled there for the other workers of the box.
+@st.cache_resource
+def get_shared_cache():
+    return SharedCache(max_bytes=SHARED_CACHE_MB * 1024 ** 2,
+                       disk_dir=os.path.join(SHARED_CACHE_DIR, "derived") if SHARED_CACHE_DIR else None)
+
+shared_cache = get_shared_cache()
+
+# Per-session outputs (HTML / PDF reports) go to a private directory, never to the shared working directory
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+# Time spent per section of this rerun, shown in the sidebar at the end of the script
+run_timings = {}
+
+@contextmanager
+def timed(section):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run_timings[section] = run_timings.get(section, 0.0) + time.perf_counter() - start
+
 # --------------------------
 # Streamlit setup & header
 # --------------------------
@@ -41,112 +89,339 @@ st.write("")
 # Sidebar: upload + filters
 # --------------------------
 st.sidebar.header("1) Dataset & filtres")
-uploaded_file = st.sidebar.file_uploader("Uploader dataset (CSV / Excel / JSON)", type=["csv", "xlsx", "xls", "json"])
+uploaded_file = st.sidebar.file_uploader("Uploader dataset (CSV / Excel / JSON)", type=["csv", "xlsx", "xls", "json", "jsonl"])
 
-@st.cache_data
 def load_data(file):
     if file is None:
-        return None
+        return None, None
+    data = file.getvalue()
     try:
-        if file.name.lower().endswith(".csv"):
-            df = pd.read_csv(file)
-        elif file.name.lower().endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file)
-        elif file.name.lower().endswith(".json"):
-            df = pd.read_json(file)
-        else:
-            return None
+        # parsed + normalized frames are persisted as memory-mappable Arrow files keyed by content hash,
+        # and shared in memory by every session that uploads the same content
+        df, load_info = shared_cache.get_or_compute(
+            ("dataset", os.path.splitext(file.name)[1].lower(), content_hash(data)),
+            lambda: load_dataset(file.name, data))
     except Exception as e:
         st.error(f"Erreur lors du chargement : {e}")
-        return None
-    # normalize column names
-    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
-    return df
-
-df = load_data(uploaded_file)
-
-# helper: safe column check
-def has_cols(dataframe, cols):
-    return all(c in dataframe.columns for c in cols)
+        return None, None
+    return df, load_info
+
+# Streaming mode: huge CSV / JSON-lines exports are read in chunks under a memory ceiling,
+# only running aggregates + a reservoir sample stay in memory
+stream_mode = st.sidebar.checkbox("Mode streaming (gros fichiers CSV / JSON lines)")
+stream_source = None
+if stream_mode:
+    memory_budget_mb = st.sidebar.number_input("Plafond mémoire (Mo)", min_value=16, max_value=65536, value=512, step=64)
+    local_path = st.sidebar.text_input("Ou chemin local du fichier (évite l'upload)").strip()
+    if local_path:
+        if os.path.isfile(local_path):
+            stream_source = (local_path, os.path.basename(local_path), f"{local_path}:{os.path.getmtime(local_path)}")
+        else:
+            st.sidebar.error(f"Fichier introuvable : {local_path}")
+    elif uploaded_file is not None:
+        stream_source = (uploaded_file, uploaded_file.name, uploaded_file.file_id)
+
+def render_stream_progress(placeholder, aggregates):
+    kpis = aggregates.kpis()
+    bounds = aggregates.bounds()
+    with placeholder.container():
+        st.subheader(f"KPIs sur le fichier complet (streaming) — {aggregates.rows} lignes lues")
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Nombre de reviews", f"{kpis['num_reviews']}")
+        c2.metric("Note moyenne", f"{kpis['avg_rating']:.2f}" if not np.isnan(kpis['avg_rating']) else "N/A")
+        c3.metric("Prix moyen", f"${kpis['avg_price']:.2f}" if not np.isnan(kpis['avg_price']) else "N/A")
+        c4.metric("Produit le mieux noté", kpis['top_product'] if kpis['top_product'] else "N/A")
+        d0, d1 = bounds['purchase_date']
+        st.caption(f"Bornes — dates : {d0.date() if pd.notna(d0) else 'N/A'} → {d1.date() if pd.notna(d1) else 'N/A'}, "
+                   f"prix : {bounds['price'][0]:.2f} – {bounds['price'][1]:.2f}, "
+                   f"notes : {bounds['rating'][0]:.0f} – {bounds['rating'][1]:.0f}")
+
+def load_streaming(source, name, source_key, budget_mb):
+    # results are kept per session: re-reading a multi-GB file on every rerun is what we avoid
+    state_key = ("stream", source_key, budget_mb)
+    placeholder = st.empty()
+    cached = st.session_state.get("stream_result")
+    if cached is not None and cached[0] == state_key:
+        aggregates, info = cached[1], cached[2]
+    else:
+        if not is_streamable(name):
+            st.error(f"Format non supporté en streaming : {name} (CSV ou JSON lines uniquement)")
+            return None, None
+        start = time.perf_counter()
+        try:
+            aggregates = stream_dataset(source, name, budget_mb, on_chunk=lambda a: render_stream_progress(placeholder, a))
+        except Exception as e:
+            st.error(f"Erreur lors du chargement en streaming : {e}")
+            return None, None
+        info = {"key": f"stream:{source_key}:{budget_mb}", "cache_hit": False, "seconds": time.perf_counter() - start,
+                "peak_rss_mb": peak_rss_mb(), "total_rows": aggregates.rows}
+        st.session_state["stream_result"] = (state_key, aggregates, info)
+    render_stream_progress(placeholder, aggregates)
+    return aggregates.sample_frame(), info
+
+# History mode: daily delta exports are appended to a persisted history (dataset_store.py). Rows
+# already seen (same client_id + purchase_date) are dropped, and the filter index, aggregate cube,
+# term counts and sentiment scores are merged with the delta instead of being rebuilt.
+@st.cache_resource
+def get_history(store_dir):
+    return IncrementalDataset(DatasetStore(store_dir))
+
+history_mode = st.sidebar.checkbox("Mode historique (ajout de deltas)")
+history = None
+if history_mode:
+    history = get_history(STORE_DIR)
+    delta_file = st.sidebar.file_uploader("Fichier delta à ajouter", type=["csv", "xlsx", "xls", "json", "jsonl"], key="delta_file")
+    if delta_file is not None and st.sidebar.button("Ajouter au jeu historique"):
+        try:
+            append_info = history.append(delta_file.name, delta_file.getvalue())
+            st.sidebar.success(f"Version {append_info['version']} : {append_info['added']} lignes ajoutées, "
+                               f"{append_info['duplicates_in_history']} déjà présentes, "
+                               f"{append_info['duplicates_in_delta']} répétées dans le fichier "
+                               f"({append_info['seconds'] + append_info.get('derived_seconds', 0):.2f} s)")
+        except Exception as e:
+            st.sidebar.error(f"Erreur lors de l'ajout : {e}")
+
+# Query backend: filters and aggregations over a loaded frame run in pandas unless DuckDB (over Parquet,
+# multi-threaded) is asked for; DuckDB also queries a local file larger than RAM without pandas ever
+# loading it: only a deterministic sample is kept in memory for the text panels and raw charts.
+query_mode = "pandas"
+ooc_source = None
+if query_backend.available():
+    query_mode = st.sidebar.radio("Moteur de requêtes", query_backend.BACKENDS, horizontal=True,
+                                  help="Auto : pandas pour les données chargées, DuckDB pour un fichier local hors mémoire")
+    if query_mode != "pandas":
+        ooc_path = st.sidebar.text_input("Chemin local hors mémoire (CSV / JSON lines / Parquet)").strip()
+        if ooc_path:
+            if os.path.isfile(ooc_path):
+                ooc_source = ooc_path
+            else:
+                st.sidebar.error(f"Fichier introuvable : {ooc_path}")
+
+@st.cache_resource(max_entries=2)
+def get_file_backend(source, mtime):
+    return query_backend.file_backend(source)
+
+@st.cache_resource(max_entries=2)
+def get_backend_sample(key, _backend, sample_fraction):
+    return _backend.fetch(None, sample_fraction)
+
+def load_out_of_core(source):
+    try:
+        backend, info = get_file_backend(source, os.path.getmtime(source))
+    except Exception as e:
+        st.error(f"Erreur lors de la conversion DuckDB : {e}")
+        return None, None, None
+    sample_fraction = min(1.0, query_backend.SAMPLE_ROWS / max(backend.n, 1))
+    return get_backend_sample(info['key'], backend, sample_fraction), dict(info, sample_fraction=sample_fraction), backend
+
+history_snapshot = None
+ooc_backend = None
+with timed("chargement"):
+    if ooc_source is not None:
+        df, load_info, ooc_backend = load_out_of_core(ooc_source)
+    elif history is not None:
+        df, load_info, history_snapshot = history.dataset()
+    elif stream_source is not None:
+        df, load_info = load_streaming(*stream_source, memory_budget_mb)
+    else:
+        df, load_info = load_data(uploaded_file)
 
 # --------------------------
 # If no data -> show instructions
 # --------------------------
+if df is None and history_mode:
+    st.info("L'historique est vide : ajouter un premier fichier delta dans la sidebar pour commencer.")
+    st.stop()
 if df is None:
     st.info("Uploader un dataset (CSV / Excel / JSON) dans la sidebar pour commencer. "
             "Le dataset attendu contient des colonnes comme : client_id, product, product_description, price, rating, review_text, review_language, purchase_date.")
     st.stop()
 
 # --------------------------
-# Data normalisation & basic cleaning
+# Load report (types are already coerced by load_dataset)
 # --------------------------
-# try to coerce types if exist
-if 'price' in df.columns:
-    df['price'] = pd.to_numeric(df['price'], errors='coerce')
-if 'rating' in df.columns:
-    df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
-if 'purchase_date' in df.columns:
-    df['purchase_date'] = pd.to_datetime(df['purchase_date'], errors='coerce')
+load_msg = f"Jeu de données chargé : {df.shape[0]} lignes, {df.shape[1]} colonnes."
+if load_info and 'total_rows' in load_info:
+    load_msg = (f"Jeu de données chargé en streaming : échantillon de {df.shape[0]} lignes sur {load_info['total_rows']}, "
+                f"{df.shape[1]} colonnes — lu en {load_info['seconds']:.2f} s")
+elif load_info and 'backend_rows' in load_info:
+    load_msg = (f"Fichier interrogé hors mémoire par DuckDB : {load_info['backend_rows']} lignes, échantillon de "
+                f"{df.shape[0]} lignes en mémoire — {'Parquet en cache' if load_info['cache_hit'] else 'converti en Parquet'} "
+                f"en {load_info['seconds']:.2f} s")
+elif load_info and 'store_version' in load_info:
+    load_msg = (f"Historique chargé : {df.shape[0]} lignes, {df.shape[1]} colonnes — version {load_info['store_version']}, "
+                f"données jusqu'au {pd.Timestamp(load_info['watermark']).date() if load_info['watermark'] else 'N/A'}")
+elif load_info:
+    load_msg += f" — {'cache disque' if load_info['cache_hit'] else 'chargement à froid'} en {load_info['seconds']:.2f} s"
+if load_info and load_info['peak_rss_mb'] is not None:
+    load_msg += f", RSS max {load_info['peak_rss_mb']:.0f} Mo"
+st.success(load_msg)
 
-st.success(f"Jeu de données chargé : {df.shape[0]} lignes, {df.shape[1]} colonnes.")
+# --------------------------
+# Near-duplicate reviews
+# --------------------------
+# MinHash/LSH clusters (templated texts where only the product name changes) are computed once per
+# dataset and exposed as dup_cluster / dup_cluster_size columns. The toggle swaps the dataset for its
+# deduplicated version (first review of each cluster and product); every per-dataset cache below is
+# keyed by dataset_key, i.e. (dataset key, dedup flag). The clusters are only computed once the
+# toggle is on; in history mode the history's incrementally maintained structures are used otherwise.
+# Dataset-level artifacts (clusters, filter index, cube, scores, term counts) are persisted to the
+# disk tier like the per-filter results: the dataset key holds the content hash (or the history
+# version), so other workers reuse them and a new upload or append never reads a stale one. Frames
+# rebuilt from them in a few ms (clusters joined to the rows, deduplicated rows) stay in memory only.
+def get_duplicate_clusters(dataset_key, df):
+    clusters = shared_cache.get_or_compute(("near_duplicates", dataset_key), lambda: find_near_duplicates(df),
+                                           persist=True)
+    return shared_cache.get_or_compute(("duplicate_clusters", dataset_key), lambda: df.join(clusters))
+
+def get_deduplicated(dataset_key, df):
+    return shared_cache.get_or_compute(("deduplicated", dataset_key), lambda: deduplicate(df, df))
+
+dedup = st.sidebar.checkbox("Dédupliquer les reviews (quasi-doublons)")
+use_history = history_snapshot is not None and not dedup
+dataset_key = load_info['key']
+if dedup and 'review_text' in df.columns:
+    with timed("quasi-doublons"):
+        df = get_duplicate_clusters(dataset_key, df)
+        total_rows = df.shape[0]
+        duplicated_rows = int((df['dup_cluster_size'] > 1).sum())
+        df = get_deduplicated(dataset_key, df)
+    dataset_key = f"{dataset_key}:dedup"
+    st.sidebar.caption(f"{df.shape[0]} reviews conservées sur {total_rows} (une par groupe de quasi-doublons et par produit) ; "
+                       f"{duplicated_rows} reviews appartenaient à un groupe.")
 
 # --------------------------
 # Sidebar filters (interactive)
 # --------------------------
 st.sidebar.subheader("Filtres interactifs")
 
-# Date filter
-if 'purchase_date' in df.columns and df['purchase_date'].notna().any():
-    min_date = df['purchase_date'].min().date()
-    max_date = df['purchase_date'].max().date()
-    date_range = st.sidebar.date_input("Date d'achat", [min_date, max_date])
-    try:
-        start_date = pd.to_datetime(date_range[0])
-        end_date = pd.to_datetime(date_range[1])
-        df = df[(df['purchase_date'] >= start_date) & (df['purchase_date'] <= end_date)]
-    except Exception:
-        pass
-
-# Price filter
-if 'price' in df.columns and df['price'].notna().any():
-    pmin = float(np.nanmin(df['price']))
-    pmax = float(np.nanmax(df['price']))
-    price_range = st.sidebar.slider("Prix", min_value=round(pmin,2), max_value=round(pmax,2), value=(round(pmin,2), round(pmax,2)))
-    df = df[(df['price'] >= price_range[0]) & (df['price'] <= price_range[1])]
-
-# Rating filter
-if 'rating' in df.columns and df['rating'].notna().any():
-    rmin = int(np.nanmin(df['rating']))
-    rmax = int(np.nanmax(df['rating']))
-    rating_range = st.sidebar.slider("Note", min_value=rmin, max_value=rmax, value=(rmin, rmax))
-    df = df[(df['rating'] >= rating_range[0]) & (df['rating'] <= rating_range[1])]
-
-# Product search filter
-if 'product' in df.columns:
-    product_search = st.sidebar.text_input("Rechercher produit (nom partiel)")
-    if product_search:
-        df = df[df['product'].str.contains(product_search, case=False, na=False)]
+# Filters resolve to row ids through the per-dataset index (sorted columns + product trigrams);
+# the filtered frame is materialized once at the end. Slider bounds still cascade from the
+# previous filters, as before.
+def get_filter_index(dataset_key, df):
+    return shared_cache.get_or_compute(("filter_index", dataset_key), lambda: FilterIndex(df), persist=True)
+
+@st.cache_resource(max_entries=4)
+def get_frame_backend(dataset_key, _df):
+    return query_backend.frame_backend(dataset_key, _df)
+
+# with DuckDB, "row ids" are SQL conditions and the filtered frame is fetched back from Parquet; a
+# deduplicated out-of-core dataset is the deduplicated sample, queried like an in-memory frame
+backend, sample_fraction = None, 1.0
+if ooc_backend is not None and not dedup:
+    backend, sample_fraction = ooc_backend, load_info['sample_fraction']
+elif query_backend.use_duckdb(query_mode):
+    backend = get_frame_backend(dataset_key, df)
+
+with timed("index des filtres"):
+    if backend is not None:
+        filter_index = backend
+    elif use_history:
+        filter_index = history_snapshot["filter_index"]
+    else:
+        filter_index = get_filter_index(dataset_key, df)
+
+def choose_filter(col, bounds):
+    if col == 'purchase_date':
+        date_range = st.sidebar.date_input("Date d'achat", [pd.Timestamp(bounds[0]).date(), pd.Timestamp(bounds[1]).date()])
+        try:
+            return pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+        except Exception:
+            return None
+    if col == 'price':
+        pmin, pmax = float(bounds[0]), float(bounds[1])
+        return st.sidebar.slider("Prix", min_value=round(pmin,2), max_value=round(pmax,2), value=(round(pmin,2), round(pmax,2)))
+    if col == 'rating':
+        rmin, rmax = int(bounds[0]), int(bounds[1])
+        return st.sidebar.slider("Note", min_value=rmin, max_value=rmax, value=(rmin, rmax))
+    return st.sidebar.text_input("Rechercher produit (nom partiel)")
+
+with timed("filtres"):
+    row_ids, cube_filters, price_narrowed = pipeline.apply_filters(filter_index, choose_filter)
+    dataset_df = df
+    if backend is not None:
+        # fetched once per filter state, not on every rerun
+        df = shared_cache.get_or_compute(("filtered_rows", dataset_key, repr(row_ids), sample_fraction),
+                                         lambda: backend.fetch(row_ids, sample_fraction))
+    else:
+        df = pipeline.filter_frame(df, row_ids)
+
+# Chart rendering mode (raw points vs server-side reduction)
+st.sidebar.subheader("Rendu des graphiques")
+render_mode = st.sidebar.radio("Mode de rendu", ["Auto", "Points bruts", "Agrégé (serveur)"], horizontal=True)
+point_budget = int(st.sidebar.number_input("Budget de points (scatter)", min_value=500, max_value=200000, value=5000, step=500))
+scatter_mode = st.sidebar.radio("Scatter agrégé", ["Échantillon stratifié", "Densité"], horizontal=True)
 
 # --------------------------
 # KPIs
 # --------------------------
 st.header("Indicateurs clés (KPIs)")
+if load_info and 'total_rows' in load_info:
+    st.caption("Mode streaming : les KPIs ci-dessous portent sur l'échantillon filtré, ceux du fichier complet sont affichés plus haut.")
+if dedup and ooc_backend is not None and 'review_text' in dataset_df.columns:
+    st.caption(f"Fichier hors mémoire dédupliqué : la déduplication et les KPIs ci-dessous portent sur l'échantillon "
+               f"de {load_info['sample_fraction']:.1%} ({dataset_df.shape[0]} reviews conservées), pas sur les "
+               f"{ooc_backend.n} lignes du fichier.")
 kpi_col1, kpi_col2, kpi_col3, kpi_col4 = st.columns(4)
 
-num_reviews = int(df.shape[0])
-avg_rating = float(df['rating'].mean()) if 'rating' in df.columns and df['rating'].notna().any() else np.nan
-avg_price = float(df['price'].mean()) if 'price' in df.columns and df['price'].notna().any() else np.nan
-top_product = None
-if 'product' in df.columns and 'rating' in df.columns:
-    grouped = df.groupby('product')['rating'].mean().dropna()
-    if not grouped.empty:
-        top_product = grouped.idxmax()
+# KPIs, pie/donut and Pareto are answered from the aggregate cube (product x day x rating x language),
+# memoized per dataset + filter state. A narrowed price range can't be expressed on the cube
+# dimensions, nor can a date filter on timestamps with a time of day: those slices are built
+# from the filtered rows instead.
+def get_aggregate_cube(dataset_key, df):
+    return shared_cache.get_or_compute(("aggregate_cube", dataset_key), lambda: AggregateCube(df), persist=True)
+
+def compute_cube_slice():
+    if backend is not None:
+        return backend.slice(row_ids)
+    cube = history_snapshot["cube"] if use_history else get_aggregate_cube(dataset_key, dataset_df)
+    return pipeline.cube_slice(cube, df, cube_filters, price_narrowed)
+
+cube_slice_key = (dataset_key, tuple(sorted(cube_filters.items())), price_narrowed)
+with timed("KPIs"):
+    cube_slice = shared_cache.get_or_compute(("cube_slice",) + cube_slice_key, compute_cube_slice, persist=True)
+if backend is not None:
+    st.caption(f"Filtres et agrégats exécutés par DuckDB sur {backend.n} lignes"
+               + (f" ; textes et graphiques sur un échantillon de {sample_fraction:.1%}." if sample_fraction < 1 else "."))
+
+kpis = cube_slice.kpis()
+num_reviews = kpis['num_reviews']
+avg_rating = kpis['avg_rating']
+avg_price = kpis['avg_price']
+top_product = kpis['top_product']
 
 kpi_col1.metric("Nombre de reviews", f"{num_reviews}")
 kpi_col2.metric("Note moyenne", f"{avg_rating:.2f}" if not np.isnan(avg_rating) else "N/A")
 kpi_col3.metric("Prix moyen", f"${avg_price:.2f}" if not np.isnan(avg_price) else "N/A")
 kpi_col4.metric("Produit le mieux noté", top_product if top_product else "N/A")
 
+# Sentiment & topics: every review is scored offline once per dataset (multilingual lexicons, no API
+# call) and persisted per client_id, so a re-upload only scores new or changed rows; the per-filter
+# summaries are memoized like the cube slices.
+def get_review_scores(dataset_key, df):
+    return shared_cache.get_or_compute(("review_scores", dataset_key), lambda: score_reviews(df), persist=True)
+
+with timed("sentiment & thèmes"):
+    if use_history and history_snapshot["scores"] is not None:
+        review_scores = history_snapshot["scores"]
+        scoring_info = {"scored": 0, "reused": len(review_scores)}
+    else:
+        review_scores, scoring_info = get_review_scores(dataset_key, dataset_df)
+topic_summary = None
+if review_scores is not None:
+    def compute_text_summary():
+        scores = review_scores.loc[df.index]
+        return sentiment_kpis(scores), topic_breakdown(df, scores)
+    with timed("sentiment & thèmes"):
+        sentiment, topic_summary = shared_cache.get_or_compute(("text_summary",) + cube_slice_key, compute_text_summary,
+                                                               persist=True)
+    sent_col1, sent_col2, sent_col3 = st.columns(3)
+    sent_col1.metric("Sentiment moyen", f"{sentiment['avg_sentiment']:+.2f}" if not np.isnan(sentiment['avg_sentiment']) else "N/A")
+    sent_col2.metric("Avis positifs", f"{sentiment['positive_share']:.0%}" if not np.isnan(sentiment['positive_share']) else "N/A")
+    sent_col3.metric("Avis négatifs", f"{sentiment['negative_share']:.0%}" if not np.isnan(sentiment['negative_share']) else "N/A")
+    st.caption(f"Sentiment calculé hors ligne (lexiques multilingues) — {scoring_info['scored']} reviews scorées, "
+               f"{scoring_info['reused']} reprises du cache.")
+
 st.markdown("---")
 
 # --------------------------
@@ -155,81 +430,126 @@ st.markdown("---")
 st.header("Visualisations avancées")
 
 # Prepare numeric_df for heatmap/pairplot
-numeric_df = df.select_dtypes(include=[np.number])
-
-# 1) Plotly histogram (price)
-if 'price' in df.columns and df['price'].notna().any():
-    fig_price = px.histogram(df, x='price', nbins=25, title="Distribution des prix", labels={'price':'Prix'})
-    st.plotly_chart(fig_price, use_container_width=True)
-
-# 2) Boxplot / Violin plot of ratings by product (Plotly)
-if has_cols(df, ['product','rating']):
-    fig_box = px.box(df, x='product', y='rating', title="Boxplot : note par produit")
-    st.plotly_chart(fig_box, use_container_width=True)
-
-    fig_violin = px.violin(df, x='product', y='rating', box=True, points='all', title="Violin : note par produit")
-    st.plotly_chart(fig_violin, use_container_width=True)
-
-# 3) Scatter Price vs Rating (Plotly)
-if has_cols(df, ['price','rating']):
-    fig_scatter = px.scatter(df, x='price', y='rating', color='product' if 'product' in df.columns else None,
-                             title="Scatter : Prix vs Note", hover_data=['product'] if 'product' in df.columns else None)
-    st.plotly_chart(fig_scatter, use_container_width=True)
-
-# 4) Pie / Donut chart of product distribution (Plotly)
-if 'product' in df.columns:
-    pc = df['product'].value_counts().reset_index()
-    pc.columns = ['product_name', 'count']
-    if not pc.empty:
-        fig_pie = px.pie(pc, values='count', names='product_name', title="Répartition des produits")
-        st.plotly_chart(fig_pie, use_container_width=True)
-
-        # Donut (percent + labels)
-        fig_donut = px.pie(pc, values='count', names='product_name', hole=0.45,
-                           title="Donut : Répartition des produits")
-        st.plotly_chart(fig_donut, use_container_width=True)
-
-# 5) Pareto chart (bar + cumulative line) top products by count
-if 'product' in df.columns:
-    pareto = df['product'].value_counts().reset_index()
-    pareto.columns = ['product', 'count']
-    pareto['cumulative'] = pareto['count'].cumsum() / pareto['count'].sum()
-    fig_pareto = px.bar(pareto.head(20), x='product', y='count', title="Pareto : top produits (count)")
-    fig_pareto.add_scatter(x=pareto.head(20)['product'], y=pareto.head(20)['cumulative'], yaxis="y2", mode='lines+markers', name='Cumulé')
-    fig_pareto.update_layout(
-        yaxis=dict(title='Count'),
-        yaxis2=dict(title='Cumulative %', overlaying='y', side='right', tickformat='.0%'),
-        xaxis_tickangle=-45
-    )
-    st.plotly_chart(fig_pareto, use_container_width=True)
-
-# 6) Pairplot & heatmap using seaborn for numeric columns (if enough numeric cols)
-if numeric_df.shape[1] >= 2:
-    with st.expander("Pairplot & Heatmap (seaborn)"):
-        # Pairplot: may be slow for big datasets - sample if large
-        sample_df = numeric_df.sample(n=min(200, numeric_df.shape[0]), random_state=42)
-        pair_fig = sns.pairplot(sample_df)
-        st.pyplot(pair_fig)
-
-        # Heatmap
-        fig_h, ax_h = plt.subplots(figsize=(6, 5))
-        sns.heatmap(numeric_df.corr(), annot=True, cmap='coolwarm', ax=ax_h)
-        st.pyplot(fig_h)
-
-# 7) WordCloud from review_text
+numeric_df = df.select_dtypes(include=[np.number]).drop(columns=['dup_cluster', 'dup_cluster_size'], errors='ignore')
+
+# Server-side rendering: above the point budget, bins / quartiles / KDEs are computed here and only
+# the reduced series are shipped to the browser (raw-point charts serialize every row)
+server_render = pipeline.use_server_render(render_mode, df.shape[0], point_budget)
+if server_render:
+    st.caption(f"Rendu agrégé côté serveur ({df.shape[0]} lignes, budget {point_budget} points).")
+
+# price histogram, box of ratings by product, price vs rating scatter and Pareto; the violin (every
+# point in raw mode) and the pie / donut are only built when selected
+extra_charts = st.multiselect("Graphiques supplémentaires", list(pipeline.OPTIONAL_CHARTS),
+                              format_func=pipeline.OPTIONAL_CHARTS.get)
+with timed("graphiques"):
+    chart_names = [name for name in pipeline.CHARTS if name not in pipeline.OPTIONAL_CHARTS or name in extra_charts]
+    charts = pipeline.build_charts(df, cube_slice, server_render, point_budget,
+                                   scatter_mode="density" if scatter_mode == "Densité" else "sample", names=chart_names)
+    for fig in charts.values():
+        st.plotly_chart(fig, use_container_width=True)
+
+# Topics mentioned per product (share of the product's reviews), with their mean sentiment
+if topic_summary is not None and not topic_summary.empty:
+    st.subheader("Thèmes par produit")
+    st.plotly_chart(pipeline.topic_breakdown_figure(topic_summary), use_container_width=True)
+    with st.expander("Détail des thèmes (sentiment moyen par thème)"):
+        st.dataframe(topic_summary.sort_values(["product", "reviews"], ascending=[True, False]), use_container_width=True)
+
+# Trends: reviews, mean rating and price per product and day / week / month, resampled from the cube
+# slice (cost ~ cells, not rows) with rolling means and z-scores against each product's previous
+# periods; memoized per filter state with the other derived artifacts. In history mode, the previous
+# version's trends for the same filters are extended with the appended delta's cells.
+if 'purchase_date' in df.columns and 'product' in df.columns:
+    st.subheader("Tendances & alertes")
+    trend_col1, trend_col2, trend_col3, trend_col4 = st.columns(4)
+    trend_freq = trend_col1.radio("Période", list(trends.FREQUENCIES), index=1, format_func=trends.FREQUENCIES.get,
+                                  horizontal=True)
+    trend_window = int(trend_col2.number_input("Fenêtre glissante (périodes)", min_value=2, max_value=52,
+                                               value=trends.WINDOW))
+    trend_z = trend_col3.slider("Seuil d'alerte (z)", min_value=1.5, max_value=5.0, value=trends.Z_THRESHOLD, step=0.5)
+    trend_metric = trend_col4.selectbox("Indicateur", list(pipeline.TREND_METRICS), format_func=pipeline.TREND_METRICS.get)
+    with timed("tendances"):
+        trend_delta = None
+        if use_history and backend is None and history_snapshot["delta"] is not None:
+            added = pipeline.delta_slice(history_snapshot["delta"]["cube"], history_snapshot["cube"],
+                                         cube_filters, price_narrowed)
+            if added is not None:
+                trend_delta = ((history_snapshot["delta"]["key"],) + cube_slice_key[1:], added)
+        trend_frame = trends.cached_trends(shared_cache, cube_slice_key, cube_slice, trend_freq, trend_window,
+                                           trend_delta)
+        if trend_frame is None:
+            st.write("Aucune date d'achat exploitable pour les tendances.")
+        else:
+            trend_alerts = trends.trend_alerts(trend_frame, trend_z)
+            trend_totals = trend_frame.groupby("product")["reviews"].sum().sort_values(ascending=False)
+            trend_products = st.multiselect("Produits affichés", list(trend_totals.index),
+                                            default=list(trend_totals.index[:5]))
+            shown = trend_frame[trend_frame["product"].isin(trend_products)]
+            if not shown.empty:
+                st.plotly_chart(pipeline.trend_figure(shown, trend_metric,
+                                                      trend_alerts[trend_alerts["produit"].isin(trend_products)]),
+                                use_container_width=True)
+            st.caption(f"{len(trend_alerts)} alertes (|z| ≥ {trend_z:g} contre les {trend_window} périodes précédentes du produit, "
+                       f"au moins {trends.MIN_REVIEWS} reviews notées pour une baisse de note).")
+            if not trend_alerts.empty:
+                st.dataframe(trend_alerts, hide_index=True, use_container_width=True)
+
+# Matplotlib / seaborn output (pairplot, heatmap, wordcloud, product panel, report figures) is rendered
+# to PNG bytes and closed at once, memoized per (chart, product, filter state, dataset key) in a
+# size-bounded LRU shared by every session (single-flight, disk tier with THORFIN_SHARED_CACHE_DIR);
+# the panel and the HTML / PDF exports reuse the same renders.
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(disk_dir=os.path.join(SHARED_CACHE_DIR, "figures") if SHARED_CACHE_DIR else None)
+
+figure_cache = get_figure_cache()
+filter_state = cube_slice_key[1:]
+
+# Pairplot & heatmap using seaborn for numeric columns (if enough numeric cols)
+if numeric_df.shape[1] >= 2 and st.toggle("Afficher pairplot & heatmap (seaborn)"):
+    with timed("pairplot & heatmap"):
+        st.image(figure_cache.render("pairplot", None, filter_state, dataset_key,
+                                     lambda: pipeline.pairplot_figure(numeric_df)))
+        def build_heatmap():
+            corr = backend.correlation(list(numeric_df.columns), row_ids) if backend is not None else None
+            return pipeline.heatmap_figure(numeric_df, corr)
+        st.image(figure_cache.render("heatmap", None, filter_state, dataset_key, build_heatmap))
+
+# WordCloud from review_text
+# Term counts per (product, language) are built once per dataset by streaming review_text in
+# batches, with per-language stopwords; product/language filters are answered from them. Other
+# filters (dates, ratings, price) are counted on the filtered rows, memoized per filter state.
+def get_term_counts(dataset_key, df, exclude_product_names):
+    return shared_cache.get_or_compute(
+        ("term_counts", dataset_key, exclude_product_names),
+        lambda: build_term_counts(df, mode="auto", exclude_product_names=exclude_product_names), persist=True)
+
 if 'review_text' in df.columns:
-    st.subheader("WordCloud des reviews (Top 2000 caractères)")
-    text = " ".join(df['review_text'].dropna().astype(str).tolist())
-    if text.strip() == "":
-        st.write("Aucun texte de review disponible.")
-    else:
-        stopwords = set(STOPWORDS)
-        wc = WordCloud(width=900, height=400, background_color='white', stopwords=stopwords, collocations=False)
-        wc.generate(text[:2000])
-        fig_wc, ax_wc = plt.subplots(figsize=(12,4))
-        ax_wc.imshow(wc, interpolation='bilinear')
-        ax_wc.axis('off')
-        st.pyplot(fig_wc)
+    st.subheader("WordCloud des reviews")
+    # term counts and the cloud itself are only built once the panel is shown
+    if st.toggle("Afficher le WordCloud"):
+        with timed("wordcloud"):
+            exclude_names = st.checkbox("Exclure les noms de produits", value=True)
+            only_product_filter = (price_narrowed is None and cube_filters["date_range"] is None
+                                   and cube_filters["rating_range"] is None)
+            if only_product_filter:
+                if use_history and exclude_names:
+                    term_counts = history_snapshot["term_counts"]
+                else:
+                    term_counts = get_term_counts(dataset_key, dataset_df, exclude_names)
+                products = df['product'].dropna().unique() if cube_filters["products"] is not None else None
+                freqs = term_counts.frequencies(products=products)
+            else:
+                freqs = shared_cache.get_or_compute(
+                    ("filtered_term_counts",) + cube_slice_key + (exclude_names,),
+                    lambda: build_term_counts(df, mode="auto", exclude_product_names=exclude_names).frequencies(),
+                    persist=True)
+            if not freqs:
+                st.write("Aucun texte de review disponible.")
+            else:
+                st.image(figure_cache.render("wordcloud", None, (filter_state, exclude_names), dataset_key,
+                                             lambda: pipeline.wordcloud_figure(freqs)))
 
 st.markdown("---")
 
@@ -255,65 +575,125 @@ with prod_col1:
     else:
         st.write("Aucun review disponible pour ce produit.")
 
+product_figure_key = {"product": str(selected_product), "filter_state": filter_state, "dataset_version": dataset_key}
 with prod_col2:
-    # small charts for selected product
-    if 'rating' in product_df.columns:
-        fig_r, ax_r = plt.subplots()
-        sns.histplot(product_df['rating'].dropna(), bins=5, ax=ax_r)
-        ax_r.set_title("Distribution des notes")
-        st.pyplot(fig_r)
-    if 'price' in product_df.columns:
-        fig_p, ax_p = plt.subplots()
-        sns.boxplot(x=product_df['price'].dropna(), ax=ax_p)
-        ax_p.set_title("Distribution prix (boxplot)")
-        st.pyplot(fig_p)
+    # small charts for selected product (the same renders as in the reports)
+    with timed("panneau produit"):
+        for img in render_product_figures(product_df, wordcloud=False, cache=figure_cache, **product_figure_key).values():
+            st.image(img)
 
 # --------------------------
 # AI Summary button (Azure GPT-5)
 # --------------------------
 st.markdown("---")
 st.header("AI : Résumé automatique des reviews")
+
+@st.cache_resource
+def get_ai_tracker():
+    # process-wide, so the percentiles cover every session served by this instance
+    return LatencyTracker()
+
+ai_tracker = get_ai_tracker()
 ai_col1, ai_col2 = st.columns([3,1])
 with ai_col1:
     ai_prompt_extra = st.text_area("Contrainte / ton pour le résumé (ex: court, points principaux, suggestions produit)", value="Résumé concis en 4 points : points positifs, axes d'amélioration, tendances, suggestions.")
     if st.button("Générer résumé AI pour le produit sélectionné"):
-        reviews_to_send = "\n".join(product_df['review_text'].dropna().astype(str).tolist()[:30])
+        reviews_list = product_df['review_text'].dropna().astype(str).tolist()[:30]
+        reviews_to_send = "\n".join(reviews_list)
         if not reviews_to_send.strip():
             st.warning("Pas assez de texte dans les reviews pour générer un résumé.")
         else:
-            system_msg = "You are a concise product insights assistant that summarizes customer reviews, extracts main pros/cons, and gives suggestions."
+            system_msg = SYSTEM_MSG
             user_msg = f"{ai_prompt_extra}\n\nReviews:\n{reviews_to_send}"
-            try:
-                response = client.chat.completions.create(
-                    messages=[
-                        {"role":"system", "content": system_msg},
-                        {"role":"user", "content": user_msg}
-                    ],
-                    model=DEPLOYMENT_NAME,
-                    max_tokens=700,
-                    temperature=0.2
-                )
-                ai_summary = response.choices[0].message.content
-                st.subheader("Résumé AI")
+            summary_cache = SummaryCache()
+            summary_key = SummaryCache.key(selected_product, reviews_list, ai_prompt_extra, DEPLOYMENT_NAME)
+            lookup_start = time.perf_counter()
+            cached_summary = summary_cache.get(summary_key)
+            st.subheader("Résumé AI")
+            if cached_summary is not None:
+                ai_summary = cached_summary["summary"]
+                ai_tracker.record(total=time.perf_counter() - lookup_start, cache_hit=True, label=selected_product)
                 st.write(ai_summary)
-            except Exception as e:
-                st.error(f"Erreur Azure OpenAI : {e}")
+                st.caption("Résumé servi depuis le cache.")
+            else:
+                try:
+                    # streamed: tokens are rendered as they arrive, TTFT / latency / tokens are recorded
+                    request_start = time.perf_counter()
+                    response = get_ai_client().chat.completions.create(
+                        messages=[
+                            {"role":"system", "content": system_msg},
+                            {"role":"user", "content": user_msg}
+                        ],
+                        model=DEPLOYMENT_NAME,
+                        max_tokens=700,
+                        temperature=0.2,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    ai_summary = st.write_stream(timed_stream(
+                        response, ai_tracker, prompt_tokens=estimate_tokens(system_msg) + estimate_tokens(user_msg),
+                        label=selected_product, started_at=request_start))
+                    summary_cache.put(summary_key, {"summary": ai_summary, "reviews": len(reviews_list), "calls": 1})
+                except Exception as e:
+                    st.error(f"Erreur Azure OpenAI : {e}")
 
 with ai_col2:
     st.info("Astuce : réduis la taille des reviews à 30 premiers pour limiter les tokens.")
 
+# Batch mode: map-reduce over all reviews of every (filtered) product, concurrent async calls,
+# rate-limit backoff, optional token budget, results cached on disk
+with st.expander("Résumés AI de tout le catalogue (mode batch)"):
+    batch_col1, batch_col2 = st.columns(2)
+    batch_concurrency = batch_col1.slider("Requêtes simultanées", min_value=1, max_value=16, value=4)
+    batch_budget = batch_col2.number_input("Budget total de tokens (0 = illimité)", min_value=0, value=0, step=10000)
+    if st.button("Générer les résumés pour tous les produits"):
+        batch_input = reviews_by_product(df)
+        batch_progress = st.progress(0.0, text=f"0 / {len(batch_input)} produits")
+        batch_done = []
+        def on_batch_result(product, result):
+            batch_done.append(product)
+            batch_progress.progress(len(batch_done) / len(batch_input), text=f"{len(batch_done)} / {len(batch_input)} produits — {product}")
+        try:
+            st.session_state["batch_summaries"] = run_batch(
+                df, ai_prompt_extra, AZURE_ENDPOINT, API_KEY, API_VERSION, DEPLOYMENT_NAME,
+                concurrency=batch_concurrency, max_total_tokens=batch_budget or None, on_result=on_batch_result,
+                tracker=ai_tracker)
+        except Exception as e:
+            st.error(f"Erreur Azure OpenAI : {e}")
+    batch_summaries = st.session_state.get("batch_summaries")
+    if batch_summaries:
+        st.dataframe(pd.DataFrame([
+            {"produit": p, "reviews": r["reviews"], "appels API": r["calls"], "cache": r["cached"], "erreur": r.get("error", "")}
+            for p, r in batch_summaries.items()
+        ]), use_container_width=True)
+        for product_name, result in batch_summaries.items():
+            if "summary" in result:
+                st.markdown(f"**{product_name}**")
+                st.write(result["summary"])
+
+# Latency over the recent AI calls of this server process (streamed, batch and cache hits)
+with st.expander("Latence AI (appels récents)"):
+    ai_stats = ai_tracker.summary()
+    if not ai_stats["calls"]:
+        st.write("Aucun appel AI enregistré pour l'instant.")
+    else:
+        def fmt_seconds(value):
+            return f"{value:.2f} s" if value is not None else "N/A"
+        lat_col1, lat_col2, lat_col3, lat_col4 = st.columns(4)
+        lat_col1.metric("TTFT p50 / p95", f"{fmt_seconds(ai_stats['ttft'][50])} / {fmt_seconds(ai_stats['ttft'][95])}")
+        lat_col2.metric("Latence p50 / p95", f"{fmt_seconds(ai_stats['total'][50])} / {fmt_seconds(ai_stats['total'][95])}")
+        lat_col3.metric("Taux de cache", f"{ai_stats['cache_hit_rate']:.0%}")
+        lat_col4.metric("Appels", f"{ai_stats['calls']}")
+        st.caption("Percentiles hors cache ; avec le cache, latence p50 / p95 : "
+                   f"{fmt_seconds(ai_stats['total_with_cache'][50])} / {fmt_seconds(ai_stats['total_with_cache'][95])}")
+        st.dataframe(pd.DataFrame(ai_tracker.records()[::-1]), use_container_width=True)
+
 # --------------------------
 # Export: HTML & PDF
 # --------------------------
 st.markdown("---")
 st.header("Rapports : Export HTML & PDF")
 
-def fig_to_base64_matplotlib(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode('utf-8')
-
 def save_plotly_png(fig):
     """Render a Plotly figure as PNG bytes (requires kaleido installed in environment)."""
     try:
@@ -322,172 +702,64 @@ def save_plotly_png(fig):
     except Exception:
         return None
 
+# Figures are rendered in memory by reports.py and embedded directly (base64 in HTML, BytesIO in PDF);
+# `python reports.py data.csv --out exports/` exports every product in parallel.
+
 # HTML export
 if st.button("Générer rapport HTML pour le produit sélectionné"):
-    # prepare images encoded in base64
-    imgs = {}
-    # matplotlib small plots
-    # rating hist
-    if 'rating' in product_df.columns and not product_df['rating'].dropna().empty:
-        fig_h, ax_h = plt.subplots()
-        sns.histplot(product_df['rating'], bins=5, ax=ax_h)
-        ax_h.set_title("Distribution des notes")
-        imgs['hist_rating'] = fig_to_base64_matplotlib(fig_h)
-        plt.close(fig_h)
-    # price box
-    if 'price' in product_df.columns and not product_df['price'].dropna().empty:
-        fig_b, ax_b = plt.subplots()
-        sns.boxplot(x=product_df['price'].dropna(), ax=ax_b)
-        ax_b.set_title("Distribution des prix")
-        imgs['box_price'] = fig_to_base64_matplotlib(fig_b)
-        plt.close(fig_b)
-    # wordcloud
-    if 'review_text' in product_df.columns:
-        text = " ".join(product_df['review_text'].dropna().astype(str).tolist())
-        if text.strip():
-            wc = WordCloud(width=800, height=300, background_color='white', stopwords=set(STOPWORDS)).generate(text[:2000])
-            fig_wc, ax_wc = plt.subplots(figsize=(10,3))
-            ax_wc.imshow(wc); ax_wc.axis('off')
-            imgs['wordcloud'] = fig_to_base64_matplotlib(fig_wc)
-            plt.close(fig_wc)
+    imgs = render_product_figures(product_df, cache=figure_cache, **product_figure_key)
     # KPIs & summary text
     html_summary_text = ai_summary if 'ai_summary' in locals() else (ai_summary if 'ai_summary' in globals() else "")
+    html = build_html_report(selected_product, product_df, imgs, html_summary_text, sample_reviews)
 
-    # build HTML
-    html = f"""<!doctype html>
-<html lang="fr">
-<head>
-<meta charset="utf-8">
-<title>Thorfin Report - {selected_product}</title>
-<style>
-body{{font-family:Arial, Helvetica, sans-serif; background:#f5f7fa; color:#111; padding:18px}}
-.header{{background:linear-gradient(90deg,#0b8453,#0f172a); color:white; padding:16px; border-radius:8px; text-align:center}}
-.container{{max-width:1100px; margin:18px auto}}
-.card{{background:white; padding:14px; border-radius:8px; box-shadow:0 6px 14px rgba(0,0,0,0.06); margin-bottom:14px}}
-.kpi{{display:flex; gap:18px; flex-wrap:wrap}}
-.kpi .item{{flex:1; min-width:160px; padding:12px; border-radius:6px; background:#f8fafc; text-align:center}}
-img{{max-width:100%; height:auto; display:block; margin:8px auto}}
-pre{{background:#f3f4f6; padding:12px; border-radius:6px; overflow:auto}}
-</style>
-</head>
-<body>
-<div class="container">
-<div class="header"><h1>Thorfin Product Insights — {selected_product}</h1></div>
-
-<div class="card">
-  <h2>KPIs</h2>
-  <div class="kpi">
-    <div class="item"><strong>Nombre de reviews</strong><div>{product_df.shape[0]}</div></div>
-    <div class="item"><strong>Note moyenne</strong><div>{product_df['rating'].mean() if 'rating' in product_df.columns else 'N/A'}</div></div>
-    <div class="item"><strong>Prix moyen</strong><div>${product_df['price'].mean() if 'price' in product_df.columns else 'N/A'}</div></div>
-  </div>
-</div>
-"""
-
-    # add images
-    if 'hist_rating' in imgs:
-        html += f"""
-        <div class="card"><h2>Distribution des notes</h2>
-        <img src="data:image/png;base64,{imgs['hist_rating']}"></div>
-        """
-    if 'box_price' in imgs:
-        html += f"""
-        <div class="card"><h2>Distribution des prix</h2>
-        <img src="data:image/png;base64,{imgs['box_price']}"></div>
-        """
-    if 'wordcloud' in imgs:
-        html += f"""
-        <div class="card"><h2>WordCloud (reviews)</h2>
-        <img src="data:image/png;base64,{imgs['wordcloud']}"></div>
-        """
-
-    html += f"""
-    <div class="card"><h2>Résumé AI</h2><pre>{html_summary_text}</pre></div>
-    <div class="card"><h2>Extraits de reviews</h2><pre>{textwrap.fill(' '.join(sample_reviews), width=120)}</pre></div>
-    <div style="text-align:center; font-size:12px; color:#666; margin-top:12px">Généré le {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}</div>
-    </div></body></html>
-    """
-
-    # save html file
-    html_filename = f"{selected_product}_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.html"
-    with open(html_filename, "w", encoding="utf-8") as f:
+    # save html file in this session's output directory
+    html_filename = f"{report_basename(selected_product)}.html"
+    html_path = os.path.join(session_output_dir(session_id), html_filename)
+    with open(html_path, "w", encoding="utf-8") as f:
         f.write(html)
-    with open(html_filename, "rb") as f:
+    with open(html_path, "rb") as f:
         st.success(f"Rapport HTML généré : {html_filename}")
         st.download_button("Télécharger HTML", f, file_name=html_filename)
 
 # PDF export
 if st.button("Générer PDF pro (avec graphiques)"):
-    tmp_files = []
     try:
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, f"Thorfin Product Insights - {selected_product}", 0, 1, 'C')
-        pdf.ln(4)
-        pdf.set_font("Arial", "", 11)
-        pdf.cell(0, 8, f"Nombre de reviews: {product_df.shape[0]}", 0, 1)
-        if 'rating' in product_df.columns:
-            pdf.cell(0, 8, f"Note moyenne: {product_df['rating'].mean():.2f}", 0, 1)
-        if 'price' in product_df.columns:
-            pdf.cell(0, 8, f"Prix moyen: ${product_df['price'].mean():.2f}", 0, 1)
-        pdf.ln(4)
-
-        # plots -> temp files
-        if 'rating' in product_df.columns and not product_df['rating'].dropna().empty:
-            fig_tmp, ax_tmp = plt.subplots()
-            sns.histplot(product_df['rating'], bins=5, ax=ax_tmp)
-            ax_tmp.set_title("Distribution des notes")
-            t = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            fig_tmp.savefig(t.name, bbox_inches='tight')
-            plt.close(fig_tmp)
-            tmp_files.append(t.name)
-            pdf.image(t.name, x=10, w=pdf.w - 20)
-
-        if 'price' in product_df.columns and not product_df['price'].dropna().empty:
-            fig_tmp2, ax_tmp2 = plt.subplots()
-            sns.boxplot(x=product_df['price'].dropna(), ax=ax_tmp2)
-            ax_tmp2.set_title("Boxplot prix")
-            t2 = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            fig_tmp2.savefig(t2.name, bbox_inches='tight')
-            plt.close(fig_tmp2)
-            tmp_files.append(t2.name)
-            pdf.add_page()
-            pdf.image(t2.name, x=10, w=pdf.w - 20)
-
-        # AI summary
-        if 'ai_summary' in locals() and ai_summary:
-            pdf.add_page()
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 8, "Résumé AI", 0, 1)
-            pdf.set_font("Arial", "", 10)
-            # split into chunks for multi_cell
-            for line in ai_summary.split("\n"):
-                pdf.multi_cell(0, 6, line)
-
-        # Save PDF
-        pdf_filename = f"{selected_product}_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf.output(pdf_filename)
-
-        # cleanup tmp files AFTER output (avoids Windows file lock issues)
-        for tmp in tmp_files:
-            try:
-                os.unlink(tmp)
-            except Exception:
-                pass
-
-        with open(pdf_filename, "rb") as f:
-            st.success(f"PDF généré : {pdf_filename}")
-            st.download_button("Télécharger PDF", f, file_name=pdf_filename)
+        imgs = render_product_figures(product_df, wordcloud=False, cache=figure_cache, **product_figure_key)
+        pdf_summary_text = ai_summary if 'ai_summary' in locals() and ai_summary else ""
+        pdf_bytes = build_pdf_report(selected_product, product_df, imgs, pdf_summary_text)
+
+        # Save PDF in this session's output directory
+        pdf_filename = f"{report_basename(selected_product)}.pdf"
+        with open(os.path.join(session_output_dir(session_id), pdf_filename), "wb") as f:
+            f.write(pdf_bytes)
+        st.success(f"PDF généré : {pdf_filename}")
+        st.download_button("Télécharger PDF", pdf_bytes, file_name=pdf_filename)
 
     except Exception as e:
         st.error(f"Erreur génération PDF : {e}")
-        # attempt cleanup
-        for tmp in tmp_files:
-            try:
-                os.unlink(tmp)
-            except Exception:
-                pass
 
 st.markdown("---")
 st.caption("Dashboard généré localement. Pour déployer en production, configure une instance Azure/GCP/AWS et sécurise la clé Azure OpenAI.")
+
+# --------------------------
+# Run timings (cold start / this rerun)
+# --------------------------
+@st.cache_resource
+def get_cold_start_imports():
+    # first call happens on the process's first run, i.e. with cold imports
+    return import_seconds
+
+with st.sidebar.expander("Temps d'exécution (ce rerun)"):
+    st.caption(f"Imports : {get_cold_start_imports():.2f} s au démarrage à froid, {import_seconds:.2f} s sur ce rerun.")
+    st.dataframe(pd.DataFrame({"section": list(run_timings), "ms": [round(v * 1000, 1) for v in run_timings.values()]}),
+                 hide_index=True, use_container_width=True)
+    st.caption(f"Script complet : {time.perf_counter() - _import_start:.2f} s.")
+
+# Shared cache counters (every session of this process)
+with st.sidebar.expander("Cache partagé (toutes les sessions)"):
+    cache_stats = pd.DataFrame([dict(cache="données dérivées", **shared_cache.stats()),
+                                dict(cache="figures", **figure_cache.stats())])
+    cache_stats["Mo"] = (cache_stats.pop("bytes") / 1024 ** 2).round(1)
+    cache_stats["Mo max"] = (cache_stats.pop("max_bytes") / 1024 ** 2).round(0)
+    cache_stats["disque Mo"] = (cache_stats.pop("disk_bytes").astype(float) / 1024 ** 2).round(1)
+    st.dataframe(cache_stats.set_index("cache"), use_container_width=True)
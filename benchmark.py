@@ -0,0 +1,246 @@
+"""Per-stage benchmark of the dashboard pipeline on synthetic data.
+
+For each scale, a synthetic dataset (synthetic_data.py) is generated once and
+reused, then every stage of pipeline.py runs in dashboard order and reports
+wall time, peak traced memory and output size. Results are JSON, stable in
+layout so two runs can be diffed, and --compare flags the stages that got
+slower than a previous run (non-zero exit status, for CI):
+
+    python benchmark.py --scales 10000,100000,1000000 > bench_output.txt
+    python benchmark.py --scales 10000,100000 --compare bench_output.txt
+
+Peak memory comes from tracemalloc (numpy and pandas buffers included), which
+slows Python-heavy stages down; --no-trace times without it and reports only
+the process RSS high-water mark.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import query_backend
+import trends
+from aggregate_cube import AggregateCube
+from dedup import find_near_duplicates
+from dataset_cache import load_dataset, normalize_frame, peak_rss_mb, read_upload
+from dataset_store import append_frame
+from filter_index import FilterIndex
+from figures import fig_to_png
+from reports import generate_product_reports
+from synthetic_data import write_synthetic
+from text_scoring import score_batches
+from word_freq import build_term_counts
+
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+POINT_BUDGET = 5000
+
+
+def output_size(value):
+    """Bytes of a stage result, as it would be shipped or stored (None for index-like objects)."""
+    if value is None:
+        return 0
+    if isinstance(value, tuple):
+        return output_size(value[0])
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict) and all(isinstance(v, bytes) for v in value.values()):
+        return sum(len(v) for v in value.values())
+    if isinstance(value, dict):
+        return len(json.dumps(value, default=str))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "to_json"):  # plotly figure
+        return len(value.to_json())
+    return None
+
+
+class StageTimer:
+    def __init__(self, trace=True):
+        self.trace = trace
+        self.stages = []
+
+    def run(self, name, func, *args, **kwargs):
+        gc.collect()
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = None
+        if self.trace:
+            peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+        self.stages.append({
+            "stage": name,
+            "seconds": round(seconds, 6),
+            "peak_mb": round(peak, 3) if peak is not None else None,
+            "rss_mb": peak_rss_mb(),
+            "output_bytes": output_size(result),
+        })
+        return result
+
+
+def benchmark_filters():
+    """The filter state used at every scale: middle half of the dates, full price range,
+    ratings 3-5 and a product search."""
+    def choose(col, bounds):
+        if col == 'purchase_date':
+            lo, hi = pd.Timestamp(bounds[0]), pd.Timestamp(bounds[1])
+            return lo + (hi - lo) / 4, hi - (hi - lo) / 4
+        if col == 'price':
+            return float(bounds[0]), float(bounds[1])
+        if col == 'rating':
+            return 3, int(bounds[1])
+        return "air"
+    return choose
+
+
+def run_scale(path, trace=True):
+    timer = StageTimer(trace)
+    with open(path, "rb") as f:
+        data = f.read()
+    name = os.path.basename(path)
+
+    raw = timer.run("parse", read_upload, name, data)
+    timer.run("coerce", normalize_frame, raw)
+    del raw
+    with tempfile.TemporaryDirectory() as cache_dir:
+        timer.run("load_cold", load_dataset, name, data, cache_dir)
+        df, _ = timer.run("load_warm", load_dataset, name, data, cache_dir)
+    del data
+
+    index = timer.run("filter_index", FilterIndex, df)
+    row_ids, cube_filters, price_narrowed = timer.run("filters", pipeline.apply_filters, index, benchmark_filters())
+    filtered = timer.run("filter_frame", pipeline.filter_frame, df, row_ids)
+    cube = timer.run("aggregate_cube", AggregateCube, df)
+    slice_ = pipeline.cube_slice(cube, filtered, cube_filters, price_narrowed)
+    timer.run("kpis", lambda: pipeline.cube_slice(cube, filtered, cube_filters, price_narrowed).kpis())
+
+    # history mode: merging a 1 % delta, as dataset_store.IncrementalDataset does on append
+    delta = df.iloc[:max(1, len(df) // 100)].reset_index(drop=True)
+    timer.run("append_frame", append_frame, df, delta)
+    timer.run("append_filter_index", index.append, delta)
+    timer.run("append_cube", cube.append, delta)
+    del delta
+    for freq in trends.FREQUENCIES:
+        trend_frame = timer.run(f"trends_{freq}", trends.build_trends, slice_, freq)
+    timer.run("trend_alerts", trends.trend_alerts, trend_frame)
+
+    if query_backend.available():
+        with tempfile.TemporaryDirectory() as parquet_dir:
+            parquet = timer.run("duckdb_write", query_backend.write_parquet, df, os.path.join(parquet_dir, "bench.parquet"))
+            backend = query_backend.DuckDBBackend([parquet])
+            conditions = timer.run("duckdb_filters", pipeline.apply_filters, backend, benchmark_filters())[0]
+            timer.run("duckdb_kpis", lambda: backend.slice(conditions).kpis())
+            timer.run("duckdb_fetch", backend.fetch, conditions)
+            del backend
+
+    server_render = pipeline.use_server_render("Auto", filtered.shape[0], POINT_BUDGET)
+    for chart, build in pipeline.CHARTS.items():
+        timer.run(f"chart_{chart}", build, filtered, slice_, server_render, POINT_BUDGET, "sample")
+
+    numeric_df = filtered.select_dtypes(include="number")
+    if numeric_df.shape[1] >= 2:
+        timer.run("pairplot", lambda: fig_to_png(pipeline.pairplot_figure(numeric_df)))
+        timer.run("heatmap", lambda: fig_to_png(pipeline.heatmap_figure(numeric_df)))
+
+    counts = timer.run("term_counts", build_term_counts, df, "auto", exclude_product_names=True)
+    freqs = counts.frequencies()
+    if freqs:
+        timer.run("wordcloud", lambda: fig_to_png(pipeline.wordcloud_figure(freqs)))
+
+    timer.run("text_scoring", score_batches, df['review_text'])
+    timer.run("near_duplicates", find_near_duplicates, df)
+
+    product = df['product'].value_counts().index[0]
+    product_df = df[df['product'] == product]
+    for fmt in ("html", "pdf"):
+        timer.run(f"export_{fmt}", lambda: generate_product_reports(product, product_df, formats=(fmt,))[0])
+
+    return {"rows": int(df.shape[0]), "input_bytes": os.path.getsize(path), "stages": timer.stages}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance, min_seconds=0.01):
+    """Stages slower than the baseline by more than `tolerance` (ratio), ignoring sub-`min_seconds` noise."""
+    previous = {(r["rows"], s["stage"]): s["seconds"] for r in baseline["results"] for s in r["stages"]}
+    regressions = []
+    for r in results["results"]:
+        for s in r["stages"]:
+            before = previous.get((r["rows"], s["stage"]))
+            if before is None or max(before, s["seconds"]) < min_seconds:
+                continue
+            ratio = s["seconds"] / before if before else float("inf")
+            if ratio > 1 + tolerance:
+                regressions.append({"rows": r["rows"], "stage": s["stage"], "before": before,
+                                    "after": s["seconds"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark par étape du pipeline (données synthétiques)")
+    parser.add_argument("--scales", default=",".join(str(n) for n in DEFAULT_SCALES),
+                        help="tailles en lignes, séparées par des virgules")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "thorfin_bench"),
+                        help="dossier des jeux synthétiques (réutilisés d'un run à l'autre)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-trace", action="store_true", help="sans tracemalloc (timings purs, RSS seulement)")
+    parser.add_argument("--out", default="-", help="fichier JSON de sortie (- pour stdout)")
+    parser.add_argument("--compare", help="résultats JSON d'un run précédent")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="ralentissement toléré (0.25 = +25 %%)")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "traced": not args.no_trace,
+        },
+        "results": [],
+    }
+    for rows in (int(n) for n in args.scales.split(",") if n.strip()):
+        path = os.path.join(args.data_dir, f"synthetic_{rows}_{args.seed}.csv")
+        if not os.path.exists(path):
+            print(f"génération de {rows} lignes...", file=sys.stderr)
+            write_synthetic(path, rows, seed=args.seed)
+        print(f"benchmark {rows} lignes...", file=sys.stderr)
+        results["results"].append(run_scale(path, trace=not args.no_trace))
+
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out == "-":
+        print(payload)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"RÉGRESSION {r['stage']} @ {r['rows']} lignes : {r['before']:.3f} s -> {r['after']:.3f} s (x{r['ratio']})",
+                  file=sys.stderr)
+        sys.exit(1 if regressions else 0)
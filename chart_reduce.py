@@ -0,0 +1,136 @@
+"""Server-side reduction of the Plotly charts for large datasets.
+
+Histogram bins, box quartiles/whiskers and violin KDEs are computed in NumPy
+and only the reduced series are sent to the browser. The price/rating scatter
+is either downsampled per product to a point budget or binned into a density
+heatmap, so chart payloads stay bounded whatever the row count.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+KDE_GRID = 200
+VIOLIN_HALF_WIDTH = 0.4
+
+
+def histogram_figure(values, nbins, title, x_label):
+    values = pd.Series(values).dropna().to_numpy(dtype="float64")
+    counts, edges = np.histogram(values, bins=nbins)
+    fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                           name=x_label, hovertemplate=f"{x_label}: %{{x:.2f}}<br>count: %{{y}}<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title="count", bargap=0)
+    return fig
+
+
+def box_stats(df, by, col):
+    """Per-group quartiles and Tukey whiskers (furthest points within 1.5 IQR), like Plotly's own boxes."""
+    data = df[[by, col]].dropna()
+    if data.empty:
+        return pd.DataFrame(columns=["q1", "median", "q3", "mean", "lowerfence", "upperfence"], dtype="float64")
+    grouped = data.groupby(by, observed=True)[col]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ["q1", "median", "q3"]
+    stats["mean"] = grouped.mean()
+    iqr = stats["q3"] - stats["q1"]
+    low = data[by].map(stats["q1"] - 1.5 * iqr).astype("float64")
+    high = data[by].map(stats["q3"] + 1.5 * iqr).astype("float64")
+    inside = data[(data[col] >= low) & (data[col] <= high)]
+    stats["lowerfence"] = inside.groupby(by, observed=True)[col].min()
+    stats["upperfence"] = inside.groupby(by, observed=True)[col].max()
+    return stats
+
+
+def box_figure(df, by, col, title):
+    """None when no row has both values (build_charts skips it)."""
+    stats = box_stats(df, by, col)
+    if stats.empty:
+        return None
+    names = [str(i) for i in stats.index]
+    fig = go.Figure(go.Box(x=names, q1=stats["q1"], median=stats["median"], q3=stats["q3"],
+                           lowerfence=stats["lowerfence"], upperfence=stats["upperfence"],
+                           mean=stats["mean"], name=col))
+    fig.update_layout(title=title, xaxis_title=by, yaxis_title=col)
+    return fig
+
+
+def kde(values, grid):
+    """Gaussian KDE on `grid` (Scott bandwidth), via binning + convolution: O(len(grid)) per group."""
+    n = values.size
+    std = values.std()
+    step = grid[1] - grid[0]
+    if n < 2 or std == 0 or step == 0:
+        density = np.zeros_like(grid)
+        density[np.argmin(np.abs(grid - values.mean()))] = 1.0 if n else 0.0
+        return density
+    bandwidth = 1.06 * std * n ** (-1 / 5)
+    edges = np.concatenate([grid - step / 2, [grid[-1] + step / 2]])
+    counts, _ = np.histogram(values, bins=edges)
+    half = int(np.ceil(4 * bandwidth / step))
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    density = np.convolve(counts, kernel)[half:half + grid.size]
+    return density / (density.sum() * step)
+
+
+def violin_figure(df, by, col, title):
+    """None when no row has both values (build_charts skips it)."""
+    data = df[[by, col]].dropna()
+    if data.empty:
+        return None
+    lo, hi = data[col].min(), data[col].max()
+    pad = (hi - lo) * 0.1 or 0.5
+    grid = np.linspace(lo - pad, hi + pad, KDE_GRID)
+    groups = [(str(name), g[col].to_numpy(dtype="float64")) for name, g in data.groupby(by, observed=True)]
+    densities = [kde(values, grid) for _, values in groups]
+    scale = VIOLIN_HALF_WIDTH / max((d.max() for d in densities), default=1.0)
+    stats = box_stats(data, by, col)
+    fig = go.Figure()
+    for pos, ((name, _), density) in enumerate(zip(groups, densities)):
+        keep = density > density.max() * 1e-3
+        x = np.concatenate([pos - density[keep] * scale, (pos + density[keep] * scale)[::-1]])
+        y = np.concatenate([grid[keep], grid[keep][::-1]])
+        fig.add_trace(go.Scatter(x=x, y=y, fill="toself", mode="lines", name=name, hoverinfo="name"))
+    fig.add_trace(go.Box(x=list(range(len(groups))), q1=stats["q1"], median=stats["median"], q3=stats["q3"],
+                         lowerfence=stats["lowerfence"], upperfence=stats["upperfence"],
+                         width=0.08, fillcolor="white", line=dict(color="black", width=1),
+                         showlegend=False, hoverinfo="skip"))
+    fig.update_layout(title=title, yaxis_title=col,
+                      xaxis=dict(tickmode="array", tickvals=list(range(len(groups))), ticktext=[n for n, _ in groups]))
+    return fig
+
+
+def stratified_sample(df, by, budget, seed=42):
+    """At most ~budget rows, each group keeping a share proportional to its size (at least one row)."""
+    if len(df) <= budget:
+        return df
+    rng = np.random.default_rng(seed)
+    if by is None or by not in df.columns:
+        return df.iloc[np.sort(rng.choice(len(df), size=budget, replace=False))]
+    codes = pd.factorize(df[by], use_na_sentinel=False)[0]
+    sizes = np.bincount(codes)[codes]
+    quota = np.maximum(1, np.round(sizes * budget / len(df)))
+    # random rank within each group, keep the first `quota` of every group
+    order = rng.permutation(len(df))
+    rank = pd.Series(codes[order]).groupby(codes[order]).cumcount().to_numpy()
+    picked = order[rank < quota[order]]
+    return df.iloc[np.sort(picked)]
+
+
+def scatter_figure(df, x, y, color, title, budget, mode="sample"):
+    data = df.dropna(subset=[x, y])
+    if mode == "density":
+        counts, xedges, yedges = np.histogram2d(data[x], data[y], bins=(100, 50))
+        fig = go.Figure(go.Heatmap(x=(xedges[:-1] + xedges[1:]) / 2, y=(yedges[:-1] + yedges[1:]) / 2,
+                                   z=np.where(counts.T > 0, counts.T, np.nan), colorscale="Viridis",
+                                   colorbar=dict(title="count")))
+        fig.update_layout(title=f"{title} (densité, {len(data)} points)", xaxis_title=x, yaxis_title=y)
+        return fig
+    sample = stratified_sample(data, color, budget)
+    fig = go.Figure()
+    groups = sample.groupby(color, observed=True) if color else [(None, sample)]
+    for name, g in groups:
+        fig.add_trace(go.Scattergl(x=g[x], y=g[y], mode="markers", name=str(name) if name is not None else y,
+                                   marker=dict(size=5, opacity=0.7)))
+    fig.update_layout(title=f"{title} (échantillon stratifié : {len(sample)} / {len(data)} points)",
+                      xaxis_title=x, yaxis_title=y)
+    return fig
@@ -0,0 +1,155 @@
+"""Persistent columnar cache for uploaded datasets.
+
+An upload is parsed and normalized once, then written as an uncompressed Arrow
+IPC (Feather v2) file named after the SHA-256 of its raw bytes and the parser
+used (csv, excel, json, jsonl). Later loads of the same content - after a
+restart or in another worker - memory-map that file instead of re-running
+read_csv / read_excel / read_json.
+"""
+import hashlib
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+try:
+    from platformdirs import user_cache_dir
+except ImportError:
+    user_cache_dir = None
+
+
+def default_cache_dir():
+    """THORFIN_CACHE_DIR, else the user's cache directory (not the working directory)."""
+    if os.getenv("THORFIN_CACHE_DIR"):
+        return os.getenv("THORFIN_CACHE_DIR")
+    if user_cache_dir is not None:
+        return user_cache_dir("thorfin")
+    return os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "thorfin")
+
+
+CACHE_DIR = default_cache_dir()
+CATEGORICAL_COLUMNS = ("product", "review_language")
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload_format(name):
+    """Parser of an upload, from its file extension (None if unsupported)."""
+    lname = name.lower()
+    if lname.endswith(".csv"):
+        return "csv"
+    if lname.endswith((".xls", ".xlsx")):
+        return "excel"
+    if lname.endswith(".json"):
+        return "json"
+    if lname.endswith(".jsonl"):
+        return "jsonl"
+    return None
+
+
+def read_upload(name, data):
+    """Parse raw upload bytes according to the file extension (None if unsupported)."""
+    fmt = upload_format(name)
+    buf = io.BytesIO(data)
+    if fmt == "csv":
+        return pd.read_csv(buf)
+    if fmt == "excel":
+        return pd.read_excel(buf)
+    if fmt == "json":
+        return pd.read_json(buf)
+    if fmt == "jsonl":
+        return pd.read_json(buf, lines=True)
+    return None
+
+
+def normalize_frame(df, categorical=True):
+    """Normalize column names and coerce the known columns to their analysis dtypes.
+
+    categorical=False leaves product / review_language as strings, for chunks
+    that are concatenated later and would otherwise disagree on categories.
+    """
+    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+    if 'price' in df.columns:
+        df['price'] = pd.to_numeric(df['price'], errors='coerce')
+    if 'rating' in df.columns:
+        df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+    if 'purchase_date' in df.columns:
+        df['purchase_date'] = pd.to_datetime(df['purchase_date'], errors='coerce')
+    for col in CATEGORICAL_COLUMNS:
+        if categorical and col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"{key}.arrow")
+
+
+def read_cached(path):
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+def write_cached(df, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(df, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def load_dataset(name, data, cache_dir=CACHE_DIR):
+    """Return (df, info) for an upload, using the on-disk cache when possible.
+
+    info holds the content key (content hash and parser), whether the cache was hit, the load time in
+    seconds and the process peak RSS in MB.
+    """
+    start = time.perf_counter()
+    fmt = upload_format(name)
+    if fmt is None:
+        return None, None
+    # the same bytes parse differently as .json and .jsonl: the parser is part of the key
+    key = f"{content_hash(data)}-{fmt}"
+    path = cache_path(key, cache_dir)
+    cache_hit = os.path.exists(path)
+    df = None
+    if cache_hit:
+        try:
+            df = read_cached(path)
+        except (OSError, pa.ArrowInvalid):
+            # truncated or stale cache file: rebuild it below
+            cache_hit = False
+    if df is None:
+        df = read_upload(name, data)
+        if df is None:
+            return None, None
+        df = normalize_frame(df)
+        try:
+            write_cached(df, path)
+        except (OSError, pa.ArrowException):
+            # caching is best effort, the parsed frame is still usable
+            pass
+    info = {
+        "key": key,
+        "cache_hit": cache_hit,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return df, info
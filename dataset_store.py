@@ -0,0 +1,306 @@
+"""Append-only dataset history fed by daily delta exports.
+
+The history is a list of immutable Arrow segments, one per appended delta,
+each with the sorted hashes of its (client_id, purchase_date) keys. A delta
+is parsed, stripped of the rows whose key is already in the history (or
+repeated within the delta, the last one wins) and written as a new segment;
+the manifest then records the new version and watermark. Nothing of the
+history is re-read, so an append costs the delta. Appends hold an exclusive
+lock on the store from reading the manifest to writing the new one, so
+writers in several processes (dashboard workers, the CLI) are serialized.
+
+`IncrementalDataset` keeps the in-memory frame and its derived structures
+(filter index, aggregate cube, term counts, sentiment scores) current by
+merging each delta into them. The filter index keeps the delta as a new part
+(filter_index.SegmentedFilterIndex), the cube and term counts merge cells and
+counts; the frame itself is still concatenated, which copies its columns
+(about 20 ms and a transient second copy at 1M rows, benchmark.py stage
+append_frame):
+
+    python dataset_store.py append export_2024-06-01.csv
+    python dataset_store.py info
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import AggregateCube
+from dataset_cache import (CACHE_DIR, CATEGORICAL_COLUMNS, content_hash, normalize_frame, peak_rss_mb,
+                           read_cached, read_upload, write_cached)
+from filter_index import FilterIndex
+from text_scoring import score_reviews
+from word_freq import build_term_counts, update_term_counts
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_DIR = os.path.join(CACHE_DIR, "store")
+KEY_COLUMNS = ("client_id", "purchase_date")
+
+
+def row_key_hashes(df):
+    """uint64 hash of each row's (client_id, purchase_date), and which rows have both.
+
+    Rows missing either can't be told apart from another review of the same
+    day: they are never matched as duplicates (their hash is meaningless).
+    """
+    missing = [c for c in KEY_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"colonnes manquantes pour le mode ajout : {', '.join(missing)}")
+    keyed = df[list(KEY_COLUMNS)].notna().all(axis=1).to_numpy()
+    keys = pd.DataFrame({
+        "client_id": df['client_id'].astype("object").fillna("").astype(str).to_numpy(),
+        "purchase_date": df['purchase_date'].to_numpy(dtype="datetime64[ns]"),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype=np.uint64), keyed
+
+
+@contextmanager
+def _exclusive_lock(path):
+    """Exclusive lock on `path` across processes, released when the block exits."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class DatasetStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.lock_path = os.path.join(root, "append.lock")
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"version": 0, "rows": 0, "watermark": None, "segments": []}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def key(self, manifest=None):
+        manifest = manifest or self.manifest()
+        return f"store:{os.path.abspath(self.root)}:v{manifest['version']}"
+
+    def contains(self, hashes, manifest=None):
+        """Which of `hashes` are already in the history (binary search in every segment's sorted keys)."""
+        found = np.zeros(len(hashes), dtype=bool)
+        for segment in (manifest or self.manifest())["segments"]:
+            keys = np.load(os.path.join(self.root, segment["keys"]), mmap_mode="r")
+            if keys.size == 0:
+                continue
+            at = np.minimum(np.searchsorted(keys, hashes), keys.size - 1)
+            found |= keys[at] == hashes
+        return found
+
+    def append(self, name, data):
+        """Add the new rows of a delta upload. Returns (new rows, info)."""
+        start = time.perf_counter()
+        delta = read_upload(name, data)
+        if delta is None:
+            raise ValueError(f"format non supporté : {name}")
+        delta = normalize_frame(delta, categorical=False)
+        hashes, keyed = row_key_hashes(delta)
+        repeated = np.zeros(len(delta), dtype=bool)
+        repeated[keyed] = pd.Series(hashes[keyed]).duplicated(keep="last").to_numpy()
+        os.makedirs(self.root, exist_ok=True)
+        # segment names and the manifest version come from the manifest read under the lock
+        with _exclusive_lock(self.lock_path):
+            manifest = self.manifest()
+            in_history = self.contains(hashes, manifest) & keyed
+            keep = ~repeated & ~in_history
+            new_rows = delta[keep].reset_index(drop=True)
+            if len(new_rows):
+                segment = f"{manifest['version'] + 1:06d}"
+                os.makedirs(os.path.join(self.root, "segments"), exist_ok=True)
+                write_cached(new_rows, os.path.join(self.root, "segments", f"{segment}.arrow"))
+                np.save(os.path.join(self.root, "segments", f"{segment}.keys.npy"), np.sort(hashes[keep & keyed]))
+                latest = new_rows['purchase_date'].max()
+                watermark = manifest["watermark"]
+                if pd.notna(latest) and (watermark is None or latest > pd.Timestamp(watermark)):
+                    watermark = latest.isoformat()
+                manifest = {
+                    "version": manifest["version"] + 1,
+                    "rows": manifest["rows"] + len(new_rows),
+                    "watermark": watermark,
+                    "segments": manifest["segments"] + [{
+                        "file": os.path.join("segments", f"{segment}.arrow"),
+                        "keys": os.path.join("segments", f"{segment}.keys.npy"),
+                        "rows": len(new_rows),
+                        "source": name,
+                        "sha256": content_hash(data),
+                        "added_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    }],
+                }
+                # the manifest is the commit point: a crash before this line leaves an orphan segment, not a corrupt store
+                self._write_manifest(manifest)
+        info = {
+            "version": manifest["version"],
+            "rows": manifest["rows"],
+            "watermark": manifest["watermark"],
+            "added": int(keep.sum()),
+            "duplicates_in_history": int(in_history.sum()),
+            "duplicates_in_delta": int((repeated & ~in_history).sum()),
+            "seconds": time.perf_counter() - start,
+        }
+        return new_rows, info
+
+    def load(self, manifest=None):
+        """The whole history as one frame (segments are memory-mapped), or None when empty."""
+        manifest = manifest or self.manifest()
+        if not manifest["segments"]:
+            return None
+        df = pd.concat([read_cached(os.path.join(self.root, s["file"])) for s in manifest["segments"]], ignore_index=True)
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        return df
+
+
+def append_frame(df, delta):
+    """df followed by delta; categorical columns get the new categories appended, codes untouched."""
+    delta = delta.copy(deep=False)
+    df = df.copy(deep=False)
+    for col in df.select_dtypes(include="category").columns:
+        if col not in delta.columns:
+            continue
+        new = pd.Index(delta[col].dropna().unique()).difference(df[col].cat.categories)
+        df[col] = df[col].cat.add_categories(new) if len(new) else df[col]
+        delta[col] = pd.Categorical(delta[col], categories=df[col].cat.categories)
+    return pd.concat([df, delta])
+
+
+class IncrementalDataset:
+    """A store's frame and derived structures, merged with each appended delta.
+
+    `snapshot` is swapped as a whole after an append, so readers holding the
+    previous one keep a consistent view. The store may also grow from elsewhere (the CLI,
+    another worker): append() and dataset() first merge the segments the
+    snapshot lacks, and reload when the store no longer extends it.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.snapshot = None
+        self._refresh()
+
+    def _build(self, manifest):
+        df = self.store.load(manifest)
+        if df is None:
+            return None
+        return {
+            "df": df,
+            "manifest": manifest,
+            "filter_index": FilterIndex(df),
+            "cube": AggregateCube(df),
+            "term_counts": build_term_counts(df, mode="auto", exclude_product_names=True),
+            "scores": score_reviews(df)[0],
+            "delta": None,
+        }
+
+    def _merge(self, current, new_rows, manifest):
+        n = len(current["df"])
+        new_rows.index = pd.RangeIndex(n, n + len(new_rows))
+        scores = score_reviews(new_rows)[0]
+        delta_cube = AggregateCube(new_rows)
+        return {
+            "df": append_frame(current["df"], new_rows),
+            "manifest": manifest,
+            "filter_index": current["filter_index"].append(new_rows),
+            "cube": current["cube"].merge(delta_cube),
+            "term_counts": update_term_counts(current["term_counts"].copy(), new_rows, exclude_product_names=True),
+            "scores": pd.concat([current["scores"], scores]) if scores is not None else current["scores"],
+            # what this snapshot adds to the previous one, for per-filter results extended rather than rebuilt
+            "delta": {"key": self.store.key(current["manifest"]), "cube": delta_cube},
+        }
+
+    def _refresh(self):
+        """Bring the snapshot to the on-disk manifest (the caller holds the lock, or is __init__)."""
+        manifest = self.store.manifest()
+        current = self.snapshot
+        if current is not None and current["manifest"]["version"] == manifest["version"] \
+                and current["manifest"]["segments"] == manifest["segments"]:
+            return
+        start = time.perf_counter()
+        have = current["manifest"]["segments"] if current is not None else None
+        if have is None or manifest["segments"][:len(have)] != have:
+            # first load, or a store rebuilt from scratch
+            snapshot = self._build(manifest)
+        else:
+            missing = manifest["segments"][len(have):]
+            new_rows = pd.concat([read_cached(os.path.join(self.store.root, s["file"])) for s in missing],
+                                 ignore_index=True)
+            snapshot = self._merge(current, new_rows, manifest)
+        if snapshot is not None:
+            snapshot["seconds"] = time.perf_counter() - start
+        self.snapshot = snapshot
+
+    def append(self, name, data):
+        with self._lock:
+            new_rows, info = self.store.append(name, data)
+            # merges this delta's segment and any other one written since the last refresh
+            self._refresh()
+            if len(new_rows):
+                info["derived_seconds"] = self.snapshot["seconds"]
+            return info
+
+    def dataset(self):
+        """(df, load_info, snapshot): the current frame and its load info, in the shape
+        app.py's loaders return, plus the snapshot with its derived structures."""
+        with self._lock:
+            self._refresh()
+            snapshot = self.snapshot
+        if snapshot is None:
+            return None, None, None
+        manifest = snapshot["manifest"]
+        info = {"key": self.store.key(manifest), "cache_hit": True, "seconds": snapshot["seconds"],
+                "peak_rss_mb": peak_rss_mb(), "store_version": manifest["version"], "watermark": manifest["watermark"]}
+        return snapshot["df"], info, snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historique incrémental du jeu de données (ajout de deltas)")
+    parser.add_argument("command", choices=["append", "info"])
+    parser.add_argument("files", nargs="*", help="fichiers delta à ajouter, dans l'ordre")
+    parser.add_argument("--store", default=STORE_DIR)
+    args = parser.parse_args()
+
+    store = DatasetStore(args.store)
+    if args.command == "append":
+        for path in args.files:
+            with open(path, "rb") as f:
+                _, info = store.append(os.path.basename(path), f.read())
+            print(f"{path}: version {info['version']}, {info['added']} lignes ajoutées, "
+                  f"{info['duplicates_in_history']} déjà présentes, {info['duplicates_in_delta']} répétées "
+                  f"({info['seconds']:.2f} s)", file=sys.stderr)
+    manifest = store.manifest()
+    print(json.dumps({k: manifest[k] for k in ("version", "rows", "watermark")} | {"segments": len(manifest["segments"])},
+                     ensure_ascii=False))
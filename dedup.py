@@ -0,0 +1,137 @@
+"""Near-duplicate and templated review detection (MinHash + LSH banding).
+
+Review texts are normalized (lowercase, product name taken out so templates
+that only swap the product collapse together), cut into word shingles and
+summarized by MinHash signatures. LSH banding puts reviews whose signatures
+agree on a whole band into the same bucket; each bucket member is compared
+with the bucket's first member only, so the work stays linear in the number
+of reviews instead of quadratic. Links whose estimated Jaccard similarity
+reaches the threshold are merged into clusters with a vectorized union-find.
+"""
+import numpy as np
+import pandas as pd
+
+from word_freq import TOKEN_PATTERN
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+THRESHOLD = 0.8
+DOC_BATCH = 100_000
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def normalize_reviews(df):
+    """Lowercased review texts with the row's product name removed."""
+    text = df['review_text'].astype("object").fillna("").astype(str)
+    if 'product' not in df.columns:
+        return text.str.lower()
+    product = df['product'].astype("object").fillna("").astype(str)
+    # templated data repeats a handful of (text, product) pairs: normalize each pair once
+    pairs = pd.DataFrame({"text": text.to_numpy(), "product": product.to_numpy()})
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(pairs))
+    normalized = np.array([t.lower().replace(p.lower(), " ") if p else t.lower() for t, p in uniques], dtype=object)
+    return pd.Series(normalized[codes], index=df.index)
+
+
+def _shingles(docs, k=SHINGLE_SIZE):
+    """(doc, shingle hash) of every word k-gram; a doc shorter than k words gives one shingle."""
+    flat = pd.Series(docs, dtype="object").str.findall(TOKEN_PATTERN).explode().dropna()
+    row = flat.index.to_numpy()
+    tokens = pd.factorize(flat.to_numpy())[0].astype(np.uint64) + np.uint64(1)  # 0 pads short windows
+    shingle = tokens.copy()
+    for m in range(1, k):
+        following = np.zeros_like(tokens)
+        following[:-m] = np.where(row[m:] == row[:-m], tokens[m:], 0)
+        shingle = shingle * _MIX + following
+    counts = np.bincount(row, minlength=len(docs))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.arange(len(row)) - starts[row]
+    valid = (position + k <= counts[row]) | ((counts[row] < k) & (position == 0))
+    return row[valid], shingle[valid]
+
+
+def minhash_signatures(docs, num_perm=NUM_PERM, seed=0):
+    """(len(docs), num_perm) MinHash signatures; docs without any word get the max value everywhere."""
+    rng = np.random.default_rng(seed)
+    mult = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    add = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(docs), num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(docs), DOC_BATCH):
+        row, shingle = _shingles(docs[start:start + DOC_BATCH])
+        if row.size == 0:
+            continue
+        # shingles come grouped by doc: one minimum.reduceat per permutation
+        bounds = np.flatnonzero(np.concatenate([[True], row[1:] != row[:-1]]))
+        for p in range(num_perm):
+            h = shingle * mult[p] + add[p]
+            h ^= h >> np.uint64(31)
+            signatures[start + row[bounds], p] = np.minimum.reduceat(h, bounds)
+    return signatures
+
+
+def _connected_components(n, u, v):
+    """Smallest node id of each node's component (min-label propagation with pointer jumping)."""
+    parent = np.arange(n)
+    while u.size:
+        pu, pv = parent[u], parent[v]
+        low = np.minimum(pu, pv)
+        updated = parent.copy()
+        np.minimum.at(updated, pu, low)
+        np.minimum.at(updated, pv, low)
+        while True:
+            jumped = updated[updated]
+            if np.array_equal(jumped, updated):
+                break
+            updated = jumped
+        if np.array_equal(updated, parent):
+            break
+        parent = updated
+    return parent
+
+
+def lsh_clusters(signatures, bands=BANDS, threshold=THRESHOLD):
+    """Cluster label of each signature: linked when a band matches and the estimated Jaccard >= threshold."""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    empty = (signatures == np.iinfo(np.uint64).max).all(axis=1)
+    edges_u, edges_v = [], []
+    for b in range(bands):
+        band = signatures[:, b * rows:(b + 1) * rows]
+        key = band[:, 0].copy()
+        for c in range(1, rows):
+            key = key * _MIX + band[:, c]
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        representative = first[inverse]
+        candidates = np.flatnonzero((representative != np.arange(n)) & ~empty)
+        if candidates.size == 0:
+            continue
+        reps = representative[candidates]
+        similarity = (signatures[candidates] == signatures[reps]).mean(axis=1)
+        keep = similarity >= threshold
+        edges_u.append(candidates[keep])
+        edges_v.append(reps[keep])
+    u = np.concatenate(edges_u) if edges_u else np.empty(0, dtype=np.intp)
+    v = np.concatenate(edges_v) if edges_v else np.empty(0, dtype=np.intp)
+    return _connected_components(n, u, v)
+
+
+def find_near_duplicates(df, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+    """dup_cluster (dense id, in order of first appearance) and dup_cluster_size of every row."""
+    if 'review_text' not in df.columns or df.empty:
+        return pd.DataFrame({"dup_cluster": np.arange(len(df)), "dup_cluster_size": np.ones(len(df), dtype=np.int64)},
+                            index=df.index)
+    # identical normalized texts are signed once
+    doc_codes, docs = pd.factorize(normalize_reviews(df))
+    labels = lsh_clusters(minhash_signatures(np.asarray(docs, dtype=object), num_perm), bands, threshold)[doc_codes]
+    cluster = pd.factorize(labels)[0]
+    size = np.bincount(cluster)[cluster]
+    return pd.DataFrame({"dup_cluster": cluster, "dup_cluster_size": size}, index=df.index)
+
+
+def deduplicate(df, clusters, per_product=True):
+    """Keep the first review of each cluster (of each cluster and product when per_product)."""
+    keys = pd.DataFrame({"cluster": clusters["dup_cluster"].to_numpy()}, index=df.index)
+    if per_product and 'product' in df.columns:
+        keys["product"] = df['product'].to_numpy()
+    return df[~keys.duplicated().to_numpy()]
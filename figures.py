@@ -0,0 +1,128 @@
+"""Shared matplotlib / seaborn rendering layer.
+
+Figures are drawn on the non-interactive Agg backend, rendered to PNG or SVG
+bytes and closed right away, so no pyplot figure outlives the call that built
+it. `FigureCache` memoizes the bytes by (chart, product, filter hash, dataset
+version) in a SharedCache bounded by total size: the product panel, the
+HTML / PDF exports, the pairplot / heatmap and the wordcloud reuse the same
+renders across reruns, sessions and (with its disk tier) workers.
+
+matplotlib, seaborn and wordcloud are imported on first render (about a
+second of cold start), not when the module is imported.
+"""
+import hashlib
+import io
+
+from memo import SharedCache
+from word_freq import build_term_counts
+
+MAX_BYTES = 64 * 1024 ** 2
+MAX_ENTRIES = 512
+
+
+def pyplot():
+    """matplotlib.pyplot on the non-interactive Agg backend, imported on first use."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def fig_to_bytes(fig, fmt="png"):
+    """Render a figure to PNG / SVG bytes and close it, even when rendering fails."""
+    plt = pyplot()
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def fig_to_png(fig):
+    return fig_to_bytes(fig, "png")
+
+
+def filter_hash(state):
+    """Short stable hash of a filter state (any repr-able value: tuples, ranges, timestamps)."""
+    return hashlib.sha1(repr(state).encode("utf-8")).hexdigest()[:16]
+
+
+class FigureCache(SharedCache):
+    """Rendered figure bytes, bounded by total size as well as entry count.
+
+    A SharedCache: sessions rendering the same chart at the same time wait
+    for a single render, and with a disk_dir the bytes are shared by the
+    workers of the box.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, max_entries=MAX_ENTRIES, disk_dir=None, disk_max_bytes=1024 ** 3):
+        super().__init__(max_bytes, max_entries, disk_dir, disk_max_bytes)
+
+    def render(self, chart, product, filter_state, dataset_version, build, fmt="png"):
+        """Bytes of chart `chart`; build() returns a matplotlib figure, or None when the
+        chart doesn't apply (then None is cached and returned)."""
+        def compute():
+            fig = build()
+            return fig_to_bytes(fig, fmt) if fig is not None else None
+        key = ("figure", chart, product, filter_hash(filter_state), dataset_version, fmt)
+        return self.get_or_compute(key, compute, persist=True)
+
+
+# --------------------------
+# Per-product figures (side panel and reports)
+# --------------------------
+def rating_histogram_figure(product_df):
+    if 'rating' not in product_df.columns or product_df['rating'].dropna().empty:
+        return None
+    import seaborn as sns
+    fig, ax = pyplot().subplots()
+    sns.histplot(product_df['rating'].dropna(), bins=5, ax=ax)
+    ax.set_title("Distribution des notes")
+    return fig
+
+
+def price_boxplot_figure(product_df):
+    if 'price' not in product_df.columns or product_df['price'].dropna().empty:
+        return None
+    import seaborn as sns
+    fig, ax = pyplot().subplots()
+    sns.boxplot(x=product_df['price'].dropna(), ax=ax)
+    ax.set_title("Distribution des prix")
+    return fig
+
+
+def product_wordcloud_figure(product_df):
+    if 'review_text' not in product_df.columns:
+        return None
+    freqs = build_term_counts(product_df, exclude_product_names=True).frequencies()
+    if not freqs:
+        return None
+    from wordcloud import WordCloud
+    wc = WordCloud(width=800, height=300, background_color='white').generate_from_frequencies(freqs)
+    fig, ax = pyplot().subplots(figsize=(10,3))
+    ax.imshow(wc); ax.axis('off')
+    return fig
+
+
+PRODUCT_FIGURES = {
+    "hist_rating": rating_histogram_figure,
+    "box_price": price_boxplot_figure,
+    "wordcloud": product_wordcloud_figure,
+}
+
+
+def render_product_figures(product_df, charts=tuple(PRODUCT_FIGURES), cache=None, product=None,
+                           filter_state=None, dataset_version=None, fmt="png"):
+    """Bytes of the requested product figures, through `cache` when given; charts that don't apply are left out."""
+    imgs = {}
+    for chart in charts:
+        build = PRODUCT_FIGURES[chart]
+        if cache is not None:
+            data = cache.render(chart, product, filter_state, dataset_version, lambda: build(product_df), fmt)
+        else:
+            fig = build(product_df)
+            data = fig_to_bytes(fig, fmt) if fig is not None else None
+        if data:
+            imgs[chart] = data
+    return imgs
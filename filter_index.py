@@ -0,0 +1,275 @@
+"""Precomputed index behind the sidebar filters.
+
+Built once per dataset: sorted row ids for purchase_date / price / rating and
+a trigram index over product names. A filter state resolves to an array of
+row ids through range lookups and intersections, and the filtered frame is
+materialized with a single `iloc` at the end instead of one boolean-mask copy
+per filter.
+
+Appended rows (history mode) are indexed on their own and kept as a separate
+part of a `SegmentedFilterIndex`; parts are merged size-tiered, so an append
+costs its delta (amortized) instead of re-sorting or copying the history.
+"""
+import numpy as np
+import pandas as pd
+
+RANGE_COLUMNS = ("purchase_date", "price", "rating")
+MERGE_RATIO = 2  # a part is merged into the previous one once that one is at most this many times larger
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _value_bounds(col, values):
+    """(min, max) of index values, missing ones (NaT / NaN) ignored."""
+    if col == "purchase_date":
+        values = values[values != np.iinfo("int64").min]
+        return (values.min(), values.max()) if values.size else None
+    values = values[~np.isnan(values)]
+    return (values.min(), values.max()) if values.size else None
+
+
+def to_index_value(col, value):
+    """Convert a filter bound to the representation stored in the index."""
+    if col == "purchase_date":
+        return pd.Timestamp(value).as_unit("ns").value
+    return float(value)
+
+
+class FilterIndex:
+    def __init__(self, df):
+        self.n = len(df)
+        self.values = {}
+        self.sorted_ids = {}
+        self.sorted_values = {}
+        for col in RANGE_COLUMNS:
+            if col not in df.columns:
+                continue
+            series = df[col]
+            if col == "purchase_date":
+                values = series.to_numpy(dtype="datetime64[ns]").view("int64")
+            else:
+                values = series.to_numpy(dtype="float64", na_value=np.nan)
+            valid = np.flatnonzero(series.notna().to_numpy())
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self.values[col] = values
+            self.sorted_ids[col] = order
+            self.sorted_values[col] = values[order]
+
+        self.products = None
+        if "product" in df.columns:
+            products = df["product"].astype("category")
+            codes = products.cat.codes.to_numpy()
+            self.products = [str(p) for p in products.cat.categories]
+            self._lower_products = [p.lower() for p in self.products]
+            # rows grouped by product code: rows of code c are _product_rows[_product_offsets[c]:_product_offsets[c + 1]]
+            order = np.argsort(codes, kind="stable")
+            self._product_rows = order
+            self._product_offsets = np.searchsorted(codes[order], np.arange(len(self.products) + 1))
+            self._trigram_index = {}
+            for code, name in enumerate(self._lower_products):
+                for gram in _trigrams(name):
+                    self._trigram_index.setdefault(gram, []).append(code)
+
+    def has(self, col):
+        return col in self.values
+
+    def bounds(self, col, ids=None):
+        """(min, max) of a column over `ids` (all rows when None), NaNs ignored."""
+        if ids is None:
+            sorted_values = self.sorted_values[col]
+            if sorted_values.size == 0:
+                return None
+            return sorted_values[0], sorted_values[-1]
+        return _value_bounds(col, self.values[col][ids])
+
+    def _range_slice(self, col, lo, hi):
+        """Positions in sorted_ids[col] of the rows with lo <= col <= hi (index values)."""
+        sorted_values = self.sorted_values[col]
+        return np.searchsorted(sorted_values, lo, side="left"), np.searchsorted(sorted_values, hi, side="right")
+
+    def range_ids(self, col, lo, hi, ids=None):
+        """Row ids with lo <= col <= hi, restricted to `ids` when given.
+
+        Returns None when the range keeps every row, so callers can skip the
+        materialization entirely for an untouched filter.
+        """
+        lo, hi = to_index_value(col, lo), to_index_value(col, hi)
+        if ids is not None:
+            values = self.values[col][ids]
+            return ids[(values >= lo) & (values <= hi)]
+        start, stop = self._range_slice(col, lo, hi)
+        if start == 0 and stop == self.n:
+            return None
+        return self.sorted_ids[col][start:stop]
+
+    def product_codes(self, query):
+        """Codes of products whose name contains `query` (case-insensitive)."""
+        query = query.lower()
+        grams = _trigrams(query)
+        if grams:
+            candidates = None
+            for gram in grams:
+                codes = set(self._trigram_index.get(gram, ()))
+                candidates = codes if candidates is None else candidates & codes
+                if not candidates:
+                    return []
+        else:
+            candidates = range(len(self.products))
+        # trigrams only prune: confirm the full substring
+        return sorted(c for c in candidates if query in self._lower_products[c])
+
+    def product_ids(self, query, ids=None):
+        codes = self.product_codes(query)
+        if codes:
+            rows = np.concatenate([self._product_rows[self._product_offsets[c]:self._product_offsets[c + 1]] for c in codes])
+        else:
+            rows = np.empty(0, dtype=np.intp)
+        if ids is None:
+            return rows
+        return np.intersect1d(ids, rows, assume_unique=True)
+
+    def append(self, df):
+        """Index over the current rows followed by the rows of `df` (ids continue after self.n),
+        as a SegmentedFilterIndex; the current index is left unchanged."""
+        return SegmentedFilterIndex([self]).append(df)
+
+    def compatible(self, other):
+        return set(other.values) == set(self.values) and (other.products is None) == (self.products is None)
+
+    def merge(self, delta):
+        """One index over the rows of self followed by those of the index `delta`.
+
+        The sorted runs of the delta are merged into the existing ones instead
+        of re-sorting; costs the rows of both (used to compact segmented parts).
+        """
+        if not self.compatible(delta):
+            raise ValueError("colonnes incompatibles avec le jeu existant")
+        merged = object.__new__(FilterIndex)
+        merged.n = self.n + delta.n
+        merged.values, merged.sorted_ids, merged.sorted_values = {}, {}, {}
+        for col in self.values:
+            merged.values[col] = np.concatenate([self.values[col], delta.values[col]])
+            # side="right": delta rows land after equal history values, keeping ids ascending among ties
+            at = np.searchsorted(self.sorted_values[col], delta.sorted_values[col], side="right")
+            merged.sorted_values[col] = np.insert(self.sorted_values[col], at, delta.sorted_values[col])
+            merged.sorted_ids[col] = np.insert(self.sorted_ids[col], at, delta.sorted_ids[col] + self.n)
+
+        merged.products = None
+        if self.products is not None:
+            codes = {name: code for code, name in enumerate(self.products)}
+            new_names = [p for p in delta.products if p not in codes]
+            merged.products = self.products + new_names
+            merged._lower_products = self._lower_products + [p.lower() for p in new_names]
+            merged._trigram_index = {gram: list(c) for gram, c in self._trigram_index.items()}
+            for code, name in enumerate(merged._lower_products[len(self.products):], start=len(self.products)):
+                for gram in _trigrams(name):
+                    merged._trigram_index.setdefault(gram, []).append(code)
+            # delta rows re-coded to the merged product list, inserted at the end of their product's run
+            codes.update({name: code for code, name in enumerate(new_names, start=len(self.products))})
+            mapping = np.array([codes[p] for p in delta.products], dtype=np.int64)
+            delta_codes = np.repeat(mapping, np.diff(delta._product_offsets))
+            # rows without a product sit before the first offset and are never looked up
+            delta_rows = delta._product_rows[delta._product_offsets[0]:delta._product_offsets[-1]]
+            order = np.argsort(delta_codes, kind="stable")
+            delta_codes, delta_rows = delta_codes[order], delta_rows[order] + self.n
+            offsets = np.concatenate([self._product_offsets, np.full(len(new_names), self._product_offsets[-1])])
+            merged._product_rows = np.insert(self._product_rows, offsets[delta_codes + 1], delta_rows)
+            added = np.bincount(delta_codes, minlength=len(merged.products))
+            merged._product_offsets = offsets + np.concatenate([[0], np.cumsum(added)])
+        return merged
+
+    @staticmethod
+    def take(df, ids):
+        """Materialize the filtered frame once, keeping the original row order."""
+        if ids is None:
+            return df
+        return df.iloc[np.sort(ids)]
+
+
+class SegmentedFilterIndex(FilterIndex):
+    """FilterIndex over rows appended in batches, answering the same calls.
+
+    Each part indexes one run of consecutive rows (ids of part k start after
+    the rows of the parts before it). An append indexes only the delta and
+    adds it as a new part, merged into the previous part while that one is
+    at most MERGE_RATIO times larger (size-tiered, like the score store): a
+    history of n rows keeps O(log n) parts and each row is merged O(log n)
+    times. Queries combine the parts' answers.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.starts = np.cumsum([0] + [p.n for p in parts[:-1]])
+        self.n = sum(p.n for p in parts)
+        self.products = None
+        if parts[0].products is not None:
+            self.products, self._lower_products, self._trigram_index = [], [], {}
+            codes = {}
+            for part in parts:
+                for name in part.products:
+                    if name not in codes:
+                        codes[name] = len(self.products)
+                        self.products.append(name)
+                        self._lower_products.append(name.lower())
+                        for gram in _trigrams(name.lower()):
+                            self._trigram_index.setdefault(gram, []).append(codes[name])
+            # global product code -> the part's own code (-1 when the part has no such row)
+            self._part_codes = []
+            for part in parts:
+                local = np.full(len(self.products), -1, dtype=np.int64)
+                local[[codes[name] for name in part.products]] = np.arange(len(part.products))
+                self._part_codes.append(local)
+
+    def has(self, col):
+        return self.parts[0].has(col)
+
+    def _values(self, col, ids):
+        part = np.searchsorted(self.starts, ids, side="right") - 1
+        values = np.empty(len(ids), dtype=self.parts[0].values[col].dtype)
+        for k, start in enumerate(self.starts):
+            selected = part == k
+            values[selected] = self.parts[k].values[col][ids[selected] - start]
+        return values
+
+    def bounds(self, col, ids=None):
+        if ids is not None:
+            return _value_bounds(col, self._values(col, ids))
+        ends = [p.sorted_values[col][[0, -1]] for p in self.parts if p.sorted_values[col].size]
+        if not ends:
+            return None
+        return min(e[0] for e in ends), max(e[1] for e in ends)
+
+    def range_ids(self, col, lo, hi, ids=None):
+        lo, hi = to_index_value(col, lo), to_index_value(col, hi)
+        if ids is not None:
+            values = self._values(col, ids)
+            return ids[(values >= lo) & (values <= hi)]
+        pieces, everything = [], True
+        for start, part in zip(self.starts, self.parts):
+            first, stop = part._range_slice(col, lo, hi)
+            everything &= first == 0 and stop == part.n
+            pieces.append(part.sorted_ids[col][first:stop] + start)
+        return None if everything else np.concatenate(pieces)
+
+    def product_ids(self, query, ids=None):
+        codes = self.product_codes(query)
+        rows = [np.empty(0, dtype=np.intp)]
+        for start, part, local in zip(self.starts, self.parts, self._part_codes):
+            for code in local[codes]:
+                if code >= 0:
+                    rows.append(part._product_rows[part._product_offsets[code]:part._product_offsets[code + 1]] + start)
+        rows = np.concatenate(rows)
+        if ids is None:
+            return rows
+        return np.intersect1d(ids, rows, assume_unique=True)
+
+    def append(self, df):
+        delta = FilterIndex(df)
+        if not self.parts[0].compatible(delta):
+            raise ValueError("colonnes incompatibles avec le jeu existant")
+        parts = self.parts + [delta]
+        while len(parts) > 1 and parts[-2].n <= MERGE_RATIO * parts[-1].n:
+            parts[-2:] = [parts[-2].merge(parts[-1])]
+        return SegmentedFilterIndex(parts)
@@ -0,0 +1,257 @@
+"""Small memoization helpers shared by the derived-data caches.
+
+`LRUCache` is the plain per-object memo. `SharedCache` is the process-wide
+tier every Streamlit session goes through for dataset-level artifacts: it is
+thread-safe, bounded by the estimated size of its values, computes a key only
+once when several sessions ask for it at the same time (single-flight) and
+keeps hit / miss / eviction counters. Values stored with persist=True are
+also pickled under a local directory, so other workers on the same box (or a
+restarted one) read them instead of recomputing.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class LRUCache:
+    """Dict-like cache that evicts the least recently used entry beyond max_entries."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        if key in self._data:
+            return self.get(key)
+        value = compute()
+        self.put(key, value)
+        return value
+
+
+def sizeof(value, _seen=None):
+    """Approximate memory held by a value: array / frame buffers, bytes, and the
+    attributes of plain objects (filter index, cube, term counts...)."""
+    seen = set() if _seen is None else _seen
+    if value is None or id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k, seen) + sizeof(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(v, seen) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + sizeof(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """One computation in progress; concurrent callers for the same key wait on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SharedCache(LRUCache):
+    """Thread-safe LRU bounded by total size, with single-flight computation and an optional disk tier.
+
+    Keys must have a stable repr (strings, numbers, tuples, timestamps): the
+    disk tier names files after it. A value larger than max_bytes is returned
+    but not kept.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 ** 2, max_entries=4096, disk_dir=None, disk_max_bytes=1024 ** 3):
+        super().__init__(max_entries)
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.waits = 0
+        self.disk_hits = 0
+        self._sizes = {}
+        self._inflight = {}
+        self._lock = threading.RLock()
+        self._disk_bytes = None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            return super().get(key, default)
+
+    def put(self, key, value, size=None):
+        size = sizeof(value) if size is None else size
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self.bytes -= self._sizes.pop(key)
+            if size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                evicted, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, persist=False):
+        """Cached value of `key`, else compute() once for every concurrent caller.
+
+        An exception raised by compute() reaches every waiting caller and
+        nothing is cached.
+        """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                return super().get(key)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.waits += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            found, value = self._disk_get(key) if persist else (False, None)
+            with self._lock:
+                if found:
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+            if not found:
+                value = compute()
+                if persist:
+                    self._disk_put(key, value)
+            self.put(key, value)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    # --------------------------
+    # Disk tier (shared by the workers of one box)
+    # --------------------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:40] + ".pkl")
+
+    def _disk_get(self, key):
+        if self.disk_dir is None:
+            return False, None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, value = pickle.load(f)
+        except Exception:
+            # missing, half-written or written by an incompatible version: recompute
+            return False, None
+        if stored_key != repr(key):
+            return False, None
+        try:
+            os.utime(path)  # recently used files are pruned last
+        except OSError:
+            pass
+        return True, value
+
+    def _disk_put(self, key, value):
+        if self.disk_dir is None:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((repr(key), value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()[0]
+            else:
+                self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._prune_disk()
+
+    def _disk_usage(self):
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return sum(size for _, size, _ in files), files
+
+    def _prune_disk(self):
+        # oldest files first, down to 80% of the budget; other workers may prune concurrently
+        total, files = self._disk_usage()
+        for _, size, path in sorted(files):
+            if total <= 0.8 * self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            if self._disk_bytes is None and self.disk_dir is not None and os.path.isdir(self.disk_dir):
+                self._disk_bytes = self._disk_usage()[0]
+            lookups = self.hits + self.misses + self.disk_hits + self.waits
+            return {"entries": len(self._data), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                    "single_flight_waits": self.waits, "evictions": self.evictions,
+                    "hit_rate": (self.hits + self.disk_hits + self.waits) / lookups if lookups else None,
+                    "disk_bytes": self._disk_bytes}
@@ -0,0 +1,286 @@
+"""The dashboard stages as plain functions, without Streamlit.
+
+app.py wires them to widgets and caches; benchmark.py times them one by one:
+load (parse + type coercion), filtering, KPIs, each chart, the wordcloud and
+the HTML / PDF export.
+"""
+import plotly.express as px
+import plotly.graph_objects as go
+
+import chart_reduce
+from aggregate_cube import AggregateCube
+from figures import pyplot
+from filter_index import FilterIndex
+
+
+def has_cols(dataframe, cols):
+    return all(c in dataframe.columns for c in cols)
+
+
+# --------------------------
+# Filters
+# --------------------------
+def apply_filters(index, choose):
+    """Resolve the sidebar filters to row ids, in the dashboard order (date, price, rating, product).
+
+    choose(column, bounds) returns the selected range for purchase_date / price /
+    rating given the bounds left by the previous filters, or None to leave the
+    column unfiltered; choose("product", None) returns the product search text.
+    Returns (row_ids, cube_filters, price_narrowed): row_ids is None when every
+    row is kept, cube_filters is the same state on the aggregate cube dimensions
+    and price_narrowed the price range when it can't be expressed on the cube.
+    """
+    row_ids = None
+    cube_filters = {"date_range": None, "rating_range": None, "products": None, "price_notna": False}
+    price_narrowed = None
+
+    bounds = index.bounds('purchase_date', row_ids) if index.has('purchase_date') else None
+    if bounds is not None:
+        selected = choose('purchase_date', bounds)
+        if selected is not None:
+            start_date, end_date = selected
+            row_ids = index.range_ids('purchase_date', start_date, end_date, row_ids)
+            cube_filters["date_range"] = (start_date, end_date)
+
+    bounds = index.bounds('price', row_ids) if index.has('price') else None
+    if bounds is not None:
+        selected = choose('price', bounds)
+        if selected is not None:
+            row_ids = index.range_ids('price', selected[0], selected[1], row_ids)
+            if selected[0] > float(bounds[0]) or selected[1] < float(bounds[1]):
+                price_narrowed = tuple(selected)
+            else:
+                # a full-range price filter only drops rows without a price
+                cube_filters["price_notna"] = True
+
+    bounds = index.bounds('rating', row_ids) if index.has('rating') else None
+    if bounds is not None:
+        selected = choose('rating', bounds)
+        if selected is not None:
+            row_ids = index.range_ids('rating', selected[0], selected[1], row_ids)
+            cube_filters["rating_range"] = tuple(selected)
+
+    if index.products is not None:
+        query = choose('product', None)
+        if query:
+            row_ids = index.product_ids(query, row_ids)
+            cube_filters["products"] = tuple(index.products[c] for c in index.product_codes(query))
+
+    return row_ids, cube_filters, price_narrowed
+
+
+def filter_frame(df, row_ids):
+    """Materialize the filtered rows; emptied categories are dropped so value_counts,
+    charts and the product selector only list present values."""
+    df = FilterIndex.take(df, row_ids)
+    categorical = df.select_dtypes(include='category').columns
+    if len(categorical):
+        df = df.copy(deep=False)
+        for col in categorical:
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+# --------------------------
+# KPIs
+# --------------------------
+def _slice_from_rows(cube, cube_filters, price_narrowed):
+    return price_narrowed is not None or (cube_filters["date_range"] is not None and not cube.dates_are_days)
+
+
+def cube_slice(cube, filtered_df, cube_filters, price_narrowed):
+    """KPI slice from the aggregate cube; a narrowed price range or a date filter on
+    timestamps with a time of day can't be expressed on the cube dimensions, those
+    slices are built from the filtered rows instead."""
+    if _slice_from_rows(cube, cube_filters, price_narrowed):
+        return AggregateCube(filtered_df).slice()
+    return cube.slice(**cube_filters)
+
+
+def delta_slice(delta_cube, cube, cube_filters, price_narrowed):
+    """Slice of an appended delta's cube (history mode) under the same filters as cube_slice,
+    or None when cube_slice answers this filter state from the rows."""
+    if _slice_from_rows(cube, cube_filters, price_narrowed):
+        return None
+    return delta_cube.slice(**cube_filters)
+
+
+# --------------------------
+# Charts
+# --------------------------
+def use_server_render(render_mode, rows, point_budget):
+    return render_mode == "Agrégé (serveur)" or (render_mode == "Auto" and rows > point_budget)
+
+
+def price_histogram(df, slice_, server_render, point_budget, scatter_mode):
+    if 'price' not in df.columns or not df['price'].notna().any():
+        return None
+    if server_render:
+        return chart_reduce.histogram_figure(df['price'], 25, "Distribution des prix", "Prix")
+    return px.histogram(df, x='price', nbins=25, title="Distribution des prix", labels={'price':'Prix'})
+
+
+def rating_box(df, slice_, server_render, point_budget, scatter_mode):
+    if not has_cols(df, ['product','rating']):
+        return None
+    if server_render:
+        return chart_reduce.box_figure(df, 'product', 'rating', "Boxplot : note par produit")
+    return px.box(df, x='product', y='rating', title="Boxplot : note par produit")
+
+
+def rating_violin(df, slice_, server_render, point_budget, scatter_mode):
+    if not has_cols(df, ['product','rating']):
+        return None
+    if server_render:
+        return chart_reduce.violin_figure(df, 'product', 'rating', "Violin : note par produit")
+    return px.violin(df, x='product', y='rating', box=True, points='all', title="Violin : note par produit")
+
+
+def price_rating_scatter(df, slice_, server_render, point_budget, scatter_mode):
+    if not has_cols(df, ['price','rating']):
+        return None
+    color = 'product' if 'product' in df.columns else None
+    if server_render:
+        return chart_reduce.scatter_figure(df, 'price', 'rating', color, "Scatter : Prix vs Note", point_budget, mode=scatter_mode)
+    return px.scatter(df, x='price', y='rating', color=color, title="Scatter : Prix vs Note",
+                      hover_data=['product'] if 'product' in df.columns else None)
+
+
+def _product_counts(df, slice_):
+    if 'product' not in df.columns:
+        return None
+    pc = slice_.product_counts().reset_index()
+    pc.columns = ['product_name', 'count']
+    return pc if not pc.empty else None
+
+
+def product_pie(df, slice_, server_render, point_budget, scatter_mode):
+    pc = _product_counts(df, slice_)
+    if pc is None:
+        return None
+    return px.pie(pc, values='count', names='product_name', title="Répartition des produits")
+
+
+def product_donut(df, slice_, server_render, point_budget, scatter_mode):
+    pc = _product_counts(df, slice_)
+    if pc is None:
+        return None
+    return px.pie(pc, values='count', names='product_name', hole=0.45, title="Donut : Répartition des produits")
+
+
+def product_pareto(df, slice_, server_render, point_budget, scatter_mode):
+    """Bar + cumulative line of the top products by count."""
+    if 'product' not in df.columns:
+        return None
+    pareto = slice_.product_counts().reset_index()
+    pareto.columns = ['product', 'count']
+    pareto['cumulative'] = pareto['count'].cumsum() / pareto['count'].sum()
+    fig = px.bar(pareto.head(20), x='product', y='count', title="Pareto : top produits (count)")
+    fig.add_scatter(x=pareto.head(20)['product'], y=pareto.head(20)['cumulative'], yaxis="y2", mode='lines+markers', name='Cumulé')
+    fig.update_layout(
+        yaxis=dict(title='Count'),
+        yaxis2=dict(title='Cumulative %', overlaying='y', side='right', tickformat='.0%'),
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+# display order of the Plotly charts
+CHARTS = {
+    'price': price_histogram,
+    'box': rating_box,
+    'violin': rating_violin,
+    'scatter': price_rating_scatter,
+    'pie': product_pie,
+    'donut': product_donut,
+    'pareto': product_pareto,
+}
+# built only when selected (the violin draws every point in raw mode); keys are CHARTS names
+OPTIONAL_CHARTS = {
+    'violin': "Violin : note par produit",
+    'pie': "Camembert des produits",
+    'donut': "Donut des produits",
+}
+
+
+def build_charts(df, slice_, server_render, point_budget=5000, scatter_mode="sample", names=None):
+    """Plotly figures of the dashboard, by name, in display order (charts without data are skipped).
+
+    names restricts the build to those charts (all of them when None).
+    """
+    figs = {}
+    for name, build in CHARTS.items():
+        if names is not None and name not in names:
+            continue
+        fig = build(df, slice_, server_render, point_budget, scatter_mode)
+        if fig is not None:
+            figs[name] = fig
+    return figs
+
+
+def topic_breakdown_figure(breakdown):
+    """Product x topic heatmap of the share of reviews mentioning the topic (text_scoring.topic_breakdown)."""
+    share = breakdown.pivot(index="product", columns="topic", values="share").fillna(0)
+    fig = px.imshow(share, text_auto=".0%", aspect="auto", color_continuous_scale="Greens",
+                    labels={"x": "Thème", "y": "Produit", "color": "Part des reviews"},
+                    title="Thèmes mentionnés par produit")
+    fig.update_coloraxes(colorbar_tickformat=".0%")
+    return fig
+
+
+TREND_METRICS = {"reviews": "Nombre de reviews", "avg_rating": "Note moyenne", "avg_price": "Prix moyen"}
+
+
+def trend_figure(trends, metric, alerts=None):
+    """Per-product line of a trends.build_trends metric, its rolling mean dotted, alerts marked.
+
+    Traces are built directly (plotly express costs ~100 ms per call, more than the trends themselves).
+    """
+    label = TREND_METRICS[metric]
+    rolling = {"reviews": "rolling_reviews", "avg_rating": "rolling_rating"}.get(metric)
+    colors = px.colors.qualitative.Plotly
+    traces = []
+    for i, (product, series) in enumerate(trends.groupby("product", sort=False)):
+        color = colors[i % len(colors)]
+        traces.append(go.Scatter(x=series["period"], y=series[metric], name=product, mode="lines+markers",
+                                 line=dict(color=color), legendgroup=product))
+        if rolling is not None:
+            traces.append(go.Scatter(x=series["period"], y=series[rolling], name=f"{product} (moyenne glissante)",
+                                     mode="lines", line=dict(color=color, dash="dot"), opacity=0.6,
+                                     legendgroup=product, showlegend=False))
+    if alerts is not None and not alerts.empty:
+        flagged = alerts[alerts["alerte"] == "Baisse de note"] if metric == "avg_rating" else (
+            alerts[alerts["alerte"] != "Baisse de note"] if metric == "reviews" else alerts.iloc[:0])
+        if not flagged.empty:
+            traces.append(go.Scatter(x=flagged["période"], y=flagged["valeur"], mode="markers", name="Alerte",
+                                     marker=dict(symbol="x", size=11, color="red"),
+                                     text=flagged["produit"] + " — " + flagged["alerte"]))
+    fig = go.Figure(data=traces)
+    fig.update_layout(title=f"{label} par période", xaxis_title="Période", yaxis_title=label, legend_title="Produit")
+    return fig
+
+
+def pairplot_figure(numeric_df, sample=200):
+    # may be slow for big datasets: plotted on a sample
+    import seaborn as sns
+    pyplot()
+    sample_df = numeric_df.sample(n=min(sample, numeric_df.shape[0]), random_state=42)
+    return sns.pairplot(sample_df).figure
+
+
+def heatmap_figure(numeric_df, corr=None):
+    # corr: a correlation matrix already computed elsewhere (query_backend pushes it down to DuckDB)
+    import seaborn as sns
+    fig, ax = pyplot().subplots(figsize=(6, 5))
+    sns.heatmap(numeric_df.corr() if corr is None else corr, annot=True, cmap='coolwarm', ax=ax)
+    return fig
+
+
+def wordcloud_figure(freqs):
+    from wordcloud import WordCloud
+    wc = WordCloud(width=900, height=400, background_color='white', collocations=False)
+    wc.generate_from_frequencies(freqs)
+    fig, ax = pyplot().subplots(figsize=(12,4))
+    ax.imshow(wc, interpolation='bilinear')
+    ax.axis('off')
+    return fig
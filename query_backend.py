@@ -0,0 +1,268 @@
+"""Out-of-core query backend: sidebar filters and aggregations pushed down to DuckDB.
+
+The pandas path (FilterIndex + AggregateCube over the in-memory frame) serves
+every loaded frame unless DuckDB is asked for: the rows are already in memory,
+and fetching the filtered ones back on each rerun costs more than the
+pushed-down aggregates save. When asked for, the dataset is written once as
+Parquet under the cache directory's parquet/ and queried by an embedded DuckDB
+connection: filters become a WHERE clause, KPIs and product/rating aggregates
+a multi-threaded GROUP BY, and only the rows a panel needs are fetched back
+into pandas. A local CSV / JSON lines / Parquet
+file can be converted and queried without ever being loaded by pandas, so it
+may be larger than RAM (DuckDB spills to disk).
+
+`DuckDBBackend` answers the same calls as FilterIndex (has / bounds /
+range_ids / product_codes / product_ids), so pipeline.apply_filters drives
+both; its "row ids" are a tuple of SQL conditions instead of an array.
+
+DuckDB is optional: without it the pandas path is always used.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregate_cube import CUBE_DIMS, CubeSlice
+from dataset_cache import CACHE_DIR, CATEGORICAL_COLUMNS, peak_rss_mb
+from filter_index import RANGE_COLUMNS
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+PARQUET_DIR = os.path.join(CACHE_DIR, "parquet")
+# DuckDB's spill files only live as long as a query: a temp dir, not the cache
+SPILL_DIR = os.path.join(tempfile.gettempdir(), "thorfin_duckdb")
+SAMPLE_ROWS = 200_000
+ROW_GROUP_SIZE = 500_000
+ROW_ID = "__row_id"
+BACKENDS = ("Auto", "pandas", "DuckDB")
+
+
+def available():
+    return duckdb is not None
+
+
+def use_duckdb(mode):
+    """Whether the DuckDB backend serves an in-memory frame: only in "DuckDB" mode ("Auto" keeps
+    loaded frames on the pandas path and uses DuckDB for out-of-core files)."""
+    return available() and mode == "DuckDB"
+
+
+def parquet_path(key):
+    return os.path.join(PARQUET_DIR, f"{hashlib.sha256(key.encode()).hexdigest()[:32]}.parquet")
+
+
+def write_parquet(df, path):
+    """Write a loaded frame as Parquet, its index kept as the ROW_ID column."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.append_column(ROW_ID, pa.array(df.index.to_numpy(dtype=np.int64)))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+    return path
+
+
+def _literal(text):
+    # file paths can't be bound as parameters in DDL / COPY statements
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _reader(path):
+    lname = path.lower()
+    if lname.endswith(".parquet"):
+        return f"read_parquet({_literal(path)})"
+    if lname.endswith((".jsonl", ".json")):
+        return f"read_json_auto({_literal(path)})"
+    if lname.endswith(".csv"):
+        return f"read_csv_auto({_literal(path)})"
+    raise ValueError(f"format non supporté : {os.path.basename(path)} (CSV, JSON lines ou Parquet)")
+
+
+def convert_file(source, path, threads=None):
+    """Convert a local CSV / JSON lines / Parquet file to the cached Parquet layout inside DuckDB.
+
+    Column names and types are normalized like dataset_cache.normalize_frame
+    (invalid prices, ratings and dates become NULL); the file never goes
+    through pandas.
+    """
+    con = connect(threads)
+    reader = _reader(source)
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {reader}").fetchall()]
+    select = []
+    for col in columns:
+        name = col.strip().lower().replace(" ", "_")
+        quoted = '"' + col.replace('"', '""') + '"'
+        if name in ("price", "rating"):
+            select.append(f'TRY_CAST({quoted} AS DOUBLE) AS "{name}"')
+        elif name == "purchase_date":
+            select.append(f'TRY_CAST({quoted} AS TIMESTAMP) AS "{name}"')
+        else:
+            select.append(f'{quoted} AS "{name}"')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    con.execute(f"COPY (SELECT {', '.join(select)}, row_number() OVER () - 1 AS {ROW_ID} FROM {reader}) "
+                f"TO {_literal(tmp)} (FORMAT parquet, ROW_GROUP_SIZE {ROW_GROUP_SIZE})")
+    con.close()
+    os.replace(tmp, path)
+    return path
+
+
+def connect(threads=None):
+    con = duckdb.connect()
+    con.execute(f"SET threads = {int(threads or os.cpu_count() or 1)}")
+    # larger-than-memory sorts and aggregations spill here
+    os.makedirs(SPILL_DIR, exist_ok=True)
+    con.execute(f"SET temp_directory = {_literal(SPILL_DIR)}")
+    return con
+
+
+def _where(ids):
+    if not ids:
+        return "", []
+    return " WHERE " + " AND ".join(sql for sql, _ in ids), [p for _, params in ids for p in params]
+
+
+class DuckDBBackend:
+    """Filters and aggregates over Parquet files, with the FilterIndex call signatures.
+
+    `ids` arguments and results are tuples of (SQL condition, params); None
+    (or an empty tuple) selects every row.
+    """
+
+    def __init__(self, paths, threads=None):
+        self.paths = list(paths)
+        self._con = connect(threads)
+        self._con.execute(f"CREATE VIEW data AS SELECT * FROM read_parquet([{', '.join(_literal(p) for p in self.paths)}])")
+        self.columns = [row[0] for row in self._con.execute("DESCRIBE data").fetchall() if row[0] != ROW_ID]
+        self.n = self._query("SELECT count(*) FROM data")[0][0]
+        self.products = None
+        if "product" in self.columns:
+            self.products = [p for (p,) in self._query(
+                "SELECT DISTINCT CAST(product AS VARCHAR) FROM data WHERE product IS NOT NULL ORDER BY 1")]
+            self._lower_products = [p.lower() for p in self.products]
+
+    def _query(self, sql, params=()):
+        # DuckDB connections are not safe to share across threads: one cursor per query
+        return self._con.cursor().execute(sql, list(params)).fetchall()
+
+    def has(self, col):
+        return col in RANGE_COLUMNS and col in self.columns
+
+    def bounds(self, col, ids=None):
+        where, params = _where(ids)
+        lo, hi = self._query(f'SELECT min("{col}"), max("{col}") FROM data{where}', params)[0]
+        if lo is None:
+            return None
+        return (pd.Timestamp(lo), pd.Timestamp(hi)) if col == "purchase_date" else (lo, hi)
+
+    def range_ids(self, col, lo, hi, ids=None):
+        if col == "purchase_date":
+            lo, hi = pd.Timestamp(lo).to_pydatetime(), pd.Timestamp(hi).to_pydatetime()
+        else:
+            lo, hi = float(lo), float(hi)
+        return tuple(ids or ()) + ((f'"{col}" BETWEEN ? AND ?', (lo, hi)),)
+
+    def product_codes(self, query):
+        query = query.lower()
+        return [c for c, name in enumerate(self._lower_products) if query in name]
+
+    def product_ids(self, query, ids=None):
+        names = [self.products[c] for c in self.product_codes(query)]
+        condition = ("list_contains(?, CAST(product AS VARCHAR))", (names,)) if names else ("FALSE", ())
+        return tuple(ids or ()) + (condition,)
+
+    def count(self, ids=None):
+        where, params = _where(ids)
+        return self._query(f"SELECT count(*) FROM data{where}", params)[0][0]
+
+    def slice(self, ids=None):
+        """CubeSlice of the filtered rows, its cells aggregated by DuckDB.
+
+        Every filter is exact on the rows (narrowed prices, timestamps with a
+        time of day), so there is no fallback to the filtered frame.
+        """
+        expressions = {"product": "CAST(product AS VARCHAR)", "day": "date_trunc('day', purchase_date)",
+                       "rating": "rating", "review_language": "CAST(review_language AS VARCHAR)"}
+        present = {"product": "product", "day": "purchase_date", "rating": "rating", "review_language": "review_language"}
+        dims = [d for d in CUBE_DIMS if present[d] in self.columns]
+        measures = ["count(*) AS count"]
+        if "price" in self.columns:
+            measures += ["count(price) AS price_count", "coalesce(sum(price), 0) AS price_sum",
+                         "coalesce(sum(price * price), 0) AS price_sumsq"]
+        select = [f"{expressions[d]} AS {d}" for d in dims] + measures
+        where, params = _where(ids)
+        group = " GROUP BY ALL" if dims else ""
+        cells = self._con.cursor().execute(f"SELECT {', '.join(select)} FROM data{where}{group}", params).df()
+        return CubeSlice(cells)
+
+    def fetch(self, ids=None, sample_fraction=1.0, columns=None):
+        """Filtered rows as a pandas frame indexed by row id, in the original row order.
+
+        sample_fraction < 1 keeps a deterministic subset (by row id hash), so
+        the sample of a filtered set is always inside the sample of the whole
+        dataset.
+        """
+        where, params = _where(ids)
+        if sample_fraction < 1.0:
+            where += (" AND " if where else " WHERE ") + "hash(" + ROW_ID + ") % 1000000 < ?"
+            params.append(int(sample_fraction * 1_000_000))
+        select = ", ".join(f'"{c}"' for c in (columns or self.columns))
+        table = self._con.cursor().execute(f"SELECT {select}, {ROW_ID} FROM data{where} ORDER BY {ROW_ID}",
+                                           params).to_arrow_table()
+        df = table.to_pandas()
+        df.index = pd.Index(df.pop(ROW_ID).to_numpy(), name=None)
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+        return df
+
+    def correlation(self, columns, ids=None):
+        """Pearson correlation matrix of numeric columns over the filtered rows, computed in one scan."""
+        pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i + 1:]]
+        if not pairs:
+            return pd.DataFrame(1.0, index=columns, columns=columns)
+        where, params = _where(ids)
+        select = ", ".join(f'corr("{a}", "{b}")' for a, b in pairs)
+        values = self._query(f"SELECT {select} FROM data{where}", params)[0]
+        matrix = pd.DataFrame(np.eye(len(columns)), index=columns, columns=columns)
+        for (a, b), value in zip(pairs, values):
+            matrix.loc[a, b] = matrix.loc[b, a] = np.nan if value is None else value
+        return matrix
+
+    def numeric_columns(self):
+        numeric = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "FLOAT", "DOUBLE", "DECIMAL",
+                   "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT")
+        return [name for name, kind, *_ in self._query("DESCRIBE data")
+                if name != ROW_ID and kind.split("(")[0] in numeric]
+
+
+def frame_backend(key, df, threads=None):
+    """DuckDB backend over an in-memory frame, written once as Parquet under its dataset key."""
+    path = parquet_path(key)
+    if not os.path.exists(path):
+        write_parquet(df, path)
+    return DuckDBBackend([path], threads)
+
+
+def file_backend(source, threads=None):
+    """(backend, info) for a local file queried out of core; the Parquet conversion is cached
+    by path, size and modification time."""
+    start = time.perf_counter()
+    stat = os.stat(source)
+    key = f"file:{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime}"
+    path = parquet_path(key)
+    cache_hit = os.path.exists(path)
+    if not cache_hit:
+        convert_file(source, path, threads)
+    backend = DuckDBBackend([path], threads)
+    info = {"key": key, "cache_hit": cache_hit, "seconds": time.perf_counter() - start,
+            "peak_rss_mb": peak_rss_mb(), "backend_rows": backend.n}
+    return backend, info
@@ -0,0 +1,267 @@
+"""Per-product HTML / PDF reports and the headless bulk export.
+
+Figures are rendered once per product to PNG bytes in memory and shared by
+the HTML (base64) and PDF (BytesIO) outputs, with no temp-file round trip.
+`export_all` fans products out over a process pool and writes the reports to
+a directory or streams them into a zip, with per-report timings:
+
+    python reports.py data.csv --out exports/ --workers 8
+    python reports.py data.csv --zip reports.zip
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import textwrap
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import figures
+
+FORMATS = ("html", "pdf")
+SESSIONS_DIR = os.path.join(tempfile.gettempdir(), "thorfin_sessions")
+SESSION_TTL = 24 * 3600
+
+
+def render_product_figures(product_df, wordcloud=True, cache=None, **key):
+    """PNG bytes of the report figures for one product: rating histogram, price boxplot, wordcloud.
+
+    With a figures.FigureCache, `key` (product, filter_state, dataset_version)
+    identifies the renders so the dashboard panel and both exports share them.
+    """
+    charts = ("hist_rating", "box_price") + (("wordcloud",) if wordcloud else ())
+    return figures.render_product_figures(product_df, charts, cache=cache, **key)
+
+
+def build_html_report(product, product_df, imgs, summary_text="", sample_reviews=None):
+    if sample_reviews is None:
+        sample_reviews = product_df['review_text'].dropna().astype(str).tolist()[:20] if 'review_text' in product_df.columns else []
+    b64 = {k: base64.b64encode(v).decode('utf-8') for k, v in imgs.items()}
+    html = f"""<!doctype html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>Thorfin Report - {product}</title>
+<style>
+body{{font-family:Arial, Helvetica, sans-serif; background:#f5f7fa; color:#111; padding:18px}}
+.header{{background:linear-gradient(90deg,#0b8453,#0f172a); color:white; padding:16px; border-radius:8px; text-align:center}}
+.container{{max-width:1100px; margin:18px auto}}
+.card{{background:white; padding:14px; border-radius:8px; box-shadow:0 6px 14px rgba(0,0,0,0.06); margin-bottom:14px}}
+.kpi{{display:flex; gap:18px; flex-wrap:wrap}}
+.kpi .item{{flex:1; min-width:160px; padding:12px; border-radius:6px; background:#f8fafc; text-align:center}}
+img{{max-width:100%; height:auto; display:block; margin:8px auto}}
+pre{{background:#f3f4f6; padding:12px; border-radius:6px; overflow:auto}}
+</style>
+</head>
+<body>
+<div class="container">
+<div class="header"><h1>Thorfin Product Insights — {product}</h1></div>
+
+<div class="card">
+  <h2>KPIs</h2>
+  <div class="kpi">
+    <div class="item"><strong>Nombre de reviews</strong><div>{product_df.shape[0]}</div></div>
+    <div class="item"><strong>Note moyenne</strong><div>{product_df['rating'].mean() if 'rating' in product_df.columns else 'N/A'}</div></div>
+    <div class="item"><strong>Prix moyen</strong><div>${product_df['price'].mean() if 'price' in product_df.columns else 'N/A'}</div></div>
+  </div>
+</div>
+"""
+
+    # add images
+    if 'hist_rating' in b64:
+        html += f"""
+        <div class="card"><h2>Distribution des notes</h2>
+        <img src="data:image/png;base64,{b64['hist_rating']}"></div>
+        """
+    if 'box_price' in b64:
+        html += f"""
+        <div class="card"><h2>Distribution des prix</h2>
+        <img src="data:image/png;base64,{b64['box_price']}"></div>
+        """
+    if 'wordcloud' in b64:
+        html += f"""
+        <div class="card"><h2>WordCloud (reviews)</h2>
+        <img src="data:image/png;base64,{b64['wordcloud']}"></div>
+        """
+
+    html += f"""
+    <div class="card"><h2>Résumé AI</h2><pre>{summary_text}</pre></div>
+    <div class="card"><h2>Extraits de reviews</h2><pre>{textwrap.fill(' '.join(sample_reviews), width=120)}</pre></div>
+    <div style="text-align:center; font-size:12px; color:#666; margin-top:12px">Généré le {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}</div>
+    </div></body></html>
+    """
+    return html
+
+
+def build_pdf_report(product, product_df, imgs, summary_text=""):
+    """PDF bytes; images are embedded from memory (needs fpdf2, imported here on first use)."""
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 14)
+    pdf.cell(0, 10, f"Thorfin Product Insights - {product}", align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(4)
+    pdf.set_font("Helvetica", "", 11)
+    pdf.cell(0, 8, f"Nombre de reviews: {product_df.shape[0]}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    if 'rating' in product_df.columns:
+        pdf.cell(0, 8, f"Note moyenne: {product_df['rating'].mean():.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    if 'price' in product_df.columns:
+        pdf.cell(0, 8, f"Prix moyen: ${product_df['price'].mean():.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(4)
+
+    if 'hist_rating' in imgs:
+        pdf.image(io.BytesIO(imgs['hist_rating']), x=10, w=pdf.w - 20)
+    if 'box_price' in imgs:
+        pdf.add_page()
+        pdf.image(io.BytesIO(imgs['box_price']), x=10, w=pdf.w - 20)
+
+    if summary_text:
+        pdf.add_page()
+        pdf.set_font("Helvetica", "B", 12)
+        pdf.cell(0, 8, "Résumé AI", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.set_font("Helvetica", "", 10)
+        # split into chunks for multi_cell
+        for line in summary_text.split("\n"):
+            pdf.multi_cell(0, 6, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    return bytes(pdf.output())
+
+
+def report_basename(product):
+    slug = re.sub(r"[^\w.-]+", "_", str(product)).strip("_") or "product"
+    return f"{slug}_report_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+
+
+def session_output_dir(session_id, root=SESSIONS_DIR, ttl=SESSION_TTL):
+    """Private output directory of one dashboard session.
+
+    Directories of sessions unused for more than `ttl` seconds are removed
+    on the way, since Streamlit has no hook for a session that ends.
+    """
+    path = os.path.join(root, re.sub(r"[^\w-]", "", str(session_id)))
+    os.makedirs(path, exist_ok=True)
+    os.utime(path)
+    now = time.time()
+    for entry in os.scandir(root):
+        try:
+            stale = entry.is_dir() and entry.path != path and now - entry.stat().st_mtime > ttl
+        except OSError:
+            continue
+        if stale:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return path
+
+
+def generate_product_reports(product, product_df, summary_text="", formats=FORMATS, cache=None, figure_key=None):
+    """Render one product's figures once and build every requested format.
+
+    Returns (files, timings): files maps file name to bytes, timings holds
+    the seconds spent per stage. `cache` and the `figure_key` dict are
+    passed on to render_product_figures.
+    """
+    timings = {}
+    start = time.perf_counter()
+    # the wordcloud only appears in the HTML report
+    imgs = render_product_figures(product_df, wordcloud="html" in formats, cache=cache, **(figure_key or {}))
+    timings["figures"] = time.perf_counter() - start
+    base = report_basename(product)
+    files = {}
+    if "html" in formats:
+        t = time.perf_counter()
+        files[f"{base}.html"] = build_html_report(product, product_df, imgs, summary_text).encode("utf-8")
+        timings["html"] = time.perf_counter() - t
+    if "pdf" in formats:
+        t = time.perf_counter()
+        files[f"{base}.pdf"] = build_pdf_report(product, product_df, imgs, summary_text)
+        timings["pdf"] = time.perf_counter() - t
+    timings["total"] = time.perf_counter() - start
+    return files, timings
+
+
+def _report_job(product, product_df, summary_text, formats):
+    try:
+        files, timings = generate_product_reports(product, product_df, summary_text, formats)
+        return product, files, timings, None
+    except Exception as e:
+        return product, {}, {}, str(e)
+
+
+def export_all(df, out_dir=None, zip_target=None, workers=None, formats=FORMATS, summaries=None):
+    """Generate reports for every product of `df` over a process pool.
+
+    Reports go to `out_dir`, or into a zip written incrementally to
+    `zip_target` (path or binary file object). Returns the manifest: one
+    entry per product with its files, per-stage timings and error if any;
+    it is also written as manifest.json next to the reports.
+    """
+    if (out_dir is None) == (zip_target is None):
+        raise ValueError("indiquer soit out_dir, soit zip_target")
+    summaries = summaries or {}
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    archive = zipfile.ZipFile(zip_target, "w", compression=zipfile.ZIP_DEFLATED) if zip_target is not None else None
+    manifest = []
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_report_job, str(product), group, summaries.get(str(product), ""), formats)
+                for product, group in df.groupby('product', observed=True)
+            ]
+            for future in as_completed(futures):
+                product, files, timings, error = future.result()
+                for name, data in files.items():
+                    if archive is not None:
+                        archive.writestr(name, data)
+                    else:
+                        with open(os.path.join(out_dir, name), "wb") as f:
+                            f.write(data)
+                manifest.append({"product": product, "files": sorted(files), "timings": timings, "error": error})
+        manifest.sort(key=lambda entry: entry["product"])
+        summary = {"products": len(manifest), "seconds": time.perf_counter() - start, "reports": manifest}
+        payload = json.dumps(summary, ensure_ascii=False, indent=2)
+        if archive is not None:
+            archive.writestr("manifest.json", payload)
+        else:
+            with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                f.write(payload)
+    finally:
+        if archive is not None:
+            archive.close()
+    return summary
+
+
+if __name__ == "__main__":
+    from dataset_cache import load_dataset
+
+    parser = argparse.ArgumentParser(description="Export HTML / PDF de tous les produits d'un dataset")
+    parser.add_argument("dataset")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="dossier de sortie")
+    target.add_argument("--zip", help="archive zip de sortie (- pour stdout)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--formats", default="html,pdf")
+    parser.add_argument("--summaries", help="JSON {produit: résumé} (ex. sortie de ai_summary.py)")
+    args = parser.parse_args()
+
+    with open(args.dataset, "rb") as f:
+        frame, _ = load_dataset(os.path.basename(args.dataset), f.read())
+    summaries = None
+    if args.summaries:
+        with open(args.summaries, encoding="utf-8") as f:
+            summaries = {p: r.get("summary", "") if isinstance(r, dict) else r for p, r in json.load(f).items()}
+    formats = tuple(fmt.strip() for fmt in args.formats.split(",") if fmt.strip())
+    zip_target = None
+    if args.zip:
+        zip_target = sys.stdout.buffer if args.zip == "-" else args.zip
+    result = export_all(frame, out_dir=args.out, zip_target=zip_target, workers=args.workers,
+                        formats=formats, summaries=summaries)
+    failed = [r for r in result["reports"] if r["error"]]
+    print(f"{result['products']} produits exportés en {result['seconds']:.2f} s ({len(failed)} erreurs)", file=sys.stderr)
@@ -0,0 +1,420 @@
+"""Headless analytics: the dashboard's KPIs, chart data, trends and reports without Streamlit.
+
+A dataset is loaded once, through the same persistent Arrow cache as the
+dashboard (or queried out of core by DuckDB, or read from the incremental
+history), then any number of queries run the dashboard's code paths:
+pipeline.apply_filters on the filter index, KPIs from the aggregate cube
+slice, offline sentiment, trends and the HTML / PDF reports. Results are
+memoized in a memo.SharedCache under the keys app.py uses, so with a common
+THORFIN_SHARED_CACHE_DIR the dashboard and the service reuse each other's
+per-filter results and figures.
+
+A query is a JSON object, every field optional:
+
+    {"date_from": "2024-01-01", "date_to": "2024-06-30", "price_min": 10, "price_max": 200,
+     "rating_min": 4, "rating_max": 5, "product": "tv", "dedup": false,
+     "include": ["kpis", "sentiment", "aggregates", "charts", "trends", "alerts"],
+     "charts": ["price", "pareto"], "freq": "W", "window": 8, "z": 3.0,
+     "report": {"product": "Thorfin Lumina 4K Smart TV", "formats": ["html", "pdf"]}}
+
+    python service.py data.csv --query '{"rating_min": 4, "include": ["kpis", "alerts"]}'
+    python service.py data.csv --queries queries.jsonl --out reports/ > results.jsonl
+    python service.py data.csv --serve --port 8502
+        GET  /kpis?rating_min=4&product=tv     (any section; query fields as parameters, lists comma-separated)
+        GET  /report?product=...&format=pdf    (the report file itself)
+        POST /query                            (a query or a list of queries, JSON results)
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+import query_backend
+import trends
+from aggregate_cube import AggregateCube
+from dataset_cache import load_dataset
+from dataset_store import DatasetStore, IncrementalDataset
+from dedup import deduplicate, find_near_duplicates
+from figures import FigureCache
+from filter_index import FilterIndex
+from memo import SharedCache
+from reports import FORMATS, generate_product_reports
+from text_scoring import score_reviews, sentiment_kpis, topic_breakdown
+
+SECTIONS = ("kpis", "sentiment", "aggregates", "charts", "trends", "alerts")
+POINT_BUDGET = 5000
+# query field -> parser of its text form (URL parameters)
+QUERY_FIELDS = {
+    "date_from": str, "date_to": str, "price_min": float, "price_max": float,
+    "rating_min": float, "rating_max": float, "product": str,
+    "dedup": lambda v: v.lower() in ("1", "true", "yes", "oui"),
+    "include": lambda v: [s for s in v.split(",") if s], "charts": lambda v: [s for s in v.split(",") if s],
+    "freq": str, "window": int, "z": float, "report": json.loads,
+}
+FILTER_FIELDS = {"purchase_date": ("date_from", "date_to"), "price": ("price_min", "price_max"),
+                 "rating": ("rating_min", "rating_max")}
+
+
+def to_json(value):
+    """JSON-ready copy of a result: NaN -> None, timestamps -> ISO strings, frames -> records."""
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient="records", date_format="iso"))
+    if isinstance(value, pd.Series):
+        return {str(k): to_json(v) for k, v in value.items()}
+    if isinstance(value, dict):
+        return {str(k): to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(v) for v in value]
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def query_filters(query):
+    """choose() for pipeline.apply_filters from a query; a missing bound keeps the current one."""
+    def choose(col, bounds):
+        if col == "product":
+            return query.get("product") or ""
+        lo, hi = (query.get(field) for field in FILTER_FIELDS[col])
+        if lo is None and hi is None:
+            return None
+        lo = bounds[0] if lo is None else lo
+        hi = bounds[1] if hi is None else hi
+        if col == "purchase_date":
+            return pd.Timestamp(lo), pd.Timestamp(hi)
+        lo, hi = float(lo), float(hi)
+        if col == "rating" and lo.is_integer() and hi.is_integer():
+            # same filter state (and cache keys) as the dashboard's integer slider
+            return int(lo), int(hi)
+        return lo, hi
+    return choose
+
+
+def parse_params(params):
+    """Query from URL parameters (parse_qs output)."""
+    query = {}
+    for field, values in params.items():
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"paramètre inconnu : {field}")
+        query[field] = QUERY_FIELDS[field](values[-1])
+    return query
+
+
+class Analytics:
+    """One loaded dataset and its derived structures, answering queries from any thread."""
+
+    def __init__(self, df, load_info, mode="Auto", backend=None, snapshot=None, summaries=None,
+                 cache=None, figure_cache=None):
+        self.df = df
+        self.load_info = load_info
+        self.mode = mode
+        self.backend = backend
+        self.snapshot = snapshot
+        self.summaries = summaries or {}
+        self.cache = cache if cache is not None else SharedCache()
+        self.figure_cache = figure_cache if figure_cache is not None else FigureCache()
+
+    @classmethod
+    def open(cls, path=None, store=None, mode="Auto", **kwargs):
+        """Load a dataset file (or query it out of core with mode="DuckDB"), or a history store."""
+        if store is not None:
+            df, info, snapshot = IncrementalDataset(DatasetStore(store)).dataset()
+            if df is None:
+                raise ValueError(f"historique vide : {store}")
+            return cls(df, info, mode, snapshot=snapshot, **kwargs)
+        if mode == "DuckDB":
+            if not query_backend.available():
+                raise ValueError("duckdb n'est pas installé")
+            backend, info = query_backend.file_backend(path)
+            info["sample_fraction"] = min(1.0, query_backend.SAMPLE_ROWS / max(backend.n, 1))
+            return cls(backend.fetch(None, info["sample_fraction"]), info, mode, backend=backend, **kwargs)
+        with open(path, "rb") as f:
+            df, info = load_dataset(os.path.basename(path), f.read())
+        if df is None:
+            raise ValueError(f"format non supporté : {path}")
+        return cls(df, info, mode, **kwargs)
+
+    def info(self):
+        return to_json({"rows": self.backend.n if self.backend is not None else self.df.shape[0],
+                        "columns": list(self.df.columns), "load": self.load_info,
+                        "cache": self.cache.stats(), "figure_cache": self.figure_cache.stats()})
+
+    def _dataset(self, dedup):
+        """(dataset key, frame, filter index or DuckDB backend, sample fraction, history snapshot or None),
+        as app.py builds them."""
+        key, df = self.load_info["key"], self.df
+        if dedup and "review_text" in df.columns:
+            clusters = self.cache.get_or_compute(("near_duplicates", key), lambda: find_near_duplicates(df), persist=True)
+            clustered = self.cache.get_or_compute(("duplicate_clusters", key), lambda: df.join(clusters))
+            df = self.cache.get_or_compute(("deduplicated", key), lambda: deduplicate(clustered, clustered))
+            key = f"{key}:dedup"
+        snapshot = self.snapshot if not dedup else None
+        if self.backend is not None and not dedup:
+            return key, df, self.backend, self.load_info["sample_fraction"], None
+        if query_backend.use_duckdb(self.mode):
+            backend = self.cache.get_or_compute(("frame_backend", key), lambda: query_backend.frame_backend(key, df))
+            return key, df, backend, 1.0, None
+        if snapshot is not None:
+            return key, df, snapshot["filter_index"], 1.0, snapshot
+        index = self.cache.get_or_compute(("filter_index", key), lambda: FilterIndex(df), persist=True)
+        return key, df, index, 1.0, None
+
+    def query(self, query):
+        """Result dict of one query; a requested report is returned as {file name: bytes} under "report"."""
+        start = time.perf_counter()
+        unknown = set(query) - set(QUERY_FIELDS)
+        if unknown:
+            raise ValueError(f"champs inconnus : {', '.join(sorted(unknown))}")
+        include = query.get("include") or ["kpis"]
+        unknown = set(include) - set(SECTIONS)
+        if unknown:
+            raise ValueError(f"sections inconnues : {', '.join(sorted(unknown))} (parmi {', '.join(SECTIONS)})")
+        key, dataset_df, index, sample_fraction, snapshot = self._dataset(bool(query.get("dedup")))
+        backend = index if isinstance(index, query_backend.DuckDBBackend) else None
+        row_ids, cube_filters, price_narrowed = pipeline.apply_filters(index, query_filters(query))
+        slice_key = (key, tuple(sorted(cube_filters.items())), price_narrowed)
+
+        filtered = []
+        def frame():
+            # filtered rows, materialized once and only for the sections that need them
+            if not filtered:
+                filtered.append(self.cache.get_or_compute(("filtered_rows", key, repr(row_ids), sample_fraction),
+                                                          lambda: backend.fetch(row_ids, sample_fraction))
+                                if backend is not None else pipeline.filter_frame(dataset_df, row_ids))
+            return filtered[0]
+
+        def compute_slice():
+            if backend is not None:
+                return backend.slice(row_ids)
+            cube = snapshot["cube"] if snapshot is not None else self.cache.get_or_compute(
+                ("aggregate_cube", key), lambda: AggregateCube(dataset_df), persist=True)
+            return pipeline.cube_slice(cube, frame(), cube_filters, price_narrowed)
+        slice_ = self.cache.get_or_compute(("cube_slice",) + slice_key, compute_slice, persist=True)
+
+        result = {"filters": cube_filters, "price_range": price_narrowed}
+        if query.get("dedup") and self.backend is not None:
+            # an out-of-core file is deduplicated on its in-memory sample: so are the KPIs
+            result["sample_fraction"] = self.load_info["sample_fraction"]
+        if "kpis" in include:
+            result["kpis"] = slice_.kpis()
+        if "aggregates" in include:
+            result["aggregates"] = {"product_counts": slice_.product_counts(),
+                                    "rating_histogram": slice_.rating_histogram(),
+                                    "rating_by_product": slice_.rating_by_product()}
+        if "sentiment" in include and "review_text" in dataset_df.columns:
+            if snapshot is not None and snapshot["scores"] is not None:
+                scores = snapshot["scores"]
+            else:
+                scores = self.cache.get_or_compute(("review_scores", key), lambda: score_reviews(dataset_df),
+                                                   persist=True)[0]
+            if scores is not None:
+                def compute_text_summary():
+                    rows = frame()
+                    return sentiment_kpis(scores.loc[rows.index]), topic_breakdown(rows, scores.loc[rows.index])
+                sentiment, topics = self.cache.get_or_compute(("text_summary",) + slice_key, compute_text_summary,
+                                                              persist=True)
+                result["sentiment"] = dict(sentiment, topics=topics)
+        if "charts" in include:
+            rows = frame()
+            server_render = pipeline.use_server_render("Auto", rows.shape[0], POINT_BUDGET)
+            charts = pipeline.build_charts(rows, slice_, server_render, POINT_BUDGET, names=query.get("charts"))
+            result["charts"] = {name: json.loads(fig.to_json()) for name, fig in charts.items()}
+        if "trends" in include or "alerts" in include:
+            freq, window = query.get("freq", "W"), int(query.get("window", trends.WINDOW))
+            if freq not in trends.FREQUENCIES:
+                raise ValueError(f"fréquence inconnue : {freq} (parmi {', '.join(trends.FREQUENCIES)})")
+            trend_frame = trends.cached_trends(self.cache, slice_key, slice_, freq, window)
+            if "trends" in include:
+                result["trends"] = trend_frame
+            if "alerts" in include:
+                result["alerts"] = trends.trend_alerts(trend_frame, float(query.get("z", trends.Z_THRESHOLD)))
+        if query.get("report"):
+            result["report"] = self.report(query["report"], frame(), slice_key)
+        result = to_json({k: v for k, v in result.items() if k != "report"}) | (
+            {"report": result["report"]} if "report" in result else {})
+        result["seconds"] = round(time.perf_counter() - start, 6)
+        return result
+
+    def report(self, spec, rows, slice_key):
+        """{file name: bytes} of one product's reports over the filtered rows, figures shared with the dashboard."""
+        product = spec.get("product")
+        formats = tuple(spec.get("formats") or FORMATS)
+        if set(formats) - set(FORMATS):
+            raise ValueError(f"formats possibles : {', '.join(FORMATS)}")
+        product_df = rows[rows["product"].astype(str) == str(product)]
+        if product_df.empty:
+            raise ValueError(f"aucune review pour le produit {product!r} avec ces filtres")
+        files, _ = generate_product_reports(str(product), product_df, self.summaries.get(str(product), ""), formats,
+                                            cache=self.figure_cache,
+                                            figure_key={"product": str(product), "filter_state": slice_key[1:],
+                                                        "dataset_version": slice_key[0]})
+        return files
+
+
+# --------------------------
+# HTTP service
+# --------------------------
+class Handler(BaseHTTPRequestHandler):
+    analytics = None
+
+    def _send(self, status, body, content_type="application/json", filename=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if content_type == "application/json" else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if filename:
+            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self, handle):
+        try:
+            handle()
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        section = url.path.strip("/")
+
+        def handle():
+            params = parse_qs(url.query)
+            if section in ("", "health"):
+                self._send(200, self.analytics.info())
+            elif section == "report":
+                fmt = params.pop("format", ["pdf"])[-1]
+                product = params.pop("product", [None])[-1]
+                result = self.analytics.query(parse_params(params) | {"report": {"product": product, "formats": [fmt]}})
+                name, data = next(iter(result["report"].items()))
+                self._send(200, data, "text/html; charset=utf-8" if fmt == "html" else "application/pdf", name)
+            elif section in SECTIONS or section == "query":
+                query = parse_params(params)
+                if section != "query":
+                    query["include"] = [section]
+                self._send(200, self._encode(self.analytics.query(query)))
+            else:
+                self._send(404, {"error": f"route inconnue : /{section}"})
+        self._answer(handle)
+
+    def do_POST(self):
+        def handle():
+            if urlparse(self.path).path.strip("/") != "query":
+                self._send(404, {"error": "route inconnue"})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if isinstance(body, list):
+                self._send(200, [self._answer_one(query) for query in body])
+            else:
+                self._send(200, self._encode(self.analytics.query(body)))
+        self._answer(handle)
+
+    def _answer_one(self, query):
+        # like run_queries: an invalid query gets its own error entry instead of failing the batch
+        try:
+            return self._encode(self.analytics.query(query))
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _encode(result):
+        if "report" in result:
+            result["report"] = {name: base64.b64encode(data).decode("ascii") for name, data in result["report"].items()}
+        return result
+
+
+def serve(analytics, host="127.0.0.1", port=8502):
+    Handler.analytics = analytics
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Service prêt sur http://{host}:{port} ({analytics.info()['rows']} lignes)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def run_queries(analytics, queries, out_dir=None, stream=sys.stdout):
+    """Answer queries in order, one JSON line each; report files are written to out_dir."""
+    answered = failed = 0
+    for query in queries:
+        try:
+            result = analytics.query(query)
+            if "report" in result:
+                if out_dir is None:
+                    raise ValueError("--out est nécessaire pour écrire les rapports")
+                os.makedirs(out_dir, exist_ok=True)
+                for name, data in result["report"].items():
+                    with open(os.path.join(out_dir, name), "wb") as f:
+                        f.write(data)
+                result["report"] = [os.path.join(out_dir, name) for name in result["report"]]
+            answered += 1
+        except Exception as e:
+            result = {"error": str(e)}
+            failed += 1
+        stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return answered, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KPIs, données de graphiques, tendances et rapports sans Streamlit")
+    parser.add_argument("dataset", nargs="?", help="fichier du jeu de données (CSV / Excel / JSON / Parquet avec --backend DuckDB)")
+    parser.add_argument("--store", help="dossier d'historique (dataset_store.py) au lieu d'un fichier")
+    parser.add_argument("--backend", choices=query_backend.BACKENDS, default="Auto")
+    parser.add_argument("--query", action="append", default=[], help="requête JSON (répétable)")
+    parser.add_argument("--queries", help="fichier de requêtes JSON lines (- pour stdin)")
+    parser.add_argument("--out", help="dossier des rapports générés")
+    parser.add_argument("--summaries", help="JSON {produit: résumé} inclus dans les rapports (ex. sortie de ai_summary.py)")
+    parser.add_argument("--serve", action="store_true", help="service HTTP local au lieu du mode batch")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+    if (args.dataset is None) == (args.store is None):
+        parser.error("indiquer soit un fichier, soit --store")
+
+    summaries = None
+    if args.summaries:
+        with open(args.summaries, encoding="utf-8") as f:
+            summaries = {p: r.get("summary", "") if isinstance(r, dict) else r for p, r in json.load(f).items()}
+    # same tier settings as the dashboard, so both can share THORFIN_SHARED_CACHE_DIR
+    cache_dir = os.getenv("THORFIN_SHARED_CACHE_DIR")
+    start = time.perf_counter()
+    analytics = Analytics.open(
+        args.dataset, store=args.store, mode=args.backend, summaries=summaries,
+        cache=SharedCache(max_bytes=int(os.getenv("THORFIN_SHARED_CACHE_MB", "1024")) * 1024 ** 2,
+                          disk_dir=os.path.join(cache_dir, "derived") if cache_dir else None),
+        figure_cache=FigureCache(disk_dir=os.path.join(cache_dir, "figures") if cache_dir else None))
+    print(f"Jeu de données chargé en {time.perf_counter() - start:.2f} s", file=sys.stderr)
+
+    if args.serve:
+        serve(analytics, args.host, args.port)
+    else:
+        queries = [json.loads(q) for q in args.query]
+        if args.queries:
+            source = sys.stdin if args.queries == "-" else open(args.queries, encoding="utf-8")
+            with source:
+                queries += [json.loads(line) for line in source if line.strip()]
+        if not queries:
+            queries = [{}]
+        start = time.perf_counter()
+        answered, failed = run_queries(analytics, queries, args.out)
+        stats = analytics.cache.stats()
+        print(f"{answered} requêtes traitées, {failed} erreurs, en {time.perf_counter() - start:.2f} s "
+              f"(cache : {stats['hits']} hits, {stats['misses']} misses)", file=sys.stderr)
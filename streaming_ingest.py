@@ -0,0 +1,156 @@
+"""Chunked ingestion of large CSV / JSON-lines exports under a memory budget.
+
+The file is read chunk by chunk and each chunk is coerced with the same rules
+as the regular loader. Only running aggregates (counts, sums, min/max,
+per-product groups) and a fixed-size reservoir sample are kept, so memory use
+depends on the budget rather than on the file size.
+"""
+import numpy as np
+import pandas as pd
+
+from dataset_cache import CATEGORICAL_COLUMNS, normalize_frame
+
+# rows read before the per-row footprint is known
+PROBE_ROWS = 5_000
+# share of the memory budget given to the reservoir sample, the rest bounds the chunk size
+SAMPLE_SHARE = 0.5
+CHUNK_SHARE = 0.25
+NUMERIC_COLUMNS = ("price", "rating")
+
+
+class StreamingAggregates:
+    """Running statistics and reservoir sample, updated one chunk at a time."""
+
+    def __init__(self, memory_budget_mb, seed=42):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        self.sample_size = None
+        self.sample = None
+        self.numeric = {c: {"count": 0, "sum": 0.0, "min": np.nan, "max": np.nan} for c in NUMERIC_COLUMNS}
+        self.date_min = pd.NaT
+        self.date_max = pd.NaT
+        self.per_product = None
+
+    def chunk_rows(self, bytes_per_row):
+        return max(1_000, int(self.memory_budget * CHUNK_SHARE / max(bytes_per_row, 1)))
+
+    def update(self, chunk):
+        chunk = normalize_frame(chunk, categorical=False)
+        if self.sample_size is None:
+            bytes_per_row = chunk.memory_usage(deep=True).sum() / max(len(chunk), 1)
+            self.sample_size = max(1_000, int(self.memory_budget * SAMPLE_SHARE / max(bytes_per_row, 1)))
+        self._update_stats(chunk)
+        self._update_sample(chunk)
+        self.rows += len(chunk)
+        return chunk
+
+    def _update_stats(self, chunk):
+        for col, stats in self.numeric.items():
+            if col not in chunk.columns:
+                continue
+            values = chunk[col].dropna()
+            if values.empty:
+                continue
+            stats["count"] += int(values.size)
+            stats["sum"] += float(values.sum())
+            stats["min"] = float(np.nanmin([stats["min"], values.min()]))
+            stats["max"] = float(np.nanmax([stats["max"], values.max()]))
+        if 'purchase_date' in chunk.columns and chunk['purchase_date'].notna().any():
+            cmin, cmax = chunk['purchase_date'].min(), chunk['purchase_date'].max()
+            self.date_min = cmin if pd.isna(self.date_min) else min(self.date_min, cmin)
+            self.date_max = cmax if pd.isna(self.date_max) else max(self.date_max, cmax)
+        if 'product' in chunk.columns:
+            agg = {"count": ("product", "size")}
+            for col in NUMERIC_COLUMNS:
+                if col in chunk.columns:
+                    agg[f"{col}_sum"] = (col, "sum")
+                    agg[f"{col}_count"] = (col, "count")
+            groups = chunk.groupby('product', dropna=True).agg(**agg)
+            self.per_product = groups if self.per_product is None else self.per_product.add(groups, fill_value=0)
+
+    def _update_sample(self, chunk):
+        # Algorithm R, vectorized over the chunk: global row i replaces slot j ~ U[0, i] when j < k
+        k = self.sample_size
+        chunk = chunk.reset_index(drop=True)
+        n_fill = max(0, min(k - self.rows, len(chunk)))
+        if n_fill:
+            head = chunk.iloc[:n_fill]
+            self.sample = head if self.sample is None else pd.concat([self.sample, head], ignore_index=True)
+        rest = np.arange(n_fill, len(chunk))
+        if rest.size == 0:
+            return
+        slots = self.rng.integers(0, self.rows + rest + 1)
+        keep = slots < k
+        rows, slots = rest[keep], slots[keep]
+        if rows.size == 0:
+            return
+        # several rows may hit the same slot: the latest one wins, as in the sequential algorithm
+        _, last = np.unique(slots[::-1], return_index=True)
+        rows, slots = rows[::-1][last], slots[::-1][last]
+        incoming = chunk.iloc[rows].set_axis(slots)
+        self.sample = pd.concat([self.sample.drop(index=slots), incoming]).sort_index()
+
+    def kpis(self):
+        rating, price = self.numeric["rating"], self.numeric["price"]
+        top_product = None
+        if self.per_product is not None and "rating_sum" in self.per_product.columns:
+            means = (self.per_product["rating_sum"] / self.per_product["rating_count"]).dropna()
+            if not means.empty:
+                top_product = means.idxmax()
+        return {
+            "num_reviews": self.rows,
+            "avg_rating": rating["sum"] / rating["count"] if rating["count"] else np.nan,
+            "avg_price": price["sum"] / price["count"] if price["count"] else np.nan,
+            "top_product": top_product,
+        }
+
+    def bounds(self):
+        return {
+            "purchase_date": (self.date_min, self.date_max),
+            "price": (self.numeric["price"]["min"], self.numeric["price"]["max"]),
+            "rating": (self.numeric["rating"]["min"], self.numeric["rating"]["max"]),
+        }
+
+    def sample_frame(self):
+        """Reservoir sample with the same dtypes as a regularly loaded dataset."""
+        if self.sample is None:
+            return None
+        sample = self.sample.reset_index(drop=True)
+        for col in CATEGORICAL_COLUMNS:
+            if col in sample.columns:
+                sample[col] = sample[col].astype("category")
+        return sample
+
+
+def is_streamable(name):
+    return name.lower().endswith((".csv", ".json", ".jsonl"))
+
+
+def open_reader(source, name):
+    """Chunked reader over a path or file object; JSON must be line-delimited."""
+    lname = name.lower()
+    if lname.endswith(".csv"):
+        return pd.read_csv(source, chunksize=PROBE_ROWS)
+    if lname.endswith((".json", ".jsonl")):
+        return pd.read_json(source, lines=True, chunksize=PROBE_ROWS)
+    raise ValueError(f"Format non supporté en streaming : {name} (CSV ou JSON lines uniquement)")
+
+
+def stream_dataset(source, name, memory_budget_mb, on_chunk=None):
+    """Read `source` in chunks, returning the filled StreamingAggregates.
+
+    on_chunk(aggregates) is called after every chunk so callers can show
+    partial KPIs and bounds while the file is still being read.
+    """
+    aggregates = StreamingAggregates(memory_budget_mb)
+    with open_reader(source, name) as reader:
+        for i, chunk in enumerate(reader):
+            if i == 0:
+                # size the following chunks from the footprint of the probe chunk
+                bytes_per_row = chunk.memory_usage(deep=True).sum() / max(len(chunk), 1)
+                reader.chunksize = aggregates.chunk_rows(bytes_per_row)
+            aggregates.update(chunk)
+            if on_chunk is not None:
+                on_chunk(aggregates)
+    return aggregates
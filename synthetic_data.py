@@ -0,0 +1,105 @@
+"""Synthetic review datasets with the data.csv schema, up to tens of millions of rows.
+
+The product catalog (names, descriptions, price ranges), the review templates
+per language and the language mix are learned from a seed file (data.csv by
+default); rows are drawn in vectorized chunks and appended to the output, so
+memory stays flat whatever the size:
+
+    python synthetic_data.py 10000000 --out synthetic_10m.csv
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["client_id", "product", "product_description", "price", "rating",
+           "review_text", "review_language", "purchase_date"]
+DEFAULT_SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.csv")
+CHUNK_ROWS = 500_000
+PRODUCT_PLACEHOLDER = "\x00"
+
+
+def learn_catalog(seed_file=DEFAULT_SEED_FILE):
+    """Catalog, templates and distributions of a seed file with the data.csv schema."""
+    seed = pd.read_csv(seed_file)
+    products = seed.groupby("product")[["product_description"]].first()
+    products["price_min"] = seed.groupby("product")["price"].min()
+    products["price_max"] = seed.groupby("product")["price"].max()
+    products = products.reset_index()
+    # review texts with the product name taken out become per-language templates
+    templates = pd.DataFrame({
+        "language": seed["review_language"].to_numpy(),
+        "template": [text.replace(product, PRODUCT_PLACEHOLDER)
+                     for text, product in zip(seed["review_text"], seed["product"])],
+    }).drop_duplicates().sort_values(["language", "template"], ignore_index=True)
+    dates = pd.to_datetime(seed["purchase_date"])
+    return {
+        "products": products,
+        "templates": templates,
+        "languages": seed["review_language"].value_counts(normalize=True),
+        "ratings": seed["rating"].value_counts(normalize=True).sort_index(),
+        "date_range": (dates.min(), dates.max()),
+    }
+
+
+def _client_ids(rng, n):
+    raw = rng.bytes(16 * n).hex()
+    ids = [raw[i:i + 32] for i in range(0, 32 * n, 32)]
+    return [f"{h[:8]}-{h[8:12]}-4{h[13:16]}-a{h[17:20]}-{h[20:]}" for h in ids]
+
+
+def generate_chunk(catalog, n, rng):
+    products = catalog["products"]
+    templates = catalog["templates"]
+    product = rng.integers(0, len(products), n)
+    # every (template, product) text is rendered once, rows only index into them
+    rendered = np.array([[t.replace(PRODUCT_PLACEHOLDER, p) for p in products["product"]]
+                         for t in templates["template"]], dtype=object)
+    languages = catalog["languages"]
+    language = rng.choice(len(languages), size=n, p=languages.to_numpy())
+    counts = templates.groupby("language", sort=False).size().reindex(languages.index).to_numpy()
+    offsets = templates.reset_index().groupby("language", sort=False)["index"].min().reindex(languages.index).to_numpy()
+    template = offsets[language] + (rng.random(n) * counts[language]).astype(np.int64)
+    price_min = products["price_min"].to_numpy()[product]
+    price_max = products["price_max"].to_numpy()[product]
+    start, end = catalog["date_range"]
+    days = rng.integers(0, (end - start).days + 1, n)
+    ratings = catalog["ratings"]
+    return pd.DataFrame({
+        "client_id": _client_ids(rng, n),
+        "product": products["product"].to_numpy()[product],
+        "product_description": products["product_description"].to_numpy()[product],
+        "price": np.round(rng.uniform(price_min, price_max), 2),
+        "rating": rng.choice(ratings.index.to_numpy(), size=n, p=ratings.to_numpy()),
+        "review_text": rendered[template, product],
+        "review_language": languages.index.to_numpy()[language],
+        "purchase_date": (start + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d"),
+    }, columns=COLUMNS)
+
+
+def write_synthetic(path, rows, seed=0, seed_file=DEFAULT_SEED_FILE, chunk_rows=CHUNK_ROWS):
+    """Write `rows` synthetic rows to a CSV (or .jsonl) file, chunk by chunk."""
+    catalog = learn_catalog(seed_file)
+    rng = np.random.default_rng(seed)
+    jsonl = path.lower().endswith(".jsonl")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for start in range(0, rows, chunk_rows):
+            chunk = generate_chunk(catalog, min(chunk_rows, rows - start), rng)
+            if jsonl:
+                chunk.to_json(f, orient="records", lines=True, force_ascii=False)
+            else:
+                chunk.to_csv(f, index=False, header=start == 0)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère un jeu de reviews synthétique (schéma data.csv)")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("--out", required=True, help="fichier .csv ou .jsonl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-file", default=DEFAULT_SEED_FILE, help="jeu de référence (catalogue, modèles de reviews)")
+    args = parser.parse_args()
+    write_synthetic(args.out, args.rows, args.seed, args.seed_file)
+    print(f"{args.rows} lignes écrites dans {args.out}", file=sys.stderr)
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# set before the modules are imported: the cache follows the working directory, which the tests
+# that write to it move to their tmp_path (instead of the user's cache directory)
+os.environ["THORFIN_CACHE_DIR"] = ".thorfin_cache"
+
+PRODUCTS = ["Thorfin Lumina 4K Smart TV", "Thorfin AeroTab Pro Tablet", "Thorfin BrewMate Smart Coffee Maker",
+            "Thorfin SkySound Bluetooth Speaker", "Thorfin ChillCube Mini Fridge"]
+
+
+def make_reviews(n=2000, seed=0, nan_share=0.05):
+    """Random frame with the dashboard's schema, NaNs injected in price / rating / date / product."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "client_id": [f"C{i:06d}" for i in rng.integers(0, n * 10, n)],
+        "product": pd.Categorical(rng.choice(PRODUCTS, n)),
+        "price": rng.uniform(5, 900, n).round(2),
+        "rating": rng.integers(1, 6, n).astype("float64"),
+        "review_text": rng.choice(["great product works well", "bad quality broke fast",
+                                   "ok for the price", "excellent sound and design"], n),
+        "review_language": pd.Categorical(rng.choice(["en", "fr", "es"], n)),
+        "purchase_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D"),
+    })
+    for col in ("price", "rating", "purchase_date", "product"):
+        df.loc[rng.random(n) < nan_share, col] = None
+    return df
+
+
+@pytest.fixture
+def reviews():
+    return make_reviews()
+
+
+@pytest.fixture
+def data_csv():
+    return os.path.join(ROOT, "data.csv")
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import pipeline
+from aggregate_cube import AggregateCube
+from conftest import make_reviews
+from filter_index import FilterIndex
+from test_filter_index import random_choose
+
+
+def expected_kpis(df):
+    by_product = df.groupby("product", observed=True)["rating"].mean().dropna()
+    return {
+        "num_reviews": len(df),
+        "avg_rating": df["rating"].mean(),
+        "avg_price": df["price"].mean(),
+        "top_product": by_product.idxmax() if not by_product.empty else None,
+    }
+
+
+def assert_slice_matches(slice_, df):
+    got, expected = slice_.kpis(), expected_kpis(df)
+    assert got["num_reviews"] == expected["num_reviews"]
+    for key in ("avg_rating", "avg_price"):
+        assert np.isclose(got[key], expected[key], equal_nan=True)
+    assert got["top_product"] == expected["top_product"]
+    counts = df["product"].astype(str)[df["product"].notna()].value_counts()
+    assert slice_.product_counts().to_dict() == counts.to_dict()
+    histogram = df["rating"].value_counts().sort_index()
+    assert slice_.rating_histogram().astype("int64").to_dict() == histogram.to_dict()
+
+
+def test_cube_slices_match_filtered_frames():
+    rng = np.random.default_rng(3)
+    for seed in range(3):
+        df = make_reviews(1500, seed=seed)
+        index, cube = FilterIndex(df), AggregateCube(df)
+        for _ in range(40):
+            choose, mask = random_choose(rng, index.products)
+            row_ids, cube_filters, price_narrowed = pipeline.apply_filters(index, choose)
+            filtered = pipeline.filter_frame(df, row_ids)
+            assert filtered.index.equals(df[mask(df)].index)
+            assert_slice_matches(pipeline.cube_slice(cube, filtered, cube_filters, price_narrowed), filtered)
+
+
+def test_append_matches_rebuild():
+    df = make_reviews(1200, seed=7)
+    merged = AggregateCube(df.iloc[:500]).append(df.iloc[500:900]).append(df.iloc[900:])
+    assert_slice_matches(merged.slice(), df)
+    dims = merged.dims
+    rebuilt = AggregateCube(df).cells.sort_values(dims).reset_index(drop=True)
+    appended = merged.cells.sort_values(dims).reset_index(drop=True)
+    pd.testing.assert_frame_equal(appended, rebuilt, check_dtype=False, check_categorical=False)
+
+
+def test_empty_slice():
+    cube = AggregateCube(make_reviews(300, seed=2))
+    empty = cube.slice(rating_range=(6, 9))
+    assert empty.num_reviews() == 0
+    assert np.isnan(empty.avg_rating()) and empty.top_product() is None
+    assert empty.product_counts().empty
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from ai_metrics import LatencyTracker, timed_stream
+
+
+def chunk(text=None, usage=None):
+    choices = [] if text is None else [SimpleNamespace(delta=SimpleNamespace(content=text))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_percentiles_leave_cache_hits_out_by_default():
+    tracker = LatencyTracker()
+    for total in (1.0, 2.0, 3.0, 4.0):
+        tracker.record(total, ttft=total / 10)
+    tracker.record(0.001, cache_hit=True)
+    assert tracker.percentiles("total") == {50: 2.5, 95: float(np.percentile([1, 2, 3, 4], 95))}
+    assert tracker.percentiles("total", include_cache_hits=True)[50] == 2.0
+    # cache hits have no time to first token
+    assert tracker.percentiles("ttft")[50] == 0.25
+    summary = tracker.summary()
+    assert summary["calls"] == 5 and summary["cache_hit_rate"] == 0.2
+
+
+def test_tracker_keeps_the_most_recent_records():
+    tracker = LatencyTracker(max_records=3)
+    for total in range(10):
+        tracker.record(float(total), label=str(total))
+    assert [r["label"] for r in tracker.records()] == ["7", "8", "9"]
+
+
+def test_empty_tracker():
+    tracker = LatencyTracker()
+    assert tracker.percentiles("total") == {50: None, 95: None}
+    assert tracker.summary()["cache_hit_rate"] is None
+
+
+def test_timed_stream_yields_deltas_and_records_usage():
+    tracker = LatencyTracker()
+    usage = SimpleNamespace(prompt_tokens=12, completion_tokens=3)
+    stream = [chunk("Bon"), chunk(""), chunk(" produit"), chunk(), chunk(usage=usage)]
+    assert "".join(timed_stream(stream, tracker, prompt_tokens=99, label="p")) == "Bon produit"
+    (record,) = tracker.records()
+    assert record["streamed"] and record["label"] == "p"
+    assert record["prompt_tokens"] == 12 and record["completion_tokens"] == 3
+    assert 0 <= record["ttft"] <= record["total"]
+
+
+def test_timed_stream_falls_back_to_estimates_without_usage():
+    tracker = LatencyTracker()
+    list(timed_stream([chunk("a"), chunk("b"), chunk("c")], tracker, prompt_tokens=7))
+    (record,) = tracker.records()
+    assert record["prompt_tokens"] == 7 and record["completion_tokens"] == 3
+
+
+def test_timed_stream_records_nothing_until_consumed():
+    tracker = LatencyTracker()
+    stream = timed_stream([chunk("a")], tracker)
+    assert tracker.records() == []
+    list(stream)
+    assert len(tracker.records()) == 1 and tracker.records()[0]["ttft"] is not None
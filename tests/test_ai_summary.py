@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+import ai_stub_server
+import ai_summary
+from ai_summary import SummaryCache, TokenBudget, TokenBudgetExceeded
+
+API_VERSION = "2024-12-01-preview"
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server = ai_stub_server.serve(port=0, **kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run(server, reviews, cache_dir, **kwargs):
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    async def main():
+        client = ai_summary.make_async_client(endpoint, "stub", API_VERSION)
+        try:
+            return await ai_summary.summarize_catalog(client, reviews, "Résumé", "stub-deployment",
+                                                      cache=SummaryCache(str(cache_dir)), **kwargs)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def long_reviews(n, size=2000):
+    # ~500 tokens each: 12 of them fill one chunk
+    return [f"review {i} " + "x" * size for i in range(n)]
+
+
+def test_chunk_reviews_bounds_and_order():
+    reviews = long_reviews(30) + ["short"] + ["y" * 100000]
+    chunks = ai_summary.chunk_reviews(reviews)
+    assert [r for chunk in chunks for r in chunk][:31] == reviews[:31]
+    for chunk in chunks:
+        assert len(chunk) == 1 or sum(map(ai_summary.estimate_tokens, chunk)) <= ai_summary.CHUNK_INPUT_TOKENS
+    # an oversized review is truncated to one chunk
+    assert len(chunks[-1][0]) == ai_summary.CHUNK_INPUT_TOKENS * ai_summary.CHARS_PER_TOKEN
+
+
+def test_map_reduce_merges_partials(stub, tmp_path):
+    server = stub()
+    results = run(server, {"A": long_reviews(30), "B": ["bien", "bof"]}, tmp_path)
+    chunks = len(ai_summary.chunk_reviews(long_reviews(30)))
+    assert chunks == 3
+    # three partial summaries, then one merge call
+    assert results["A"]["calls"] == chunks + 1
+    assert results["B"]["calls"] == 1
+    assert server.RequestHandlerClass._count == chunks + 2
+    # the merge call sees the partial summaries, not the reviews
+    assert "lignes analysées" in results["A"]["summary"]
+    assert not results["A"]["cached"] and "error" not in results["A"]
+
+
+def test_rate_limits_are_retried(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_summary, "BACKOFF_BASE", 0.01)
+    server = stub(rate_limit_every=3)
+    results = run(server, {f"P{i}": long_reviews(15) for i in range(3)}, tmp_path)
+    calls = sum(r["calls"] for r in results.values())
+    assert all("error" not in r for r in results.values())
+    # every third request was a 429 and got retried
+    assert server.RequestHandlerClass._count > calls
+
+
+def test_token_budget_stops_the_run(stub, tmp_path):
+    server = stub()
+    results = run(server, {"A": long_reviews(30)}, tmp_path, max_total_tokens=5000)
+    assert "budget" in results["A"]["error"]
+    assert results["A"]["calls"] == 0
+
+
+def test_cache_hits_skip_the_api(stub, tmp_path):
+    server = stub()
+    reviews = {"A": long_reviews(20), "B": ["bien"]}
+    first = run(server, reviews, tmp_path)
+    sent = server.RequestHandlerClass._count
+    # same review sets in another order still hit
+    second = run(server, {p: list(reversed(r)) for p, r in reviews.items()}, tmp_path)
+    assert server.RequestHandlerClass._count == sent
+    assert all(r["cached"] for r in second.values())
+    assert {p: r["summary"] for p, r in second.items()} == {p: r["summary"] for p, r in first.items()}
+
+
+class FailingClient:
+    """Client whose first call fails at once while the others hang until cancelled."""
+
+    def __init__(self):
+        self.cancelled = 0
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise ValueError("requête refusée")
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def test_failure_cancels_sibling_chunks_and_releases_the_budget():
+    client = FailingClient()
+    budget = TokenBudget(10 ** 6)
+
+    async def main():
+        with pytest.raises(ValueError):
+            await ai_summary.summarize_product(client, asyncio.Semaphore(8), budget, "stub",
+                                               long_reviews(40), "Résumé")
+        # checked before asyncio.run cancels leftover tasks on exit
+        return client.cancelled
+
+    assert asyncio.run(asyncio.wait_for(main(), timeout=10)) == 3
+    assert client.calls == 4
+    assert budget.used == 0
+
+
+def test_budget_reservation():
+    budget = TokenBudget(100)
+    budget.reserve(80)
+    with pytest.raises(TokenBudgetExceeded):
+        budget.reserve(30)
+    budget.settle(80, 50)
+    budget.reserve(30)
+    assert budget.used == 80
@@ -0,0 +1,56 @@
+import json
+import os
+from unittest import mock
+
+import pytest
+
+import pipeline
+
+streamlit_testing = pytest.importorskip("streamlit.testing.v1")
+import streamlit.delta_generator as dg  # noqa: E402
+from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AZURE_API_KEY", "stub")
+    with open(os.path.join(ROOT, "data.csv"), "rb") as f:
+        data = f.read()
+
+    def file_uploader(self, label, *args, **kwargs):
+        return UploadedFile(UploadedFileRec("data", "data.csv", "text/csv", data), None)
+
+    with mock.patch.object(dg.DeltaGenerator, "file_uploader", file_uploader):
+        at = streamlit_testing.AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300)
+        at.run()
+        assert not at.exception
+        yield at
+
+
+def chart_titles(at):
+    titles = []
+    for chart in at.get("plotly_chart"):
+        title = json.loads(chart.proto.spec)["layout"].get("title", {})
+        titles.append(title.get("text") if isinstance(title, dict) else title)
+    return titles
+
+
+def test_optional_charts_are_chart_names():
+    assert set(pipeline.OPTIONAL_CHARTS) <= set(pipeline.CHARTS)
+
+
+def test_optional_charts_only_render_when_selected(app):
+    optional = ("Violin", "Répartition des produits", "Donut")
+    titles = chart_titles(app)
+    assert any(t and t.startswith("Boxplot") for t in titles)
+    assert not [t for t in titles if t and t.startswith(optional)]
+
+    [m for m in app.multiselect if m.label == "Graphiques supplémentaires"][0].set_value(["violin", "donut"]).run()
+    assert not app.exception
+    titles = chart_titles(app)
+    assert any(t.startswith("Violin") for t in titles if t)
+    assert any(t.startswith("Donut") for t in titles if t)
+    assert not any(t.startswith("Répartition des produits") for t in titles if t)
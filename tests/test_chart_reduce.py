@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+import chart_reduce
+import pipeline
+from aggregate_cube import AggregateCube
+from conftest import make_reviews
+
+
+def test_box_stats_match_pandas_quantiles():
+    df = make_reviews(800, seed=4)
+    stats = chart_reduce.box_stats(df, "product", "rating")
+    expected = df.dropna(subset=["product", "rating"]).groupby("product", observed=True)["rating"]
+    assert np.allclose(stats["median"], expected.median().reindex(stats.index))
+    assert np.allclose(stats["mean"], expected.mean().reindex(stats.index))
+    assert (stats["lowerfence"] <= stats["q1"]).all() and (stats["upperfence"] >= stats["q3"]).all()
+
+
+def test_empty_input_skips_reduced_charts():
+    df = make_reviews(200, seed=1)
+    df["rating"] = np.nan
+    assert chart_reduce.box_stats(df, "product", "rating").empty
+    assert chart_reduce.box_figure(df, "product", "rating", "t") is None
+    assert chart_reduce.violin_figure(df, "product", "rating", "t") is None
+    empty = df.iloc[:0]
+    figs = pipeline.build_charts(empty, AggregateCube(empty).slice(), server_render=True)
+    assert not {"box", "violin", "pie", "donut"} & set(figs)
+
+
+def test_stratified_sample_keeps_every_group():
+    df = pd.DataFrame({"g": ["a"] * 990 + ["b"] * 10, "v": range(1000)})
+    sample = chart_reduce.stratified_sample(df, "g", 100)
+    assert 90 <= len(sample) <= 110
+    assert set(sample["g"]) == {"a", "b"}
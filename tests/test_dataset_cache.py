@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+
+import dataset_cache
+from conftest import ROOT
+from dataset_cache import cache_path, content_hash, default_cache_dir, load_dataset
+
+
+def read(name="data.csv"):
+    with open(os.path.join(ROOT, name), "rb") as f:
+        return f.read()
+
+
+def test_second_load_hits_the_arrow_cache(tmp_path):
+    data = read()
+    cold, info = load_dataset("data.csv", data, cache_dir=str(tmp_path))
+    assert not info["cache_hit"] and info["key"] == content_hash(data) + "-csv"
+    warm, info = load_dataset("data.csv", data, cache_dir=str(tmp_path))
+    assert info["cache_hit"]
+    pd.testing.assert_frame_equal(cold, warm)
+    assert warm["product"].dtype == "category" and warm["purchase_date"].dtype.kind == "M"
+
+
+def test_truncated_cache_file_is_rebuilt(tmp_path):
+    data = read()
+    expected, info = load_dataset("data.csv", data, cache_dir=str(tmp_path))
+    path = cache_path(info["key"], str(tmp_path))
+    with open(path, "r+b") as f:
+        f.truncate(100)
+    df, info = load_dataset("data.csv", data, cache_dir=str(tmp_path))
+    assert not info["cache_hit"]
+    pd.testing.assert_frame_equal(df, expected)
+    assert load_dataset("data.csv", data, cache_dir=str(tmp_path))[1]["cache_hit"]
+
+
+def test_same_bytes_parsed_as_json_and_jsonl_are_cached_apart(tmp_path):
+    # a column-oriented JSON object is also a valid one-line JSONL file
+    data = b'{"client_id":{"0":"C1","1":"C2"}}\n'
+    as_json, info = load_dataset("x.json", data, cache_dir=str(tmp_path))
+    as_jsonl, other = load_dataset("x.jsonl", data, cache_dir=str(tmp_path))
+    assert not other["cache_hit"] and other["key"] != info["key"]
+    assert len(as_json) == 2 and len(as_jsonl) == 1
+    assert len(load_dataset("x.json", data, cache_dir=str(tmp_path))[0]) == 2
+
+
+def test_columns_are_normalized_and_bad_values_coerced(tmp_path):
+    data = b"Product, Price ,Rating,Purchase Date\nA,12.5,4,2024-01-02\nB,n/a,five,not a date\n"
+    df, _ = load_dataset("x.csv", data, cache_dir=str(tmp_path))
+    assert list(df.columns) == ["product", "price", "rating", "purchase_date"]
+    assert df["price"].isna().tolist() == [False, True] and df["rating"].isna().tolist() == [False, True]
+    assert df["purchase_date"].isna().tolist() == [False, True]
+
+
+def test_unsupported_format(tmp_path):
+    assert load_dataset("x.parquet", b"PAR1", cache_dir=str(tmp_path)) == (None, None)
+
+
+def test_default_cache_dir_is_not_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv("THORFIN_CACHE_DIR")
+    assert os.path.isabs(default_cache_dir())
+    monkeypatch.setattr(dataset_cache, "user_cache_dir", None)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert default_cache_dir() == os.path.join(str(tmp_path), "thorfin")
+    monkeypatch.setenv("THORFIN_CACHE_DIR", "/srv/thorfin")
+    assert default_cache_dir() == "/srv/thorfin"
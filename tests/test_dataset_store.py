@@ -0,0 +1,163 @@
+import io
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+import text_scoring
+from conftest import make_reviews
+from dataset_store import DatasetStore, IncrementalDataset
+from test_filter_index import random_choose
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # the score store lives under the working directory's cache
+    monkeypatch.chdir(tmp_path)
+
+
+def delta_csv(df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def deltas(n=4, rows=400):
+    df = make_reviews(n * rows, seed=11)
+    df["client_id"] = [f"C{i:06d}" for i in range(len(df))]
+    return [df.iloc[i * rows:(i + 1) * rows] for i in range(n)]
+
+
+def assert_same_dataset(incremental, rebuilt):
+    pd.testing.assert_frame_equal(incremental["df"], rebuilt["df"], check_categorical=False)
+    dims = incremental["cube"].dims
+    pd.testing.assert_frame_equal(incremental["cube"].cells.sort_values(dims).reset_index(drop=True),
+                                  rebuilt["cube"].cells.sort_values(dims).reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+    assert incremental["term_counts"].frequencies(top=10 ** 6) == rebuilt["term_counts"].frequencies(top=10 ** 6)
+    pd.testing.assert_frame_equal(incremental["scores"], rebuilt["scores"])
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        choose, _ = random_choose(rng, rebuilt["filter_index"].products)
+        state = []
+        ids = pipeline.apply_filters(incremental["filter_index"], lambda c, b: state.append(choose(c, b)) or state[-1])[0]
+        replay = iter(state)
+        expected = pipeline.apply_filters(rebuilt["filter_index"], lambda c, b: next(replay))[0]
+        assert pipeline.filter_frame(rebuilt["df"], ids).index.equals(pipeline.filter_frame(rebuilt["df"], expected).index)
+
+
+def test_appends_match_a_full_rebuild(tmp_path):
+    history = IncrementalDataset(DatasetStore(str(tmp_path / "store")))
+    parts = deltas()
+    for i, part in enumerate(parts):
+        # each delta repeats some rows of the previous one; the undated ones can't be matched
+        repeated = parts[i - 1].iloc[:50] if i else part.iloc[:0]
+        info = history.append(f"delta_{i}.csv", delta_csv(pd.concat([repeated, part])))
+        matched = int(repeated["purchase_date"].notna().sum())
+        assert info["added"] == len(part) + len(repeated) - matched and info["duplicates_in_history"] == matched
+    _, info, snapshot = history.dataset()
+    assert info["store_version"] == len(parts)
+    assert_same_dataset(snapshot, IncrementalDataset(DatasetStore(str(tmp_path / "store"))).snapshot)
+
+
+def test_snapshot_catches_up_with_other_writers(tmp_path):
+    root = str(tmp_path / "store")
+    parts = deltas()
+    ui = IncrementalDataset(DatasetStore(root))
+    ui.append("delta_0.csv", delta_csv(parts[0]))
+    # the CLI (or another worker) appends behind the UI's back
+    DatasetStore(root).append("delta_1.csv", delta_csv(parts[1]))
+    df, info, _ = ui.dataset()
+    assert len(df) == 800 and info["store_version"] == 2
+    DatasetStore(root).append("delta_2.csv", delta_csv(parts[2]))
+    info = ui.append("delta_3.csv", delta_csv(parts[3]))
+    assert info["version"] == 4
+    assert_same_dataset(ui.snapshot, IncrementalDataset(DatasetStore(root)).snapshot)
+
+
+def test_previous_snapshot_is_left_untouched(tmp_path):
+    parts = deltas(2)
+    history = IncrementalDataset(DatasetStore(str(tmp_path / "store")))
+    history.append("delta_0.csv", delta_csv(parts[0]))
+    before = history.snapshot
+    frequencies = before["term_counts"].frequencies(top=10 ** 6)
+    history.append("delta_1.csv", delta_csv(parts[1]))
+    assert history.snapshot is not before and len(before["df"]) == len(parts[0])
+    assert before["term_counts"].frequencies(top=10 ** 6) == frequencies
+    assert before["filter_index"].n == len(parts[0]) and len(before["scores"]) == len(parts[0])
+    # the new snapshot says what it added to the previous one
+    assert before["delta"] is None and history.snapshot["delta"]["key"] == history.store.key(before["manifest"])
+    assert history.snapshot["delta"]["cube"].cells["count"].sum() == len(parts[1])
+
+
+def test_rows_without_a_key_are_always_kept(tmp_path):
+    store = DatasetStore(str(tmp_path / "store"))
+    part = deltas(1, rows=6)[0].copy()
+    part["client_id"] = [None, None, None, "C1", "C1", "C2"]
+    part["purchase_date"] = pd.Timestamp("2024-01-01")
+    part.loc[part.index[5], "purchase_date"] = None
+    _, info = store.append("delta.csv", delta_csv(part))
+    # the two anonymous reviews of the same day are distinct; only C1's repeat is dropped
+    assert info["added"] == 5 and info["duplicates_in_delta"] == 1
+    _, info = store.append("delta_again.csv", delta_csv(part))
+    assert info["added"] == 4 and info["duplicates_in_history"] == 2
+
+
+def test_concurrent_appends_keep_every_row(tmp_path, monkeypatch):
+    root = str(tmp_path / "store")
+    parts = deltas()
+    contains = DatasetStore.contains
+    # widen the window between reading the manifest and writing the next one
+    monkeypatch.setattr(DatasetStore, "contains", lambda self, *a: time.sleep(0.2) or contains(self, *a))
+    errors = []
+
+    def writer(i):
+        try:
+            DatasetStore(root).append(f"delta_{i}.csv", delta_csv(parts[i]))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(len(parts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    manifest = DatasetStore(root).manifest()
+    assert manifest["version"] == len(parts) and manifest["rows"] == sum(len(p) for p in parts)
+    assert len({s["file"] for s in manifest["segments"]}) == len(parts)
+    assert len(DatasetStore(root).load()) == manifest["rows"]
+
+
+def test_rebuilt_store_reloads(tmp_path):
+    root = str(tmp_path / "store")
+    parts = deltas(2)
+    history = IncrementalDataset(DatasetStore(root))
+    history.append("delta_0.csv", delta_csv(parts[0]))
+    os.remove(os.path.join(root, "manifest.json"))
+    DatasetStore(root).append("delta_1.csv", delta_csv(parts[1]))
+    df, info, _ = history.dataset()
+    assert info["store_version"] == 1 and len(df) == len(parts[1])
+
+
+def test_score_store_segments(tmp_path):
+    store = text_scoring.ScoreStore(str(tmp_path / "scores"))
+    df = make_reviews(1600, seed=3)
+    df["client_id"] = [f"C{i:06d}" for i in range(len(df))]
+    expected = text_scoring.score_texts(df["review_text"])
+    for start in range(0, len(df), 100):
+        scores, info = text_scoring.score_reviews(df.iloc[start:start + 100], store)
+        assert info == {"scored": 100, "reused": 0}
+    # size-tiered merges keep O(log n) segments
+    assert len(store._segments()) <= 5
+    scores, info = text_scoring.score_reviews(df, store)
+    assert info == {"scored": 0, "reused": len(df)}
+    pd.testing.assert_frame_equal(scores, expected)
+    # an edited text is a new key
+    df.loc[0, "review_text"] = "bad, could be better"
+    scores, info = text_scoring.score_reviews(df.iloc[:10], store)
+    assert info == {"scored": 1, "reused": 9} and scores["sentiment"][0] == -1
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import dedup
+
+BASE = ("the {p} arrived quickly and the setup was easy, sound quality is excellent and the design looks "
+        "modern in our living room, would recommend it to friends")
+
+
+def shingle_set(text, k=dedup.SHINGLE_SIZE):
+    words = text.split()
+    return {tuple(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def test_minhash_estimates_jaccard():
+    rng = np.random.default_rng(0)
+    vocabulary = [f"w{chr(97 + i)}{chr(97 + j)}" for i in range(26) for j in range(26)]
+    a = list(rng.choice(vocabulary, 200))
+    b = a[:120] + list(rng.choice(vocabulary, 80))
+    docs = np.array([" ".join(a), " ".join(b)], dtype=object)
+    signatures = dedup.minhash_signatures(docs, num_perm=512)
+    estimate = (signatures[0] == signatures[1]).mean()
+    sa, sb = shingle_set(docs[0]), shingle_set(docs[1])
+    assert abs(estimate - len(sa & sb) / len(sa | sb)) < 0.06
+
+
+def test_templates_and_near_duplicates_cluster():
+    df = pd.DataFrame({
+        "product": ["TV", "Tablet", "TV", "TV", "Speaker"],
+        "review_text": [BASE.format(p="TV"), BASE.format(p="Tablet"), BASE.format(p="TV").replace("friends", "family"),
+                        "broke after two days, the battery never charges and support did not answer", ""],
+    })
+    clusters = dedup.find_near_duplicates(df)
+    assert clusters["dup_cluster"].tolist() == [0, 0, 0, 1, 2]
+    assert clusters["dup_cluster_size"].tolist() == [3, 3, 3, 1, 1]
+    assert dedup.deduplicate(df, clusters).index.tolist() == [0, 1, 3, 4]
+    assert dedup.deduplicate(df, clusters, per_product=False).index.tolist() == [0, 3, 4]
+
+
+def test_distinct_reviews_stay_apart():
+    rng = np.random.default_rng(1)
+    words = np.array([f"mot{chr(97 + i)}" for i in range(26)])
+    df = pd.DataFrame({"review_text": [" ".join(rng.choice(words, 30)) for _ in range(300)]})
+    clusters = dedup.find_near_duplicates(df)
+    assert (clusters["dup_cluster_size"] == 1).all()
+
+
+def test_connected_components_are_transitive():
+    labels = dedup._connected_components(6, np.array([4, 2, 5]), np.array([5, 1, 3]))
+    assert labels.tolist() == [0, 1, 1, 3, 3, 3]
+
+
+def test_empty_frame():
+    df = pd.DataFrame({"review_text": pd.Series([], dtype="object")})
+    assert dedup.find_near_duplicates(df).empty
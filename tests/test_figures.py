@@ -0,0 +1,52 @@
+import matplotlib.pyplot as plt
+import pandas as pd
+
+import figures
+from figures import FigureCache, filter_hash, render_product_figures
+
+
+def test_render_is_keyed_by_chart_product_filters_and_version():
+    cache = FigureCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        fig, ax = plt.subplots()
+        ax.plot([0, 1], [1, 0])
+        return fig
+
+    png = cache.render("hist", "A", (("rating", 1, 5),), "v1", build)
+    assert png.startswith(b"\x89PNG")
+    assert cache.render("hist", "A", (("rating", 1, 5),), "v1", build) == png and len(builds) == 1
+    for args in (("box", "A", (("rating", 1, 5),), "v1"), ("hist", "B", (("rating", 1, 5),), "v1"),
+                 ("hist", "A", (("rating", 2, 5),), "v1"), ("hist", "A", (("rating", 1, 5),), "v2")):
+        cache.render(*args, build)
+    assert len(builds) == 5
+    assert cache.render("hist", "A", (("rating", 1, 5),), "v1", build, fmt="svg").lstrip().startswith(b"<")
+    # a figure-less build is cached as None
+    assert cache.render("none", "A", (), "v1", lambda: builds.append(1)) is None
+    assert cache.render("none", "A", (), "v1", lambda: builds.append(1)) is None and len(builds) == 7
+
+
+def test_no_pyplot_figure_outlives_a_render():
+    before = len(plt.get_fignums())
+    FigureCache().render("hist", "A", (), "v1", lambda: plt.subplots()[0])
+    assert len(plt.get_fignums()) == before
+
+
+def test_filter_hash_is_stable_and_distinguishes_states():
+    state = (("date", pd.Timestamp("2024-01-01")), ("price", 1.0, 9.5))
+    assert filter_hash(state) == filter_hash(tuple(state)) and len(filter_hash(state)) == 16
+    assert filter_hash(state) != filter_hash((("price", 1.0, 9.5),))
+
+
+def test_product_figures_skip_charts_that_do_not_apply(reviews):
+    product_df = reviews[reviews['product'] == reviews['product'].dropna().iloc[0]]
+    cache = FigureCache()
+    key = {"product": "A", "filter_state": (), "dataset_version": "v1"}
+    imgs = render_product_figures(product_df, cache=cache, **key)
+    assert set(imgs) == set(figures.PRODUCT_FIGURES)
+    assert render_product_figures(product_df, cache=cache, **key) == imgs
+    assert cache.stats()["misses"] == len(imgs)
+    no_prices = product_df.assign(price=float("nan"))
+    assert set(render_product_figures(no_prices, ("hist_rating", "box_price"))) == {"hist_rating"}
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+import pipeline
+from conftest import make_reviews
+from filter_index import FilterIndex
+
+
+def random_choose(rng, products):
+    """Random filter state for pipeline.apply_filters, and the same state as a pandas mask builder."""
+    state = {}
+
+    def choose(col, bounds):
+        if col == "product":
+            state["product"] = rng.choice(["", "smart", "tv", "thorfin", "zzz", products[rng.integers(len(products))][8:14]])
+            return state["product"]
+        if rng.random() < 0.3:
+            return None
+        if col == "purchase_date":
+            lo = pd.Timestamp(bounds[0]) + pd.Timedelta(days=int(rng.integers(0, 400)))
+            hi = lo + pd.Timedelta(days=int(rng.integers(0, 400)))
+        elif col == "rating":
+            lo = int(rng.integers(1, 6)); hi = int(rng.integers(lo, 6))
+        else:
+            lo, hi = sorted(rng.uniform(float(bounds[0]), float(bounds[1]), 2))
+        state[col] = (lo, hi)
+        return lo, hi
+
+    def mask(df):
+        keep = pd.Series(True, index=df.index)
+        for col in ("purchase_date", "price", "rating"):
+            if col in state:
+                lo, hi = state[col]
+                keep &= df[col].between(lo, hi)
+        if state.get("product"):
+            keep &= df["product"].astype(str).str.lower().str.contains(state["product"].lower(), regex=False)
+        return keep
+
+    return choose, mask
+
+
+def test_filters_match_pandas_masks():
+    rng = np.random.default_rng(1)
+    sizes = []
+    for seed in range(4):
+        df = make_reviews(1500, seed=seed)
+        index = FilterIndex(df)
+        for _ in range(50):
+            choose, mask = random_choose(rng, index.products)
+            row_ids, _, _ = pipeline.apply_filters(index, choose)
+            expected = df[mask(df)]
+            got = pipeline.filter_frame(df, row_ids)
+            assert got.index.equals(expected.index)
+            sizes.append(len(got))
+    # the random states cover empty, partial and unfiltered results
+    assert min(sizes) == 0 and max(sizes) == 1500 and any(0 < n < 1500 for n in sizes)
+
+
+def test_append_matches_rebuild():
+    df = make_reviews(1200, seed=5)
+    head, tail = df.iloc[:700], df.iloc[700:]
+    merged = FilterIndex(head).append(tail)
+    full = FilterIndex(df)
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        choose, _ = random_choose(rng, full.products)
+        state = []
+        ids_merged = pipeline.apply_filters(merged, lambda c, b: state.append(choose(c, b)) or state[-1])[0]
+        replay = iter(state)
+        ids_full = pipeline.apply_filters(full, lambda c, b: next(replay))[0]
+        assert pipeline.filter_frame(df, ids_merged).index.equals(pipeline.filter_frame(df, ids_full).index)
+
+
+def test_segmented_appends_match_rebuild():
+    df = make_reviews(3000, seed=6)
+    # a product first seen in a later delta, and a delta without any product
+    df["product"] = df["product"].astype(object)
+    df.loc[df.index[2400:2600], "product"] = "Thorfin Nova Smart Lamp"
+    df.loc[df.index[2600:2650], "product"] = None
+    cuts = [0, 1000, 1100, 1150, 1400, 1410, 2000, 2400, 2600, 2650, 2800, 2900, 3000]
+    index = FilterIndex(df.iloc[:cuts[1]])
+    rng = np.random.default_rng(3)
+    part_counts = []
+    for lo, hi in zip(cuts[1:], cuts[2:]):
+        previous = index
+        index = index.append(df.iloc[lo:hi])
+        assert index.n == hi and previous.n == lo
+        sizes = [p.n for p in index.parts]
+        assert all(a > 2 * b for a, b in zip(sizes, sizes[1:]))
+        part_counts.append(len(sizes))
+        head = df.iloc[:hi]
+        full = FilterIndex(head)
+        for col in ("purchase_date", "price", "rating"):
+            assert index.bounds(col) == full.bounds(col)
+        for _ in range(15):
+            choose, mask = random_choose(rng, full.products)
+            state = []
+            ids = pipeline.apply_filters(index, lambda c, b: state.append(choose(c, b)) or state[-1])[0]
+            replay = iter(state)
+            expected = pipeline.apply_filters(full, lambda c, b: next(replay))[0]
+            assert pipeline.filter_frame(head, ids).index.equals(pipeline.filter_frame(head, expected).index)
+            assert pipeline.filter_frame(head, ids).index.equals(head.index[mask(head).to_numpy()])
+    assert max(part_counts) == 3
+    assert np.array_equal(np.sort(index.product_ids("nova")), np.arange(2400, 2600))
+    assert index.product_ids("nova lamp").size == 0
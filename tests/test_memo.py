@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from memo import LRUCache, SharedCache, sizeof
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_byte_budget_evicts_oldest_and_skips_oversized():
+    cache = SharedCache(max_bytes=3000)
+    for key in "abc":
+        cache.put(key, np.zeros(125))  # 1000 bytes each
+    cache.get("a")
+    cache.put("d", np.zeros(125))
+    assert "b" not in cache and {"a", "c", "d"} <= {k for k in "abcd" if k in cache}
+    assert cache.bytes == 3000 and cache.stats()["evictions"] == 1
+    cache.put("huge", np.zeros(1000))
+    assert "huge" not in cache and cache.bytes == 3000
+    # replacing a key releases its previous size
+    cache.put("a", np.zeros(10))
+    assert cache.bytes == 2080
+
+
+def test_single_flight():
+    cache = SharedCache()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(6)]
+    threads[0].start()
+    started.wait()
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["value"] * 6 and len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["single_flight_waits"] == 5
+    assert cache.get_or_compute("k", compute) == "value" and cache.stats()["hits"] == 1
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = SharedCache()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute("k", fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    waiters = [threading.Thread(target=call) for _ in range(3)]
+    for t in waiters:
+        t.start()
+    for t in [leader] + waiters:
+        t.join()
+    assert errors == ["boom"] * 4
+    assert "k" not in cache and cache.get_or_compute("k", lambda: 1) == 1
+
+
+def test_disk_tier_is_shared_and_pruned(tmp_path):
+    disk = str(tmp_path / "derived")
+    first = SharedCache(disk_dir=disk, disk_max_bytes=60_000)
+    first.get_or_compute(("a", 1), lambda: np.arange(1000), persist=True)
+    first.get_or_compute(("not persisted",), lambda: 1)
+    second = SharedCache(disk_dir=disk, disk_max_bytes=60_000)
+    value = second.get_or_compute(("a", 1), lambda: pytest.fail("recomputed"), persist=True)
+    assert (value == np.arange(1000)).all() and second.stats()["disk_hits"] == 1
+    assert len(os.listdir(disk)) == 1
+    # beyond the budget, the least recently used files go first
+    os.utime(first._disk_path(("a", 1)), (1, 1))
+    for i in range(10):
+        first.get_or_compute(("b", i), lambda: np.arange(1000), persist=True)
+    assert not os.path.exists(first._disk_path(("a", 1)))
+    assert first.stats()["disk_bytes"] <= 60_000
+
+
+def test_unpicklable_values_stay_in_memory(tmp_path):
+    cache = SharedCache(disk_dir=str(tmp_path))
+    value = cache.get_or_compute("lock", threading.Lock, persist=True)
+    assert cache.get("lock") is value
+    assert not [n for n in os.listdir(tmp_path) if not n.endswith(".pkl")]
+
+
+def test_sizeof_counts_buffers_of_nested_objects():
+    class Holder:
+        def __init__(self):
+            self.ids = np.zeros(1000, dtype=np.int64)
+            self.again = self.ids
+    assert 8000 <= sizeof(Holder()) < 9000
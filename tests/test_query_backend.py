@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+import pipeline
+import query_backend
+from aggregate_cube import AggregateCube
+from conftest import make_reviews
+from filter_index import FilterIndex
+from test_filter_index import random_choose
+
+pytestmark = pytest.mark.skipif(not query_backend.available(), reason="duckdb n'est pas installé")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    # Parquet files and DuckDB spill files stay in the test's tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(query_backend, "PARQUET_DIR", str(tmp_path / "parquet"))
+    monkeypatch.setattr(query_backend, "SPILL_DIR", str(tmp_path / "spill"))
+
+
+def test_auto_mode_keeps_loaded_frames_in_pandas():
+    assert not query_backend.use_duckdb("Auto")
+    assert not query_backend.use_duckdb("pandas")
+    assert query_backend.use_duckdb("DuckDB")
+
+
+def test_spill_files_go_to_the_spill_dir_not_the_working_directory(tmp_path):
+    con = query_backend.connect(threads=1)
+    try:
+        assert con.execute("SELECT current_setting('temp_directory')").fetchone()[0] == str(tmp_path / "spill")
+    finally:
+        con.close()
+    assert os.listdir(tmp_path) == ["spill"]
+
+
+def test_duckdb_filters_match_pandas():
+    df = make_reviews(1500, seed=9)
+    df["purchase_date"] = df["purchase_date"].dt.floor("D")
+    backend = query_backend.frame_backend("test", df)
+    index, cube = FilterIndex(df), AggregateCube(df)
+    rng = np.random.default_rng(4)
+    for _ in range(25):
+        choose, mask = random_choose(rng, index.products)
+        state = []
+        sql_ids = pipeline.apply_filters(backend, lambda c, b: state.append(choose(c, b)) or state[-1])[0]
+        replay = iter(state)
+        row_ids, cube_filters, price_narrowed = pipeline.apply_filters(index, lambda c, b: next(replay))
+        expected = pipeline.filter_frame(df, row_ids)
+        fetched = backend.fetch(sql_ids)
+        assert fetched.index.tolist() == expected.index.tolist()
+        got = backend.slice(sql_ids).kpis()
+        want = pipeline.cube_slice(cube, expected, cube_filters, price_narrowed).kpis()
+        assert got["num_reviews"] == want["num_reviews"] and got["top_product"] == want["top_product"]
+        assert np.isclose(got["avg_rating"], want["avg_rating"], equal_nan=True)
+        assert np.isclose(got["avg_price"], want["avg_price"], equal_nan=True)
@@ -0,0 +1,69 @@
+import io
+import json
+import os
+import time
+import zipfile
+
+import pandas as pd
+import pytest
+
+import reports
+from figures import FigureCache
+
+
+def test_product_reports_share_one_render(reviews):
+    product = reviews['product'].dropna().iloc[0]
+    product_df = reviews[reviews['product'] == product]
+    cache = FigureCache()
+    key = {"product": product, "filter_state": ("all",), "dataset_version": "v1"}
+    files, timings = reports.generate_product_reports(product, product_df, "Résumé", cache=cache, figure_key=key)
+    assert sorted(os.path.splitext(name)[1] for name in files) == [".html", ".pdf"]
+    html = next(data for name, data in files.items() if name.endswith(".html")).decode("utf-8")
+    assert "data:image/png;base64," in html and "Résumé" in html
+    assert next(data for name, data in files.items() if name.endswith(".pdf")).startswith(b"%PDF")
+    assert {"figures", "html", "pdf", "total"} <= set(timings)
+    # a second export (e.g. PDF only) reuses the cached renders
+    misses = cache.stats()["misses"]
+    files, _ = reports.generate_product_reports(product, product_df, formats=("pdf",), cache=cache, figure_key=key)
+    assert list(files)[0].endswith(".pdf") and cache.stats()["misses"] == misses
+
+
+def test_report_basename_is_a_safe_file_name():
+    name = reports.report_basename("Casque / Audio: Pro?")
+    assert name.startswith("Casque_Audio_Pro_report_") and "/" not in name
+    assert reports.report_basename("???").startswith("product_report_")
+
+
+def test_session_output_dir_prunes_stale_sessions(tmp_path):
+    stale = tmp_path / "old"
+    stale.mkdir()
+    (stale / "report.html").write_text("x")
+    old = time.time() - 2 * reports.SESSION_TTL
+    os.utime(stale, (old, old))
+    other = tmp_path / "recent"
+    other.mkdir()
+    path = reports.session_output_dir("../abc-1", root=str(tmp_path))
+    assert path == str(tmp_path / "abc-1") and os.path.isdir(path)
+    assert not stale.exists() and other.exists()
+
+
+def test_export_all_to_zip(reviews):
+    df = reviews.dropna(subset=['product'])
+    df = df[df['product'].isin(df['product'].unique()[:2])]
+    buffer = io.BytesIO()
+    summary = reports.export_all(df, zip_target=buffer, workers=2, formats=("html",),
+                                 summaries={str(df['product'].iloc[0]): "Résumé AI"})
+    assert summary["products"] == 2 and not any(r["error"] for r in summary["reports"])
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+        names = archive.namelist()
+        manifest = json.loads(archive.read("manifest.json"))
+    assert len([n for n in names if n.endswith(".html")]) == 2
+    assert [r["product"] for r in manifest["reports"]] == sorted(str(p) for p in df['product'].unique())
+
+
+def test_export_all_needs_exactly_one_target(tmp_path):
+    df = pd.DataFrame({"product": []})
+    with pytest.raises(ValueError):
+        reports.export_all(df)
+    with pytest.raises(ValueError):
+        reports.export_all(df, out_dir=str(tmp_path), zip_target=io.BytesIO())
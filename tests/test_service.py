@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import service
+from conftest import ROOT
+from memo import SharedCache
+
+
+@pytest.fixture(scope="module")
+def analytics(tmp_path_factory):
+    # loading goes through the dataset cache of the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("service"))
+    try:
+        yield service.Analytics.open(os.path.join(ROOT, "data.csv"), cache=SharedCache())
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def server(analytics):
+    handler = type("TestHandler", (service.Handler,), {"analytics": analytics})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return response.status, json.loads(response.read())
+
+
+def test_kpis_match_pandas(analytics):
+    df = analytics.df
+    result = analytics.query({"rating_min": 4, "product": "smart"})
+    rows = df[(df["rating"] >= 4) & df["product"].astype(str).str.lower().str.contains("smart")]
+    assert result["kpis"]["num_reviews"] == len(rows)
+    assert np.isclose(result["kpis"]["avg_rating"], rows["rating"].mean())
+    assert np.isclose(result["kpis"]["avg_price"], rows["price"].mean())
+
+
+def test_invalid_queries_raise(analytics):
+    with pytest.raises(ValueError):
+        analytics.query({"colour": "red"})
+    with pytest.raises(ValueError):
+        analytics.query({"include": ["kpis", "weather"]})
+
+
+def test_post_list_reports_errors_per_query(server):
+    status, results = post(f"{server}/query", [{"rating_min": 4}, {"colour": "red"}, {"include": ["aggregates"]}])
+    assert status == 200 and len(results) == 3
+    assert "kpis" in results[0] and "aggregates" in results[2]
+    assert set(results[1]) == {"error"} and "colour" in results[1]["error"]
+
+
+def test_post_single_invalid_query_is_a_400(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(f"{server}/query", {"colour": "red"})
+    assert error.value.code == 400
+
+
+def test_get_sections(server):
+    with urllib.request.urlopen(f"{server}/kpis?rating_min=4") as response:
+        body = json.loads(response.read())
+    assert body["kpis"]["num_reviews"] > 0 and "sentiment" not in body
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"{server}/nowhere")
+    assert error.value.code == 404
+
+
+def test_run_queries_writes_one_line_per_query(analytics):
+    out = io.StringIO()
+    answered, failed = service.run_queries(analytics, [{}, {"bad": 1}, {"include": ["alerts"]}], stream=out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert (answered, failed) == (2, 1) and len(lines) == 3 and "error" in lines[1]
@@ -0,0 +1,50 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import streaming_ingest
+from conftest import ROOT
+
+
+def test_streamed_kpis_match_a_full_load(monkeypatch):
+    monkeypatch.setattr(streaming_ingest, "PROBE_ROWS", 500)
+    path = os.path.join(ROOT, "data.csv")
+    chunks = []
+    aggregates = streaming_ingest.stream_dataset(path, "data.csv", memory_budget_mb=0.2,
+                                                 on_chunk=lambda a: chunks.append(a.rows))
+    assert len(chunks) > 1 and chunks[-1] == aggregates.rows
+    df = pd.read_csv(path)
+    kpis = aggregates.kpis()
+    assert kpis["num_reviews"] == len(df)
+    assert np.isclose(kpis["avg_rating"], df["rating"].mean())
+    assert np.isclose(kpis["avg_price"], df["price"].mean())
+    assert kpis["top_product"] == df.groupby("product")["rating"].mean().idxmax()
+    bounds = aggregates.bounds()
+    assert bounds["price"] == (df["price"].min(), df["price"].max())
+    assert bounds["purchase_date"][0] == pd.to_datetime(df["purchase_date"]).min()
+
+
+def test_reservoir_is_bounded_and_uniform():
+    n = 50_000
+    csv = pd.DataFrame({"row": np.arange(n), "product": "A", "rating": 3}).to_csv(index=False)
+    aggregates = streaming_ingest.StreamingAggregates(memory_budget_mb=1)
+    with streaming_ingest.open_reader(io.StringIO(csv), "x.csv") as reader:
+        reader.chunksize = 3_000
+        for chunk in reader:
+            aggregates.update(chunk)
+    sample = aggregates.sample_frame()
+    assert len(sample) == aggregates.sample_size < n
+    assert sample["row"].is_unique
+    # every part of the file is represented in proportion
+    shares = np.bincount(sample["row"] * 5 // n, minlength=5) / len(sample)
+    assert np.allclose(shares, 0.2, atol=0.03)
+    assert sample["product"].dtype == "category"
+
+
+def test_only_line_formats_stream():
+    assert streaming_ingest.is_streamable("x.JSONL") and not streaming_ingest.is_streamable("x.xlsx")
+    with pytest.raises(ValueError):
+        streaming_ingest.open_reader(io.BytesIO(b""), "x.xlsx")
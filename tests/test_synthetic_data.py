@@ -0,0 +1,46 @@
+import pandas as pd
+
+import synthetic_data
+from benchmark import compare
+
+
+def test_generated_rows_follow_the_seed_catalog(tmp_path):
+    path = synthetic_data.write_synthetic(str(tmp_path / "synthetic.csv"), 2500, seed=1, chunk_rows=1000)
+    df = pd.read_csv(path)
+    seed = pd.read_csv(synthetic_data.DEFAULT_SEED_FILE)
+    assert list(df.columns) == synthetic_data.COLUMNS and len(df) == 2500
+    assert df['client_id'].is_unique
+    assert set(df['product']) <= set(seed['product'])
+    assert set(df['review_language']) <= set(seed['review_language'])
+    assert set(df['rating']) <= set(seed['rating'])
+    bounds = seed.groupby('product')['price'].agg(['min', 'max'])
+    row_bounds = bounds.loc[df['product']].to_numpy()
+    assert ((df['price'] >= row_bounds[:, 0] - 0.005) & (df['price'] <= row_bounds[:, 1] + 0.005)).all()
+    dates = pd.to_datetime(df['purchase_date'])
+    seed_dates = pd.to_datetime(seed['purchase_date'])
+    assert dates.min() >= seed_dates.min() and dates.max() <= seed_dates.max()
+    # reviews are seed templates with this row's product name put back in
+    assert not df['review_text'].str.contains(synthetic_data.PRODUCT_PLACEHOLDER).any()
+    mentions = [p in t for p, t in zip(df['product'], df['review_text'])]
+    assert sum(mentions) > 0.5 * len(df)
+
+
+def test_same_seed_same_rows(tmp_path):
+    a = synthetic_data.write_synthetic(str(tmp_path / "a.csv"), 300, seed=7, chunk_rows=100)
+    b = synthetic_data.write_synthetic(str(tmp_path / "b.csv"), 300, seed=7, chunk_rows=100)
+    c = synthetic_data.write_synthetic(str(tmp_path / "c.csv"), 300, seed=8, chunk_rows=100)
+    assert open(a).read() == open(b).read() != open(c).read()
+
+
+def test_jsonl_output(tmp_path):
+    path = synthetic_data.write_synthetic(str(tmp_path / "synthetic.jsonl"), 250, chunk_rows=100)
+    df = pd.read_json(path, lines=True)
+    assert len(df) == 250 and list(df.columns) == synthetic_data.COLUMNS
+
+
+def test_benchmark_compare_flags_slower_stages():
+    def run(**seconds):
+        return {"results": [{"rows": 1000, "stages": [{"stage": s, "seconds": t} for s, t in seconds.items()]}]}
+    baseline = run(load=1.0, filter=0.5, tiny=0.001)
+    regressions = compare(run(load=1.1, filter=1.0, tiny=0.005, other=3.0), baseline, tolerance=0.25)
+    assert [(r["stage"], r["ratio"]) for r in regressions] == [("filter", 2.0)]
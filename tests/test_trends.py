@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+import trends
+from aggregate_cube import AggregateCube
+from conftest import make_reviews
+from memo import SharedCache
+
+
+def weekly_reviews(weeks=20, per_week=60, seed=0):
+    """Two products reviewed every day of `weeks` weeks, ratings around 4 with some spread."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01")  # a Monday
+    rows = []
+    for product in ("A", "B"):
+        for week in range(weeks):
+            days = start + pd.to_timedelta(week * 7 + rng.integers(0, 7, per_week), unit="D")
+            rows.append(pd.DataFrame({"product": product, "purchase_date": days, "price": 100.0,
+                                      "rating": rng.choice([3.0, 4.0, 5.0], per_week, p=[0.2, 0.6, 0.2])}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def slice_of(df):
+    return AggregateCube(df).slice()
+
+
+def test_series_match_pandas_resample():
+    df = make_reviews(3000, seed=6).dropna(subset=["product", "purchase_date"])
+    trend = trends.build_trends(slice_of(df), "M", window=4)
+    for product in trend["product"].unique()[:3]:
+        rows = df[df["product"].astype(str) == product].set_index("purchase_date").sort_index()
+        ref = rows.resample("MS").agg({"rating": "mean", "price": "mean", "client_id": "size"})
+        mine = trend[trend["product"] == product].set_index("period")
+        assert mine.index.equals(ref.index.rename("period"))
+        assert (mine["reviews"].to_numpy() == ref["client_id"].to_numpy()).all()
+        assert np.allclose(mine["avg_rating"], ref["rating"], equal_nan=True)
+        assert np.allclose(mine["avg_price"], ref["price"], equal_nan=True)
+        assert np.allclose(mine["rolling_reviews"], ref["client_id"].rolling(4, min_periods=1).mean())
+
+
+def test_z_scores_against_previous_window():
+    df = weekly_reviews()
+    window = 6
+    trend = trends.build_trends(slice_of(df), "W", window)
+    a = trend[trend["product"] == "A"].reset_index(drop=True)
+    rows = df[df["product"] == "A"]
+    week = trends.period_start(rows["purchase_date"], "W")
+    for i in range(window, len(a)):
+        baseline = rows[(week >= a["period"][i - window]) & (week < a["period"][i])]["rating"]
+        current = rows[week == a["period"][i]]["rating"]
+        std = max(baseline.std(ddof=0), trends.MIN_RATING_STD)
+        expected = (current.mean() - baseline.mean()) / (std / np.sqrt(len(current)))
+        assert np.isclose(a["rating_z"][i], expected)
+        counts = a["reviews"][i - window:i]
+        volume_std = max(counts.std(ddof=0), np.sqrt(counts.mean()))
+        assert np.isclose(a["volume_z"][i], (a["reviews"][i] - counts.mean()) / volume_std)
+    # not enough history: no score
+    assert a["volume_z"][:window // 2].isna().all()
+
+
+def test_alerts_flag_drops_and_spikes_only():
+    df = weekly_reviews()
+    assert trends.trend_alerts(trends.build_trends(slice_of(df), "W")).empty
+    last = df["purchase_date"].max() - pd.Timedelta(days=6)
+    dropped = df.copy()
+    dropped.loc[(dropped["product"] == "A") & (dropped["purchase_date"] >= last), "rating"] = 1.0
+    spike = dropped[(dropped["product"] == "B") & (dropped["purchase_date"] >= last)]
+    alerts = trends.trend_alerts(trends.build_trends(slice_of(pd.concat([dropped] + [spike] * 3)), "W"))
+    found = set(zip(alerts["produit"], alerts["alerte"]))
+    assert found == {("A", "Baisse de note"), ("B", "Pic de reviews")}
+    assert (alerts["période"] == alerts["période"].max()).all()
+
+
+def test_missing_dimensions_and_empty_slices():
+    df = weekly_reviews(weeks=3)
+    assert trends.build_trends(slice_of(df.drop(columns="purchase_date"))) is None
+    assert trends.build_trends(AggregateCube(df).slice(rating_range=(9, 10))) is None
+    assert list(trends.trend_alerts(None).columns) == ["produit", "période", "alerte", "valeur", "référence", "z"]
+
+
+def test_appended_delta_extends_cached_trends(monkeypatch):
+    df = weekly_reviews(weeks=24)
+    history = df[df["purchase_date"] < pd.Timestamp("2024-05-01")]
+    # the delta adds A's recent weeks, late reviews of an old week and a new product; B is untouched
+    recent = df[(df["purchase_date"] >= pd.Timestamp("2024-05-01")) & (df["product"] == "A")]
+    delta = pd.concat([recent, df.iloc[:5], df.iloc[5:40].assign(product="C")], ignore_index=True)
+    full = pd.concat([history, delta], ignore_index=True)
+    history_cube = AggregateCube(history)
+    delta_cube = AggregateCube(delta)
+    filters = {"rating_range": (3, 5)}
+    cache = SharedCache()
+    for freq, window in (("W", 6), ("D", 8), ("M", 3)):
+        trends.cached_trends(cache, ("v1", freq), history_cube.slice(**filters), freq, window)
+        resampled = []
+        period_totals = trends.period_totals
+        monkeypatch.setattr(trends, "period_totals", lambda s, f: resampled.append(len(s.cells)) or period_totals(s, f))
+        merged = history_cube.merge(delta_cube)
+        got = trends.cached_trends(cache, ("v2", freq), merged.slice(**filters), freq, window,
+                                   delta=(("v1", freq), delta_cube.slice(**filters)))
+        monkeypatch.undo()
+        # only the delta's cells were resampled
+        assert resampled == [len(delta_cube.slice(**filters).cells)]
+        expected = trends.build_trends(AggregateCube(full).slice(**filters), freq, window)
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+        pd.testing.assert_frame_equal(cache.get(("trend_totals", "v2", freq, freq)),
+                                      trends.period_totals(AggregateCube(full).slice(**filters), freq))
+
+
+def test_delta_without_cached_previous_state_rebuilds():
+    df = weekly_reviews(weeks=6)
+    cube = AggregateCube(df)
+    got = trends.cached_trends(SharedCache(), ("v2",), cube.slice(), "W", 4, delta=(("v1",), cube.slice()))
+    pd.testing.assert_frame_equal(got, trends.build_trends(cube.slice(), "W", 4))
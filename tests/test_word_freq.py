@@ -0,0 +1,71 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import word_freq
+from conftest import make_reviews
+
+
+def zipf_reviews(n=3000, vocabulary=400, seed=0):
+    rng = np.random.default_rng(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = np.array([f"mot{letters[i // 26]}{letters[i % 26]}" for i in range(vocabulary)])
+    weights = 1 / np.arange(1, vocabulary + 1)
+    texts = [" ".join(rng.choice(words, 8, p=weights / weights.sum())) for _ in range(n)]
+    return pd.DataFrame({"product": rng.choice(["A", "B", "C"], n), "review_language": "en", "review_text": texts})
+
+
+def naive_counts(df, products=None):
+    counter = Counter()
+    for product, text in zip(df["product"], df["review_text"]):
+        if products is None or product in products:
+            counter.update(text.split())
+    return counter
+
+
+def test_exact_counts_match_naive_and_ignore_batching():
+    df = zipf_reviews()
+    whole = word_freq.build_term_counts(df, batch_size=len(df))
+    batched = word_freq.build_term_counts(df, batch_size=97)
+    expected = naive_counts(df)
+    assert whole.frequencies(top=1000) == batched.frequencies(top=1000) == dict(expected)
+    assert whole.frequencies(products=["B"], top=1000) == dict(naive_counts(df, {"B"}))
+
+
+def test_sketch_never_undercounts_and_keeps_the_top_terms():
+    df = zipf_reviews(seed=1)
+    sketch = word_freq.build_term_counts(df, mode="approx", batch_size=500)
+    exact = naive_counts(df)
+    estimated = sketch.frequencies(top=400)
+    assert all(estimated[token] >= exact[token] for token in estimated)
+    # heavy hitters are far above the collision noise
+    assert list(sketch.frequencies(top=10)) == [t for t, _ in exact.most_common(10)]
+    for token, count in exact.most_common(10):
+        assert estimated[token] <= count * 1.01
+
+
+def test_sketch_width_bounds_the_error():
+    df = zipf_reviews(seed=2)
+    narrow = word_freq.SketchTermCounts(width=2 ** 6, depth=2)
+    word_freq.update_term_counts(narrow, df)
+    keys = word_freq.tokenize(df).groupby(["product", "language", "token"], sort=False).size()
+    estimates = narrow.estimate(keys.index.to_frame(index=False))
+    assert (estimates >= keys.to_numpy()).all()
+    assert (estimates > keys.to_numpy()).any()
+
+
+def test_stopwords_and_product_names_are_dropped():
+    df = make_reviews(300, seed=3)
+    df["review_text"] = "the " + df["product"].astype(str) + " is great"
+    counts = word_freq.build_term_counts(df, exclude_product_names=True).frequencies()
+    assert set(counts) == {"great"}
+    assert counts["great"] == df["product"].notna().sum()
+
+
+def test_english_stopwords_without_wordcloud(monkeypatch):
+    monkeypatch.setattr(word_freq.importlib.util, "find_spec", lambda name: None)
+    stopwords = word_freq._wordcloud_stopwords()
+    assert stopwords == word_freq.ENGLISH_STOPWORDS and stopwords is not word_freq.ENGLISH_STOPWORDS
+    # the fallback only holds words wordcloud's own list drops too
+    assert word_freq.ENGLISH_STOPWORDS <= word_freq.STOPWORDS_BY_LANGUAGE["en"]
@@ -0,0 +1,376 @@
+"""Offline sentiment and topic scoring of review_text.
+
+CPU only, no network: reviews are tokenized in vectorized batches and looked
+up in multilingual lexicons (en / fr / es / de / ar). Sentiment is the
+balance of positive and negative cues (words, or short phrases such as
+"could be better" whose words alone read the other way), a cue being flipped
+when a negator ("not", "sans", "kein", "لم"...) precedes it closely. Topics are
+tagged from a fixed keyword lexicon (words and stems, no clustering) and stored
+as a bitmask per review. Large inputs are split over a process pool.
+
+Scores persist in append-only segments keyed by a hash of (client_id, review
+text): a re-upload or an appended delta only scores its new or changed rows,
+and only looks its own keys up.
+
+    python text_scoring.py data.csv
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import CACHE_DIR
+from word_freq import TOKEN_PATTERN
+
+# bump when the lexicons change: stored scores of another version are ignored
+LEXICON_VERSION = 3
+SCORES_DIR = os.path.join(CACHE_DIR, "scores")
+BATCH_SIZE = 20_000
+NEGATION_WINDOW = 3
+
+POSITIVE = {
+    "en": {"good", "great", "excellent", "happy", "impressed", "easy", "fast", "premium", "well", "love", "perfect",
+           "modern", "solid", "securely", "recommend", "nice", "reliable", "better", "best", "amazing", "satisfied"},
+    "fr": {"bon", "bonne", "bien", "content", "contente", "excellent", "excellente", "parfait", "simple", "rapide",
+           "correctement", "satisfait", "super", "recommande", "fiable", "génial", "efficace"},
+    "es": {"buena", "bueno", "buen", "bien", "sencillo", "claras", "sólida", "excelente", "perfecto", "rápido",
+           "contento", "recomiendo", "fácil", "genial"},
+    "de": {"gut", "schnell", "leicht", "zufrieden", "einwandfrei", "wertigen", "super", "toll", "perfekt",
+           "empfehlenswert", "passt", "prima"},
+    "ar": {"جيد", "جيدة", "ممتاز", "ممتازة", "سهل", "رائع", "رائعة", "ممتازه"},
+}
+NEGATIVE = {
+    "en": {"noisy", "bad", "poor", "issues", "issue", "problem", "problems", "broken", "slow", "disappointed",
+           "worse", "worst", "expensive", "loud", "terrible", "defect", "late"},
+    "fr": {"bruit", "bruyant", "élevé", "souci", "soucis", "défaut", "rayure", "problème", "problèmes", "mauvais",
+           "déçu", "déçue", "lent", "cher", "cassé", "panne"},
+    "es": {"ruido", "tarde", "problemas", "problema", "malo", "mala", "roto", "lento", "caro", "decepcionado",
+           "defecto"},
+    "de": {"laut", "leiser", "schlecht", "problem", "probleme", "defekt", "langsam", "teuer", "enttäuscht"},
+    "ar": {"مشكلة", "مرتفع", "سيء", "أطول", "بطيء", "مشاكل"},
+}
+NEGATORS = {
+    "en": {"not", "no", "never", "without", "nothing", "hardly"},
+    "fr": {"ne", "pas", "sans", "aucun", "aucune", "ni", "jamais"},
+    "es": {"no", "sin", "nunca", "ni", "ningún", "ninguna"},
+    "de": {"nicht", "kein", "keine", "keinen", "ohne", "nie"},
+    "ar": {"لا", "لم", "ولم", "لن", "ليس", "بدون", "غير", "لست"},
+}
+# multi-word cues: the phrase's polarity goes to its last word, its other words are no cue
+PHRASES = {
+    "en": {"could be better": -1, "could have been better": -1, "as expected": 1, "as described": 1},
+    "fr": {"pourrait être mieux": -1, "comme prévu": 1, "comme décrit": 1},
+    "es": {"podría ser mejor": -1, "como se esperaba": 1, "como se describe": 1},
+    "de": {"könnte besser sein": -1, "wie erwartet": 1, "wie beschrieben": 1},
+}
+# topic key -> (label, keywords in every language); the order gives the bit of each topic. A keyword ending
+# in "*" is a stem ("qualit*": quality, qualité, Qualität...). This is a hand-written tagger, not learned from
+# the data: words outside these lists tag nothing, extend them (and bump LEXICON_VERSION) for new products.
+TOPICS = {
+    "qualite": ("Qualité", {"qualit*", "calidad", "build", "built", "sturdy", "flimsy", "premium", "hardware",
+                            "solid*", "sólid*", "robust*", "verarbeit*", "wertig*", "hochwertig*", "finition",
+                            "matériaux", "acabado*", "materiales", "جودة", "الجودة", "بجودة"}),
+    "prix": ("Prix", {"price*", "overpriced", "value", "cheap*", "expensive", "cost*", "worth", "money", "prix",
+                      "cher", "chère", "coût*", "tarif*", "precio*", "caro", "barato", "económic*", "preis*",
+                      "teuer", "günstig*", "سعر", "السعر", "بالسعر", "سعره", "ثمن", "الثمن"}),
+    "bruit": ("Bruit", {"nois*", "loud*", "quiet*", "silent*", "sonore", "bruit*", "bruyant*", "silencieu*",
+                        "ruido*", "silencios*", "laut", "lauter", "lautstärke", "leise*", "lärm*", "geräusch*",
+                        "صوت", "ضوضاء", "ضجيج"}),
+    "livraison": ("Livraison / emballage", {"deliver*", "ship", "shipped", "shipping", "packag*", "packed", "arrived",
+                                            "courier", "livr*", "emball*", "arriv*", "colis", "rayure", "envío",
+                                            "enviado", "entrega*", "llegó", "paquete", "embalaje", "versand*",
+                                            "verpack*", "geliefert", "liefer*", "paket*", "الشحن", "شحن", "وصل",
+                                            "التوصيل", "توصيل"}),
+    "installation": ("Installation / prise en main", {"setup", "instal*", "instructions", "manual", "easy",
+                                                      "configur*", "simple", "notice", "sencillo", "instrucci*",
+                                                      "einricht*", "bedien*", "anleitung", "aufbau", "montage",
+                                                      "montaje", "سهل", "الاستخدام", "التركيب", "تركيب"}),
+    "fiabilite": ("Fiabilité dans le temps", {"weeks", "months", "lasts", "lasted", "daily", "routine", "still",
+                                              "durab*", "reliab*", "semaines", "mois", "toujours", "fiab*", "días",
+                                              "semanas", "meses", "momento", "regelmäßig", "bisher", "wochen",
+                                              "monate*", "haltbar*", "zuverlässig*", "يومي", "أسابيع", "أشهر"}),
+    "design": ("Design / performances", {"design*", "performan*", "modern*", "look", "looks", "sleek", "stylish",
+                                         "elegant*", "élégant*", "diseño", "rendimiento", "aspecto", "optik",
+                                         "aussehen", "schick", "الأداء", "والأداء", "التصميم", "تصميم"}),
+    "application": ("Application", {"app", "apps", "application", "appli", "software", "firmware", "logiciel",
+                                    "aplicación", "anwendung", "التطبيق", "تطبيق"}),
+    "rachat": ("Intention de rachat", {"again", "repurchase", "reprendre", "rachet*", "rachèt*", "volvería",
+                                       "einmal", "wieder", "nachkaufen", "سأشتري"}),
+}
+
+
+def _merge(lexicon):
+    return set().union(*lexicon.values())
+
+
+_NEGATORS = _merge(NEGATORS)
+_PHRASES = {tuple(phrase.split()): polarity for phrases in PHRASES.values() for phrase, polarity in phrases.items()}
+_POLARITY = {**{w: 1 for w in _merge(POSITIVE)}, **{w: -1 for w in _merge(NEGATIVE)}}
+_TOPIC_BITS = {}
+_TOPIC_STEMS = []
+for _bit, (_label, _words) in enumerate(TOPICS.values()):
+    for _word in _words:
+        if not _word.endswith("*"):
+            _TOPIC_BITS[_word] = _TOPIC_BITS.get(_word, 0) | (1 << _bit)
+    _TOPIC_STEMS.append(tuple(w[:-1] for w in _words if w.endswith("*")))
+
+
+def topic_bits(vocabulary):
+    """Topic bitmask of each distinct token: exact words, then stems (prefixes)."""
+    tokens = pd.Series(vocabulary, dtype="object")
+    bits = np.array([_TOPIC_BITS.get(t, 0) for t in tokens], dtype=np.int64)
+    for bit, stems in enumerate(_TOPIC_STEMS):
+        if stems:
+            bits |= tokens.str.startswith(stems).to_numpy(dtype=bool).astype(np.int64) << bit
+    return bits
+
+
+def _apply_phrases(polarity, token_codes, row, vocabulary):
+    """Give each phrase occurrence its polarity on its last token (in place), the other tokens none."""
+    codes = {t: i for i, t in enumerate(vocabulary)}
+    n = len(token_codes)
+    for phrase, value in _PHRASES.items():
+        size = len(phrase)
+        if n < size or any(word not in codes for word in phrase):
+            continue
+        start = (row[:n - size + 1] == row[size - 1:])
+        for k, word in enumerate(phrase):
+            start &= token_codes[k:n - size + 1 + k] == codes[word]
+        found = np.flatnonzero(start)
+        for k in range(size - 1):
+            polarity[found + k] = 0
+        polarity[found + size - 1] = value
+
+
+def score_texts(texts):
+    """Sentiment in [-1, 1] and topic bitmask of each text, as a frame aligned to `texts`."""
+    # duplicated reviews (templated or re-posted) are scored once
+    text_codes, unique_texts = pd.factorize(texts.astype("object").fillna("").astype(str))
+    tokens = pd.Series(unique_texts, dtype="object").str.lower().str.findall(TOKEN_PATTERN)
+    flat = tokens.explode().dropna()
+    n = len(tokens)
+    row = flat.index.to_numpy()
+    # lexicon lookups on the distinct tokens only
+    token_codes, vocabulary = pd.factorize(flat.to_numpy())
+    polarity = np.array([_POLARITY.get(t, 0) for t in vocabulary], dtype=np.int8)[token_codes]
+    negator = np.array([t in _NEGATORS for t in vocabulary], dtype=bool)[token_codes]
+    topics = topic_bits(vocabulary)[token_codes]
+    _apply_phrases(polarity, token_codes, row, vocabulary)
+    # a cue is flipped by a negator among the NEGATION_WINDOW previous tokens of the same review
+    negated = np.zeros(len(flat), dtype=bool)
+    for k in range(1, NEGATION_WINDOW + 1):
+        negated[k:] |= negator[:-k] & (row[k:] == row[:-k])
+    polarity = np.where(negated, -polarity, polarity)
+    pos = np.bincount(row, weights=polarity > 0, minlength=n)
+    neg = np.bincount(row, weights=polarity < 0, minlength=n)
+    hits = pos + neg
+    sentiment = np.divide(pos - neg, hits, out=np.zeros(n), where=hits > 0)
+    topic_mask = np.zeros(n, dtype=np.int64)
+    np.bitwise_or.at(topic_mask, row, topics)
+    return pd.DataFrame({"sentiment": sentiment.astype(np.float32)[text_codes],
+                         "topic_mask": topic_mask.astype(np.int32)[text_codes]}, index=texts.index)
+
+
+def score_batches(texts, workers=None, batch_size=BATCH_SIZE):
+    """score_texts over a process pool, one task per batch of distinct texts
+    (inline for a single batch or a single CPU)."""
+    codes, unique_texts = pd.factorize(texts.astype("object").fillna("").astype(str))
+    if len(unique_texts) <= batch_size or (workers or os.cpu_count() or 1) <= 1:
+        return score_texts(texts)
+    unique_texts = pd.Series(unique_texts, dtype="object")
+    batches = [unique_texts.iloc[i:i + batch_size] for i in range(0, len(unique_texts), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scores = pd.concat(pool.map(score_texts, batches))
+    return pd.DataFrame(scores.to_numpy()[codes], columns=scores.columns, index=texts.index).astype(scores.dtypes.to_dict())
+
+
+def _hash_values(values):
+    # templated reviews repeat a few texts: hash each distinct value once (missing values hash as "")
+    codes, uniques = pd.factorize(values)
+    uniques = np.append(np.asarray(pd.Index(uniques).astype(str), dtype=object), "")
+    return pd.util.hash_array(uniques)[codes]
+
+
+def row_keys(df):
+    """uint64 hash of every row's (client_id, review text): the key of the score store."""
+    keys = _hash_values(df['review_text'])
+    if 'client_id' in df.columns:
+        keys = keys * np.uint64(0x9E3779B97F4A7C15) ^ _hash_values(df['client_id'])
+    return keys
+
+
+SEGMENT_DTYPE = np.dtype([("key", np.uint64), ("sentiment", np.float32), ("topic_mask", np.int32)])
+
+
+class ScoreStore:
+    """Scores of every review seen so far: one directory per lexicon version, holding segments
+    sorted by key (memory-mapped, binary-searched).
+
+    Each write adds a segment; a segment at least half the size of the one
+    before it is merged into it, so there are O(log n) segments and a row is
+    rewritten O(log n) times. A text that changed gets a new key, its old
+    entry is just never looked up again.
+    """
+
+    def __init__(self, cache_dir=SCORES_DIR):
+        self.root = os.path.join(cache_dir, f"scores_v{LEXICON_VERSION}")
+
+    def _segments(self):
+        try:
+            names = sorted(n for n in os.listdir(self.root) if n.endswith(".npy"))
+        except OSError:
+            return []
+        return [os.path.join(self.root, n) for n in names]
+
+    def lookup(self, keys):
+        """(found, sentiment, topic_mask) arrays aligned to `keys`, newest segments first."""
+        # sorted queries walk each memory-mapped segment in order
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        found = np.zeros(len(keys), dtype=bool)
+        sentiment = np.zeros(len(keys), dtype=np.float32)
+        topic_mask = np.zeros(len(keys), dtype=np.int32)
+        for path in reversed(self._segments()):
+            todo = np.flatnonzero(~found)
+            if todo.size == 0:
+                break
+            try:
+                segment = np.load(path, mmap_mode="r")
+            except (OSError, ValueError):
+                # merged away by another writer meanwhile: its rows are in the merged segment
+                continue
+            if segment.size == 0 or segment.dtype != SEGMENT_DTYPE:
+                continue
+            at = np.minimum(np.searchsorted(segment["key"], keys[todo]), segment.size - 1)
+            hit = segment["key"][at] == keys[todo]
+            rows = segment[at[hit]]
+            found[todo[hit]] = True
+            sentiment[todo[hit]] = rows["sentiment"]
+            topic_mask[todo[hit]] = rows["topic_mask"]
+        unsorted = np.empty_like(order)
+        unsorted[order] = np.arange(len(order))
+        return found[unsorted], sentiment[unsorted], topic_mask[unsorted]
+
+    def _write(self, path, segment):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, segment)
+        os.replace(tmp, path)
+
+    def add(self, keys, scores):
+        """Store the scores of new keys as a new segment, then merge the small trailing segments."""
+        keys, first = np.unique(keys, return_index=True)
+        segment = np.empty(len(keys), dtype=SEGMENT_DTYPE)
+        segment["key"] = keys
+        segment["sentiment"] = scores["sentiment"].to_numpy(dtype=np.float32)[first]
+        segment["topic_mask"] = scores["topic_mask"].to_numpy(dtype=np.int32)[first]
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            # names sort by creation time: lookups read the newest first
+            self._write(os.path.join(self.root, f"{time.time_ns():020d}-{os.getpid()}.npy"), segment)
+            self._merge_tail()
+        except OSError:
+            # persistence is best effort, the scores are still returned
+            pass
+
+    def _merge_tail(self):
+        segments = self._segments()
+        while len(segments) > 1:
+            older, newer = segments[-2], segments[-1]
+            if os.path.getsize(older) > 2 * os.path.getsize(newer):
+                break
+            merged = np.concatenate([np.load(newer), np.load(older)])
+            # newest entry first, so unique() keeps it
+            _, first = np.unique(merged["key"], return_index=True)
+            # the merged segment takes the older name: lookup order is unchanged
+            self._write(older, merged[first])
+            os.remove(newer)
+            segments = segments[:-1]
+
+
+def score_reviews(df, store=None, workers=None):
+    """Scores of every row of `df` (aligned to its index), scoring only rows missing from the store.
+
+    Returns (scores, info): info counts the rows scored now and those reused.
+    """
+    if 'review_text' not in df.columns:
+        return None, {"scored": 0, "reused": 0}
+    store = store if store is not None else ScoreStore()
+    keys = row_keys(df)
+    found, sentiment, topic_mask = store.lookup(keys)
+    missing = ~found
+    if missing.any():
+        fresh = score_batches(df['review_text'][missing], workers)
+        sentiment[missing] = fresh["sentiment"].to_numpy()
+        topic_mask[missing] = fresh["topic_mask"].to_numpy()
+        store.add(keys[missing], fresh)
+    scores = pd.DataFrame({"sentiment": sentiment, "topic_mask": topic_mask}, index=df.index)
+    return scores, {"scored": int(missing.sum()), "reused": int(found.sum())}
+
+
+def sentiment_labels(scores):
+    return pd.Series(np.select([scores["sentiment"] > 0, scores["sentiment"] < 0], ["positif", "négatif"], "neutre"),
+                     index=scores.index)
+
+
+def sentiment_kpis(scores):
+    n = len(scores)
+    if n == 0:
+        return {"avg_sentiment": np.nan, "positive_share": np.nan, "negative_share": np.nan}
+    return {
+        "avg_sentiment": float(scores["sentiment"].mean()),
+        "positive_share": float((scores["sentiment"] > 0).mean()),
+        "negative_share": float((scores["sentiment"] < 0).mean()),
+    }
+
+
+def topic_breakdown(df, scores):
+    """Share of each product's reviews mentioning each topic, plus their mean sentiment.
+
+    Long format: product, topic (label), reviews, share, sentiment.
+    """
+    if 'product' not in df.columns or scores is None or scores.empty:
+        return pd.DataFrame(columns=["product", "topic", "reviews", "share", "sentiment"])
+    product = df['product'].astype("object")
+    totals = product.value_counts()
+    parts = []
+    for bit, (label, _) in enumerate(TOPICS.values()):
+        mentions = (scores["topic_mask"].to_numpy() >> bit) & 1 == 1
+        if not mentions.any():
+            continue
+        grouped = scores["sentiment"][mentions].groupby(product[mentions]).agg(["size", "mean"])
+        parts.append(pd.DataFrame({"product": grouped.index, "topic": label, "reviews": grouped["size"].to_numpy(),
+                                   "share": grouped["size"].to_numpy() / totals.reindex(grouped.index).to_numpy(),
+                                   "sentiment": grouped["mean"].to_numpy()}))
+    if not parts:
+        return pd.DataFrame(columns=["product", "topic", "reviews", "share", "sentiment"])
+    return pd.concat(parts, ignore_index=True)
+
+
+if __name__ == "__main__":
+    from dataset_cache import load_dataset
+
+    parser = argparse.ArgumentParser(description="Scores de sentiment et thèmes des reviews (hors ligne)")
+    parser.add_argument("dataset")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", help="CSV de sortie (client_id, sentiment, label, thèmes)")
+    args = parser.parse_args()
+
+    with open(args.dataset, "rb") as f:
+        frame, _ = load_dataset(os.path.basename(args.dataset), f.read())
+    scores, info = score_reviews(frame, workers=args.workers)
+    print(f"{info['scored']} reviews scorées, {info['reused']} reprises du cache", file=sys.stderr)
+    print(sentiment_kpis(scores), file=sys.stderr)
+    if args.out:
+        labels = [label for label, _ in TOPICS.values()]
+        out = pd.DataFrame({
+            "client_id": frame['client_id'] if 'client_id' in frame.columns else None,
+            "sentiment": scores["sentiment"],
+            "label": sentiment_labels(scores),
+            "topics": [", ".join(l for bit, l in enumerate(labels) if mask >> bit & 1) for mask in scores["topic_mask"]],
+        })
+        out.to_csv(args.out, index=False)
@@ -0,0 +1,231 @@
+"""Review trends per product over time, with rolling statistics and anomaly alerts.
+
+Series are built from aggregate cube cells (product x day x rating x
+language), not from rows: resampling a multi-year, multi-million-row dataset
+to days, weeks or months costs the number of cells. For every product and
+period the series holds the review count, mean rating and mean price, a
+rolling mean over the last `window` periods and two z-scores against the
+`window` periods before:
+
+- rating_z: the period's mean rating against the baseline reviews' mean, in
+  standard errors (the baseline std over the square root of the period's
+  rated reviews), so a drop on 3 reviews weighs less than one on 300;
+- volume_z: the period's review count against the baseline periods' counts.
+
+Rolling windows are differences of per-product cumulative sums over the
+(product, period) totals, so the whole frame is a few vectorized passes over
+those totals. `cached_trends` memoizes totals and frame per filter state;
+when the dataset grew by an appended delta (history mode), the previous
+state's totals are extended with the delta's cube cells and only the
+products the delta touches get their rolling statistics recomputed.
+"""
+import numpy as np
+import pandas as pd
+
+FREQUENCIES = {"D": "Jour", "W": "Semaine", "M": "Mois"}
+WINDOW = 8
+Z_THRESHOLD = 3.0
+MIN_REVIEWS = 5
+# a product rated 5 everywhere in its baseline still has some spread: avoids infinite z-scores
+MIN_RATING_STD = 0.5
+
+_RANGE_FREQ = {"D": "D", "W": "W-MON", "M": "MS"}
+
+
+def period_start(days, freq):
+    """First day of the day / week (Monday) / month containing each date."""
+    if freq == "D":
+        return days
+    if freq == "W":
+        return days - pd.to_timedelta(days.dt.dayofweek, unit="D")
+    if freq == "M":
+        return days.dt.to_period("M").dt.start_time
+    raise ValueError(f"fréquence inconnue : {freq}")
+
+
+def period_totals(slice_, freq="W"):
+    """Per (product, period) sums of a CubeSlice: reviews, rated reviews, rating sum and sum of
+    squares, price count and sum. Periods without reviews between a product's first and last
+    one are present with zeros. None when the cube has no product or date dimension."""
+    cells = slice_.cells
+    if not {"product", "day"} <= set(cells.columns):
+        return None
+    keep = (cells["product"].notna() & cells["day"].notna()).to_numpy()
+    cells = cells[keep]
+    weight = slice_.weight[keep].astype("float64")
+    # a few thousand distinct days for millions of rows: resample those, not the cells
+    days, day_codes = np.unique(cells["day"].to_numpy(dtype="datetime64[ns]"), return_inverse=True)
+    frame = pd.DataFrame({
+        "product": cells["product"].astype("category").to_numpy(),
+        "period": period_start(pd.Series(days), freq).to_numpy()[day_codes],
+        "reviews": weight.to_numpy(),
+    })
+    if "rating" in cells.columns:
+        rating = cells["rating"].astype("float64").to_numpy()
+        rated = ~np.isnan(rating)
+        frame["rated"] = np.where(rated, weight, 0.0)
+        frame["rating_sum"] = np.where(rated, rating * weight, 0.0)
+        frame["rating_sumsq"] = np.where(rated, rating * rating * weight, 0.0)
+    if "price_count" in cells.columns:
+        frame["price_count"] = cells["price_count"].to_numpy(dtype="float64")
+        frame["price_sum"] = cells["price_sum"].to_numpy(dtype="float64")
+    totals = frame.groupby(["product", "period"], sort=True, observed=True).sum()
+    if totals.empty:
+        return totals.reset_index()
+    totals.index = totals.index.set_levels(totals.index.levels[0].astype(str), level="product")
+    return _fill_gaps(totals, freq)
+
+
+def _fill_gaps(totals, freq):
+    """Totals indexed by (product, period), reindexed to each product's full period grid
+    from its first to its last period (missing periods are zeros)."""
+    periods = pd.date_range(totals.index.get_level_values("period").min(),
+                            totals.index.get_level_values("period").max(), freq=_RANGE_FREQ[freq])
+    products = totals.index.get_level_values("product")
+    first = pd.Series(totals.index.get_level_values("period")).groupby(products).min()
+    last = pd.Series(totals.index.get_level_values("period")).groupby(products).max()
+    grid = pd.MultiIndex.from_product([first.index, periods], names=["product", "period"])
+    grid_products = grid.get_level_values("product")
+    grid_periods = grid.get_level_values("period")
+    inside = ((grid_periods >= first.reindex(grid_products).to_numpy())
+              & (grid_periods <= last.reindex(grid_products).to_numpy()))
+    return totals.reindex(grid[inside], fill_value=0.0).reset_index()
+
+
+def merge_totals(totals, delta, freq="W"):
+    """Period totals of two disjoint sets of rows (a history and an appended delta), summed."""
+    if delta is None or delta.empty:
+        return totals
+    if totals is None or totals.empty:
+        return delta
+    merged = pd.concat([totals, delta], ignore_index=True).groupby(["product", "period"], sort=True).sum()
+    return _fill_gaps(merged, freq)
+
+
+def build_trends(slice_, freq="W", window=WINDOW):
+    """Trend frame of a CubeSlice: one row per (product, period), see the module docstring."""
+    return trends_from_totals(period_totals(slice_, freq), window)
+
+
+def trends_from_totals(totals, window=WINDOW):
+    """Trend frame of period totals (see period_totals), None when there are none."""
+    if totals is None or totals.empty:
+        return None
+    totals = totals.copy()
+    by_product = totals.groupby("product", sort=False)
+    position = by_product.cumcount().to_numpy()
+
+    def trailing(column, lag):
+        # sum of `column` over the `window` periods ending `lag` periods ago (0: the current one)
+        cumulative = by_product[column].cumsum()
+        grouped = cumulative.groupby(totals["product"], sort=False)
+        ahead = grouped.shift(lag, fill_value=0.0) if lag else cumulative
+        return (ahead - grouped.shift(lag + window, fill_value=0.0)).to_numpy()
+
+    trends = totals[["product", "period", "reviews"]].copy()
+    reviews = totals["reviews"].to_numpy()
+    totals["reviews_sq"] = reviews ** 2
+
+    trends["rolling_reviews"] = trailing("reviews", 0) / np.minimum(position + 1, window)
+    baseline_periods = np.minimum(position, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        baseline_reviews = trailing("reviews", 1) / baseline_periods
+        volume_var = trailing("reviews_sq", 1) / baseline_periods - baseline_reviews ** 2
+        # count noise is at least Poisson-like (sqrt of the mean)
+        volume_std = np.maximum(np.sqrt(np.clip(volume_var, 0, None)), np.sqrt(np.maximum(baseline_reviews, 1.0)))
+        volume_z = (reviews - baseline_reviews) / volume_std
+    enough = baseline_periods >= max(2, window // 2)
+    trends["baseline_reviews"] = np.where(enough, baseline_reviews, np.nan)
+    trends["volume_z"] = np.where(enough, volume_z, np.nan)
+
+    trends["avg_rating"] = np.nan
+    trends["rolling_rating"] = np.nan
+    trends["baseline_rating"] = np.nan
+    trends["rating_z"] = np.nan
+    if "rated" in totals.columns:
+        rated = totals["rated"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            trends["avg_rating"] = np.where(rated > 0, totals["rating_sum"].to_numpy() / rated, np.nan)
+            rolling_rated = trailing("rated", 0)
+            trends["rolling_rating"] = np.where(rolling_rated > 0, trailing("rating_sum", 0) / rolling_rated, np.nan)
+            baseline_rated = trailing("rated", 1)
+            baseline_rating = trailing("rating_sum", 1) / baseline_rated
+            rating_var = trailing("rating_sumsq", 1) / baseline_rated - baseline_rating ** 2
+            rating_std = np.maximum(np.sqrt(np.clip(rating_var, 0, None)), MIN_RATING_STD)
+            rating_z = (trends["avg_rating"].to_numpy() - baseline_rating) / (rating_std / np.sqrt(rated))
+        valid = (rated >= MIN_REVIEWS) & (baseline_rated >= MIN_REVIEWS)
+        trends["baseline_rating"] = np.where(baseline_rated >= MIN_REVIEWS, baseline_rating, np.nan)
+        trends["rating_z"] = np.where(valid, rating_z, np.nan)
+
+    trends["avg_price"] = np.nan
+    if "price_count" in totals.columns:
+        price_count = totals["price_count"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            trends["avg_price"] = np.where(price_count > 0, totals["price_sum"].to_numpy() / price_count, np.nan)
+    trends["reviews"] = trends["reviews"].astype("int64")
+    return trends
+
+
+def extend_trends(previous, totals, products, window=WINDOW):
+    """`previous` trend frame with the rows of `products` recomputed from the (merged) totals;
+    the other products' series don't depend on those totals and are kept as they are."""
+    recomputed = trends_from_totals(totals[totals["product"].isin(products)], window)
+    if recomputed is None:
+        return previous
+    kept = previous[~previous["product"].isin(products)]
+    return (pd.concat([kept, recomputed], ignore_index=True)
+            .sort_values(["product", "period"], kind="stable", ignore_index=True))
+
+
+def cached_trends(cache, slice_key, slice_, freq="W", window=WINDOW, delta=None):
+    """Trend frame of a CubeSlice, memoized in `cache` (a memo.SharedCache) under `slice_key`.
+
+    delta=(previous slice key, delta slice) says the slice holds the rows of
+    the previous one plus those of an appended delta (same filters): when the
+    previous totals / frame are still cached, they are extended from the
+    delta's cells instead of resampling every cell again.
+    """
+    added = []
+    def delta_totals():
+        if not added:
+            added.append(period_totals(delta[1], freq))
+        return added[0]
+
+    def compute_totals():
+        if delta is not None:
+            previous = cache.get(("trend_totals",) + delta[0] + (freq,))
+            if previous is not None:
+                return merge_totals(previous, delta_totals(), freq)
+        return period_totals(slice_, freq)
+    totals = cache.get_or_compute(("trend_totals",) + slice_key + (freq,), compute_totals, persist=True)
+
+    def compute_trends():
+        if delta is not None and totals is not None and delta_totals() is not None:
+            previous = cache.get(("trends",) + delta[0] + (freq, window))
+            if previous is not None:
+                return extend_trends(previous, totals, delta_totals()["product"].unique(), window)
+        return trends_from_totals(totals, window)
+    return cache.get_or_compute(("trends",) + slice_key + (freq, window), compute_trends, persist=True)
+
+
+def trend_alerts(trends, z=Z_THRESHOLD):
+    """Anomalies of a trend frame, most recent first: rating drops and review volume spikes / drops
+    beyond `z` standard deviations of the product's rolling baseline."""
+    columns = ["produit", "période", "alerte", "valeur", "référence", "z"]
+    if trends is None or trends.empty:
+        return pd.DataFrame(columns=columns)
+    found = []
+    for label, mask, value, baseline, score in (
+        ("Baisse de note", trends["rating_z"] <= -z, "avg_rating", "baseline_rating", "rating_z"),
+        ("Pic de reviews", trends["volume_z"] >= z, "reviews", "baseline_reviews", "volume_z"),
+        ("Chute de reviews", trends["volume_z"] <= -z, "reviews", "baseline_reviews", "volume_z"),
+    ):
+        rows = trends[mask]
+        found.append(pd.DataFrame({
+            "produit": rows["product"], "période": rows["period"], "alerte": label,
+            "valeur": rows[value].astype("float64").round(2), "référence": rows[baseline].round(2),
+            "z": rows[score].round(1),
+        }))
+    alerts = pd.concat(found, ignore_index=True)
+    order = np.lexsort((-alerts["z"].abs().to_numpy(), -alerts["période"].to_numpy().astype("int64")))
+    return alerts.iloc[order].reset_index(drop=True)
@@ -0,0 +1,209 @@
+"""Term frequencies over review_text, per product and per language.
+
+Reviews are tokenized in vectorized batches (no giant joined string), each
+review's stopwords are removed according to its review_language, and term
+counts are accumulated per (product, language). Counts are exact by default;
+for very large vocabularies a count-min sketch with a per-group top-k keeps
+memory bounded. The result feeds WordCloud.generate_from_frequencies, so the
+cloud reflects the whole corpus instead of its first 2000 characters.
+"""
+import copy
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+TOKEN_PATTERN = r"[^\W\d_]{2,}"
+BATCH_SIZE = 50_000
+APPROX_ROWS = 2_000_000  # mode="auto" switches to the sketch above this many rows
+# used when wordcloud (and its stopwords file) is not installed
+ENGLISH_STOPWORDS = {
+    "a", "about", "after", "all", "also", "am", "an", "and", "any", "are", "as", "at", "be", "because", "been",
+    "before", "but", "by", "can", "could", "did", "do", "does", "for", "from", "had", "has", "have", "he", "her",
+    "here", "him", "his", "how", "if", "in", "into", "is", "it", "its", "just", "me", "more", "my", "no", "not",
+    "of", "on", "only", "or", "our", "out", "over", "she", "so", "some", "than", "that", "the", "their", "them",
+    "then", "there", "these", "they", "this", "those", "to", "too", "up", "very", "was", "we", "were", "what",
+    "when", "which", "who", "with", "would", "you", "your",
+}
+
+
+def _wordcloud_stopwords():
+    # wordcloud's English list, read from its data file: importing wordcloud itself loads matplotlib
+    spec = importlib.util.find_spec("wordcloud")
+    if spec is None or not spec.submodule_search_locations:
+        return set(ENGLISH_STOPWORDS)
+    try:
+        with open(os.path.join(spec.submodule_search_locations[0], "stopwords"), encoding="utf-8") as f:
+            return {line.strip() for line in f if line.strip()}
+    except OSError:
+        return set(ENGLISH_STOPWORDS)
+
+
+STOPWORDS_BY_LANGUAGE = {
+    "en": _wordcloud_stopwords(),
+    "fr": {
+        "au", "aux", "avec", "ce", "ces", "cet", "cette", "dans", "de", "des", "du", "elle", "en", "et", "eux",
+        "il", "ils", "je", "la", "le", "les", "leur", "lui", "ma", "mais", "me", "mes", "moi", "mon", "ne",
+        "nos", "notre", "nous", "on", "ou", "où", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "ses",
+        "son", "sur", "ta", "te", "tes", "toi", "ton", "tu", "un", "une", "vos", "votre", "vous", "est", "sont",
+        "été", "être", "avoir", "ai", "as", "a", "avons", "avez", "ont", "fait", "très", "plus", "peu", "bien",
+        "tout", "tous", "cela", "ça", "ceci", "comme", "si", "donc", "car", "ni", "jusqu", "encore", "aussi",
+    },
+    "es": {
+        "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "en", "y", "o", "que", "es",
+        "por", "para", "con", "no", "se", "lo", "le", "les", "su", "sus", "mi", "mis", "tu", "tus", "me", "te",
+        "nos", "como", "más", "pero", "muy", "ya", "hasta", "este", "esta", "esto", "ese", "esa", "eso", "hay",
+        "son", "fue", "ha", "he", "han", "sido", "ser", "estar", "está", "estoy", "sobre", "también", "sin",
+        "porque", "cuando", "todo", "poco", "bien", "aunque", "ahora", "si",
+    },
+    "de": {
+        "der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer", "und", "oder",
+        "aber", "ist", "sind", "war", "hat", "habe", "haben", "ich", "du", "er", "sie", "es", "wir", "ihr",
+        "mit", "für", "auf", "in", "im", "an", "am", "zu", "zum", "zur", "von", "vom", "bei", "nicht", "noch",
+        "nur", "auch", "sehr", "so", "wie", "als", "dass", "bis", "jetzt", "nun", "mein", "meine", "sich",
+        "etwas", "schon", "wird", "wurde", "kann", "bisher", "alles", "einfach",
+    },
+    "it": {
+        "il", "lo", "la", "i", "gli", "le", "un", "uno", "una", "di", "del", "della", "dei", "delle", "e", "ed",
+        "o", "che", "è", "in", "nel", "nella", "per", "con", "su", "non", "si", "mi", "ti", "ci", "ma", "più",
+        "molto", "come", "anche", "questo", "questa", "sono", "ho", "ha", "hanno", "essere", "bene", "ancora",
+    },
+    "pt": {
+        "o", "a", "os", "as", "um", "uma", "de", "do", "da", "dos", "das", "em", "no", "na", "nos", "nas", "e",
+        "ou", "que", "é", "por", "para", "com", "não", "se", "mas", "mais", "muito", "como", "também", "este",
+        "esta", "isso", "isto", "são", "foi", "tem", "meu", "minha", "bem", "ainda", "até",
+    },
+    "ar": {
+        "في", "من", "على", "إلى", "الى", "عن", "مع", "هذا", "هذه", "ذلك", "التي", "الذي", "و", "أو", "او", "لا",
+        "ما", "لم", "لن", "قد", "كان", "كانت", "هو", "هي", "أنا", "انا", "نحن", "كل", "بعد", "قبل", "جدا", "لكن",
+        "ثم", "أن", "ان", "إن", "حتى", "عند", "هناك", "بشكل",
+    },
+}
+
+
+def product_name_stopwords(products):
+    """Tokens of the product names: templated reviews repeat them in every text."""
+    names = pd.Series([str(p) for p in products], dtype="object")
+    return set(names.str.lower().str.findall(TOKEN_PATTERN).explode().dropna())
+
+
+def tokenize(batch, extra_stopwords=()):
+    """One row per kept (product, language, token) occurrence of the batch."""
+    text = batch['review_text'].astype("object").where(batch['review_text'].notna(), "")
+    tokens = text.astype(str).str.lower().str.findall(TOKEN_PATTERN)
+    product = batch['product'].astype("object").fillna("") if 'product' in batch.columns else ""
+    language = batch['review_language'].astype("object").fillna("").astype(str).str.lower() if 'review_language' in batch.columns else ""
+    frame = pd.DataFrame({"product": product, "language": language, "token": tokens}).explode("token")
+    frame = frame[frame["token"].notna()]
+    # stopwords: every language's own list, plus English (mixed-language reviews are common) and extras
+    stop = frame["token"].isin(STOPWORDS_BY_LANGUAGE["en"] | set(extra_stopwords))
+    for lang, words in STOPWORDS_BY_LANGUAGE.items():
+        if lang != "en":
+            stop |= (frame["language"] == lang) & frame["token"].isin(words)
+    return frame[~stop]
+
+
+class ExactTermCounts:
+    """Exact counts indexed by (product, language, token)."""
+
+    def __init__(self):
+        self.counts = None
+
+    def copy(self):
+        # counts are replaced, never modified in place, by update()
+        other = ExactTermCounts()
+        other.counts = self.counts
+        return other
+
+    def update(self, frame):
+        batch = frame.groupby(["product", "language", "token"], sort=False).size()
+        self.counts = batch if self.counts is None else self.counts.add(batch, fill_value=0).astype("int64")
+
+    def frequencies(self, products=None, languages=None, top=200):
+        if self.counts is None or self.counts.empty:
+            return {}
+        counts = self.counts
+        mask = np.ones(len(counts), dtype=bool)
+        if products is not None:
+            mask &= counts.index.get_level_values("product").isin([str(p) for p in products])
+        if languages is not None:
+            mask &= counts.index.get_level_values("language").isin([str(l).lower() for l in languages])
+        totals = counts[mask].groupby(level="token").sum()
+        return totals.nlargest(top).to_dict()
+
+
+class SketchTermCounts:
+    """Approximate counts: one count-min sketch over (product, language, token), top-k tokens per group.
+
+    Memory is width * depth counters plus top_k entries per (product, language),
+    whatever the vocabulary size; estimates never undercount.
+    """
+
+    def __init__(self, width=2 ** 18, depth=4, top_k=500, seed=0):
+        self.width_bits = int(np.log2(width))
+        self.table = np.zeros((depth, 1 << self.width_bits), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        self.mult = rng.integers(1, 2 ** 63, size=depth, dtype=np.uint64) | np.uint64(1)
+        self.add = rng.integers(0, 2 ** 63, size=depth, dtype=np.uint64)
+        self.top_k = top_k
+        self.top = {}
+
+    def _hash(self, keys):
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype=np.uint64)
+
+    def _columns(self, hashes, row):
+        # multiply-shift hashing, one independent function per sketch row
+        return ((hashes * self.mult[row] + self.add[row]) >> np.uint64(64 - self.width_bits)).astype(np.intp)
+
+    def estimate(self, keys):
+        hashes = self._hash(keys)
+        return np.min([self.table[r][self._columns(hashes, r)] for r in range(self.table.shape[0])], axis=0)
+
+    def copy(self):
+        other = copy.copy(self)
+        other.table = self.table.copy()
+        other.top = dict(self.top)
+        return other
+
+    def update(self, frame):
+        batch = frame.groupby(["product", "language", "token"], sort=False).size()
+        keys = batch.index.to_frame(index=False)
+        hashes = self._hash(keys)
+        for r in range(self.table.shape[0]):
+            np.add.at(self.table[r], self._columns(hashes, r), batch.to_numpy())
+        for (product, language), group in keys.groupby(["product", "language"], sort=False):
+            previous = self.top.get((product, language))
+            tokens = group["token"] if previous is None else pd.concat([group["token"], pd.Series(previous.index)]).drop_duplicates()
+            candidates = pd.DataFrame({"product": product, "language": language, "token": tokens.to_numpy()})
+            estimates = pd.Series(self.estimate(candidates), index=candidates["token"].to_numpy())
+            self.top[(product, language)] = estimates.nlargest(self.top_k)
+
+    def frequencies(self, products=None, languages=None, top=200):
+        products = None if products is None else {str(p) for p in products}
+        languages = None if languages is None else {str(l).lower() for l in languages}
+        selected = [s for (p, l), s in self.top.items()
+                    if (products is None or p in products) and (languages is None or l in languages)]
+        if not selected:
+            return {}
+        return pd.concat(selected).groupby(level=0).sum().nlargest(top).to_dict()
+
+
+def update_term_counts(counts, df, batch_size=BATCH_SIZE, exclude_product_names=False):
+    """Stream the review_text of `df` (e.g. a newly appended batch) into existing counts."""
+    if 'review_text' not in df.columns:
+        return counts
+    extra = product_name_stopwords(df['product'].dropna().unique()) if exclude_product_names and 'product' in df.columns else ()
+    for start in range(0, len(df), batch_size):
+        frame = tokenize(df.iloc[start:start + batch_size], extra)
+        if not frame.empty:
+            counts.update(frame)
+    return counts
+
+
+def build_term_counts(df, mode="exact", batch_size=BATCH_SIZE, exclude_product_names=False):
+    """Stream review_text in batches into exact or sketch ("approx", or "auto" by size) term counts."""
+    if mode == "auto":
+        mode = "approx" if len(df) > APPROX_ROWS else "exact"
+    counts = SketchTermCounts() if mode == "approx" else ExactTermCounts()
+    return update_term_counts(counts, df, batch_size, exclude_product_names)